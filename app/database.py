@@ -1,7 +1,17 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
+from app.services.pool_metrics import (
+    InstrumentedQueuePool,
+    InstrumentedAsyncQueuePool,
+    InstrumentedNullPool,
+    instrument_engine,
+)
+from app.services.cache import set_replica_staleness
+from app.services.query_stats import QUERY_STATS_ENABLED, instrument_queries
+from app.services.replicas import Replica, ReplicaRouter
 
 # Charger les variables du fichier .env
 load_dotenv()
@@ -13,8 +23,46 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError(" ERROR: DATABASE_URL is missing from the .env file")
 
+# Mode async optionnel (routes async def sur /mesures et /analytics) : DB_ASYNC=1
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+# SQLAlchemy 1.4 ne fournit le mode asyncio PostgreSQL qu'avec asyncpg
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or str(make_url(DATABASE_URL).set(drivername="postgresql+asyncpg"))
+# Réplicas en lecture (analytics, listes, export), séparés par des virgules (voir app/services/replicas.py)
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
 
-engine = create_engine(DATABASE_URL, future=True)
+
+# Pool de connexions (voir README, section Exploitation)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+# Derrière un pooler externe en mode transaction (PgBouncer...) : pas de pool local
+# ni de requêtes préparées côté serveur
+DB_EXTERNAL_POOLER = os.getenv("DB_EXTERNAL_POOLER", "false").lower() in ("1", "true", "yes")
+
+
+def _engine_options(name: str, is_async: bool = False):
+    options = {"future": True, "pool_pre_ping": DB_POOL_PRE_PING, "pool_logging_name": name}
+    if DB_EXTERNAL_POOLER:
+        options["poolclass"] = InstrumentedNullPool
+        if is_async:
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+engine = create_engine(DATABASE_URL, **_engine_options("primary"))
+instrument_engine(engine, "primary")
+if QUERY_STATS_ENABLED:
+    instrument_queries(engine, "primary")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 def get_db():
@@ -23,3 +71,65 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options("primary_async", is_async=True))
+    instrument_engine(async_engine, "primary_async")
+    if QUERY_STATS_ENABLED:
+        instrument_queries(async_engine, "primary_async")
+    AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database mode is disabled (set DB_ASYNC=1)")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _replica(i: int, url: str):
+    name = f"replica{i}"
+    replica_engine = create_engine(url, **_engine_options(name))
+    instrument_engine(replica_engine, name)
+    if QUERY_STATS_ENABLED:
+        instrument_queries(replica_engine, name)
+    replica_async_engine = None
+    if DB_ASYNC:
+        replica_async_engine = create_async_engine(
+            str(make_url(url).set(drivername="postgresql+asyncpg")), **_engine_options(f"{name}_async", is_async=True)
+        )
+        instrument_engine(replica_async_engine, f"{name}_async")
+        if QUERY_STATS_ENABLED:
+            instrument_queries(replica_async_engine, f"{name}_async")
+    return Replica(name, replica_engine, replica_async_engine)
+
+
+replica_router = ReplicaRouter([_replica(i, url) for i, url in enumerate(DATABASE_REPLICA_URLS, 1)])
+set_replica_staleness(replica_router.staleness_bound())
+
+
+def get_read_db():
+    """Session de lecture : un réplica si configuré et à jour, sinon le primaire."""
+    replica = replica_router.acquire()
+    db = SessionLocal(bind=replica.engine) if replica is not None else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        replica_router.release(replica)
+
+
+async def get_async_read_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database mode is disabled (set DB_ASYNC=1)")
+    replica = replica_router.acquire()
+    try:
+        async with (AsyncSessionLocal(bind=replica.async_engine) if replica is not None else AsyncSessionLocal()) as db:
+            yield db
+    finally:
+        replica_router.release(replica)
@@ -10,4 +10,8 @@ from .participer_a import ParticiperA
 from .vehicule import Vehicule
 from .trajet import Trajet
 from .arrondissement import Arrondissement
-from .capteur_status_history import CapteurStatusHistory
\ No newline at end of file
+from .capteur_status_history import CapteurStatusHistory
+from .mesure_hourly import MesureHourly
+from .capteur_current_status import CapteurCurrentStatus
+from .bulk_load_batch import BulkLoadBatch
+from .write_behind_checkpoint import WriteBehindCheckpoint
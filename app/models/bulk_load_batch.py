@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, TIMESTAMP, func
+from app.database import Base
+
+class BulkLoadBatch(Base):
+    """Lot commité par l'import en masse (app.services.bulk_load), écrit dans la même transaction que son COPY."""
+    __tablename__ = "bulk_load_batch"
+    source = Column(String(1024), primary_key=True)
+    table_name = Column(String(50), primary_key=True)
+    batch_no = Column(Integer, primary_key=True)
+    batch_rows = Column(Integer, nullable=False)
+    nb_rows = Column(Integer, nullable=False)
+    # plus ancien ts du lot (NULL si inconnu) : point de départ du recalcul des rollups
+    min_ts = Column(TIMESTAMP(timezone=True))
+    loaded_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
@@ -1,5 +1,5 @@
 import enum, uuid
-from sqlalchemy import Column, String, Numeric, TIMESTAMP, ForeignKey, Enum
+from sqlalchemy import Column, String, Numeric, TIMESTAMP, ForeignKey, Enum, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -23,6 +23,12 @@ class Capteur(Base):
 
     proprietaire = relationship("Proprietaire", back_populates="capteurs")
     arrondissement = relationship("Arrondissement", back_populates="capteurs")
-    mesures = relationship("Mesure", back_populates="capteur", cascade="all, delete-orphan")
-    status_history = relationship("CapteurStatusHistory", back_populates="capteur", cascade="all, delete-orphan")
-    interventions = relationship("Intervention", back_populates="capteur")
\ No newline at end of file
+    # ON DELETE CASCADE côté base : supprimer un capteur ne charge pas ses mesures ni son historique
+    mesures = relationship("Mesure", back_populates="capteur", cascade="all, delete-orphan", passive_deletes=True)
+    status_history = relationship("CapteurStatusHistory", back_populates="capteur", cascade="all, delete-orphan", passive_deletes=True)
+    interventions = relationship("Intervention", back_populates="capteur")
+
+    __table_args__ = (
+        # requêtes spatiales côté base (SPATIAL_INDEX_ENABLED=false) : <@ box et kNN <->
+        Index("ix_capteur_position", func.point(longitude, latitude), postgresql_using="gist"),
+    )
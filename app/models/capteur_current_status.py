@@ -0,0 +1,38 @@
+from sqlalchemy import Column, TIMESTAMP, ForeignKey, Enum, event
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
+from sqlalchemy.orm import relationship
+from app.database import Base
+from .capteur import CapteurStatusEnum
+from .capteur_status_history import CapteurStatusHistory
+
+class CapteurCurrentStatus(Base):
+    """Projection du dernier statut connu de chaque capteur (dérivée de capteur_status_history)."""
+    __tablename__ = "capteur_current_status"
+    uuid_capteur = Column(UUID(as_uuid=True), ForeignKey("capteur.uuid_capteur", ondelete="CASCADE"), primary_key=True)
+    status = Column(Enum(CapteurStatusEnum), nullable=False)
+    ts = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    capteur = relationship("Capteur")
+
+
+def upsert_current_status(connection, rows):
+    """
+    Fusionne des lignes (uuid_capteur, status, ts) dans la projection ; une ligne plus
+    ancienne que le statut courant est ignorée, ce qui rend l'opération idempotente.
+    """
+    if not rows:
+        return
+    table = CapteurCurrentStatus.__table__
+    stmt = pg_insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.uuid_capteur],
+        set_={"status": stmt.excluded.status, "ts": stmt.excluded.ts},
+        where=table.c.ts <= stmt.excluded.ts,
+    )
+    connection.execute(stmt)
+
+
+@event.listens_for(CapteurStatusHistory, "after_insert")
+def _sync_current_status(mapper, connection, target):
+    # Même connexion, donc même transaction que l'INSERT dans l'historique
+    upsert_current_status(connection, [{"uuid_capteur": target.uuid_capteur, "status": target.status, "ts": target.ts}])
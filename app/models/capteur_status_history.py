@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, BigInteger, TIMESTAMP, ForeignKey, Enum
+from sqlalchemy import Column, BigInteger, TIMESTAMP, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from .capteur import CapteurStatusEnum
@@ -11,4 +11,9 @@ class CapteurStatusHistory(Base):
     status = Column(Enum(CapteurStatusEnum), nullable=False)
     ts = Column(TIMESTAMP(timezone=True), nullable=False)
 
-    capteur = relationship("Capteur", back_populates="status_history")
\ No newline at end of file
+    capteur = relationship("Capteur", back_populates="status_history")
+
+    __table_args__ = (
+        # disponibilité : dernier statut avant une date et transitions d'une période, par capteur
+        Index("ix_capteur_status_history_capteur_ts_id", "uuid_capteur", "ts", "id"),
+    )
@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, BigInteger, TIMESTAMP, Integer, Numeric, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, BigInteger, TIMESTAMP, Integer, Numeric, Boolean, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -20,4 +20,9 @@ class Intervention(Base):
     uuid_capteur = Column(ForeignKey("capteur.uuid_capteur"), nullable=True)
 
     capteur = relationship("Capteur", back_populates="interventions")
-    realisers = relationship("Realiser", back_populates="intervention", cascade="all, delete-orphan")
\ No newline at end of file
+    realisers = relationship("Realiser", back_populates="intervention", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # list_interventions : ORDER BY date_heure DESC, id_intervention DESC
+        Index("ix_intervention_date_heure_id", "date_heure", "id_intervention"),
+    )
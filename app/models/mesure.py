@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, TIMESTAMP, String, Numeric, ForeignKey
+from sqlalchemy import Column, BigInteger, TIMESTAMP, String, Numeric, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -12,4 +12,13 @@ class Mesure(Base):
     valeur = Column(Numeric(14,6), nullable=False)
     unite = Column(String(30))
 
-    capteur = relationship("Capteur", back_populates="mesures")
\ No newline at end of file
+    capteur = relationship("Capteur", back_populates="mesures")
+
+    __table_args__ = (
+        # filtres analytics : pollutant + fenêtre temporelle
+        Index("ix_mesure_pollutant_ts", "pollutant", "ts"),
+        # séries d'un capteur et jointures sur uuid_capteur ; id départage les ts égaux (pagination keyset)
+        Index("ix_mesure_capteur_ts_id", "uuid_capteur", "ts", "id"),
+        # list_mesures : ORDER BY ts DESC, id DESC
+        Index("ix_mesure_ts_id", "ts", "id"),
+    )
\ No newline at end of file
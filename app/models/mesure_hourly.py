@@ -0,0 +1,18 @@
+from sqlalchemy import Column, BigInteger, TIMESTAMP, String, Numeric, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+class MesureHourly(Base):
+    """Rollup horaire des mesures : un bucket par (capteur, polluant, heure UTC)."""
+    __tablename__ = "mesure_hourly"
+    uuid_capteur = Column(UUID(as_uuid=True), ForeignKey("capteur.uuid_capteur", ondelete="CASCADE"), primary_key=True)
+    pollutant = Column(String(100), primary_key=True)
+    bucket = Column(TIMESTAMP(timezone=True), primary_key=True)
+    sum_valeur = Column(Numeric(24,6), nullable=False)
+    nb_mesures = Column(BigInteger, nullable=False)
+    min_valeur = Column(Numeric(14,6), nullable=False)
+    max_valeur = Column(Numeric(14,6), nullable=False)
+
+    __table_args__ = (
+        Index("ix_mesure_hourly_pollutant_bucket", "pollutant", "bucket"),
+    )
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, BigInteger, String, TIMESTAMP, func
+from app.database import Base
+
+class WriteBehindCheckpoint(Base):
+    """Dernier numéro de spool commité par la file d'ingestion différée (app.services.write_behind), écrit dans la transaction du lot."""
+    __tablename__ = "write_behind_checkpoint"
+    spool = Column(String(1024), primary_key=True)
+    last_seq = Column(BigInteger, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
@@ -1,184 +1,231 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
+from typing import Optional
+from uuid import UUID
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
 from datetime import datetime, timezone, timedelta
-from app.database import get_db
+from app.database import get_read_db
 from app import models
+from app.services import aqi, availability, fastjson, heatmap, live_stats, rollup, series, spatial
+from app.services.cache import analytics_cache, make_key
 
 router = APIRouter()
 
 
-def _pollution_24h(db: Session, pollutant: str = "PM2.5", top_n: int = 10, order_by: str = "measure"):
-    if order_by not in ("measure", "sensor"):
-        raise ValueError("order_by must be 'measure' or 'sensor'")
+def _resolved_status():
+    """Statut courant d'un capteur : projection capteur_current_status, sinon capteur.statut."""
+    return func.coalesce(models.CapteurCurrentStatus.status, models.Capteur.statut)
 
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=24)
 
-    # Subquery: latest status timestamp per capteur
-    last_ts_subq = (
-        db.query(
-            models.CapteurStatusHistory.uuid_capteur.label("uuid"),
-            func.max(models.CapteurStatusHistory.ts).label("max_ts"),
-        )
-        .group_by(models.CapteurStatusHistory.uuid_capteur)
+def _active_capteurs(db: Session):
+    """Capteurs actifs (statut résolu = 'active'), en sous-requête."""
+    return (
+        db.query(models.Capteur.uuid_capteur.label("uuid_capteur"))
+        .outerjoin(models.CapteurCurrentStatus, models.Capteur.uuid_capteur == models.CapteurCurrentStatus.uuid_capteur)
+        .filter(_resolved_status() == "active")
         .subquery()
     )
 
-    # Subquery: last status row per capteur (uuid_capteur, status)
-    last_status_subq = (
-        db.query(
-            models.CapteurStatusHistory.uuid_capteur.label("uuid_capteur"),
-            models.CapteurStatusHistory.status.label("status"),
-        )
-        .join(
-            last_ts_subq,
-            (models.CapteurStatusHistory.uuid_capteur == last_ts_subq.c.uuid)
-            & (models.CapteurStatusHistory.ts == last_ts_subq.c.max_ts),
-        )
-        .subquery()
-    )
 
-    # Active capteurs: those whose resolved status = 'active'
-    active_caps_subq = (
-        db.query(models.Capteur.uuid_capteur.label("uuid_capteur"))
-        .outerjoin(last_status_subq, models.Capteur.uuid_capteur == last_status_subq.c.uuid_capteur)
-        .filter(func.coalesce(last_status_subq.c.status, models.Capteur.statut) == "active")
-        .subquery()
-    )
+def _pollution_window(db: Session, pollutant: str = "PM2.5", hours: int = 24, top_n: int = 10, order_by: str = "measure"):
+    """
+    Classement des arrondissements sur une fenêtre glissante de `hours` heures,
+    calculé à partir des rollups horaires (mesure_hourly) plutôt que des mesures brutes.
+    La fenêtre est alignée sur l'heure pleine : elle commence au bucket contenant now - hours.
+    """
+    if order_by not in ("measure", "sensor"):
+        raise ValueError("order_by must be 'measure' or 'sensor'")
+    if hours < 1:
+        raise ValueError("hours must be >= 1")
 
-    # Aggregate by measure (weighted by number of mesures)
-    agg_by_measure_q = (
-        db.query(
-            models.Capteur.id_arrondissement.label("id_arrondissement"),
-            models.Arrondissement.nom.label("nom"),
-            func.round(func.avg(models.Mesure.valeur), 2).label("avg_by_measure"),
-            func.count(models.Mesure.id).label("nb_mesures"),
-            func.count(func.distinct(models.Mesure.uuid_capteur)).label("nb_capteurs"),
-        )
-        .join(models.Capteur, models.Mesure.uuid_capteur == models.Capteur.uuid_capteur)
-        .join(models.Arrondissement, models.Capteur.id_arrondissement == models.Arrondissement.id_arrondissement)
-        .join(active_caps_subq, models.Capteur.uuid_capteur == active_caps_subq.c.uuid_capteur)
-        .filter(
-            models.Mesure.pollutant == pollutant,
-            models.Mesure.ts >= cutoff,
-        )
-        .group_by(models.Capteur.id_arrondissement, models.Arrondissement.nom)
-    ).subquery()
+    cutoff = rollup.window_start(hours)
 
-    # Per-sensor average over the window
+    active_caps_subq = _active_capteurs(db)
+
+    # Per-sensor totals over the window, read from the hourly buckets
     per_sensor_q = (
         db.query(
-            models.Mesure.uuid_capteur.label("uuid_capteur"),
+            models.MesureHourly.uuid_capteur.label("uuid_capteur"),
             models.Capteur.id_arrondissement.label("id_arrondissement"),
             models.Arrondissement.nom.label("nom"),
-            func.avg(models.Mesure.valeur).label("avg_val"),
+            func.sum(models.MesureHourly.sum_valeur).label("sum_val"),
+            func.sum(models.MesureHourly.nb_mesures).label("nb_mesures"),
+            func.min(models.MesureHourly.min_valeur).label("min_val"),
+            func.max(models.MesureHourly.max_valeur).label("max_val"),
         )
-        .join(models.Capteur, models.Mesure.uuid_capteur == models.Capteur.uuid_capteur)
+        .join(models.Capteur, models.MesureHourly.uuid_capteur == models.Capteur.uuid_capteur)
         .join(models.Arrondissement, models.Capteur.id_arrondissement == models.Arrondissement.id_arrondissement)
         .join(active_caps_subq, models.Capteur.uuid_capteur == active_caps_subq.c.uuid_capteur)
         .filter(
-            models.Mesure.pollutant == pollutant,
-            models.Mesure.ts >= cutoff,
+            models.MesureHourly.pollutant == pollutant,
+            models.MesureHourly.bucket >= cutoff,
         )
-        .group_by(models.Mesure.uuid_capteur, models.Capteur.id_arrondissement, models.Arrondissement.nom)
+        .group_by(models.MesureHourly.uuid_capteur, models.Capteur.id_arrondissement, models.Arrondissement.nom)
     ).subquery()
 
-    # Aggregate by sensor averages (each sensor contributes equally)
-    agg_by_sensor_q = (
-        db.query(
-            per_sensor_q.c.id_arrondissement.label("id_arrondissement"),
-            per_sensor_q.c.nom.label("nom"),
-            func.round(func.avg(per_sensor_q.c.avg_val), 2).label("avg_by_sensor"),
-        )
-        .group_by(per_sensor_q.c.id_arrondissement, per_sensor_q.c.nom)
-    ).subquery()
+    # Combine both metrics: weighted by number of mesures, and each sensor contributing equally
+    avg_by_measure = func.round(func.sum(per_sensor_q.c.sum_val) / func.sum(per_sensor_q.c.nb_mesures), 2)
+    avg_by_sensor = func.round(func.avg(per_sensor_q.c.sum_val / per_sensor_q.c.nb_mesures), 2)
+    nb_mesures = func.sum(per_sensor_q.c.nb_mesures)
 
-    # Final join: combine both metrics
     final_q = (
         db.query(
-            agg_by_measure_q.c.id_arrondissement,
-            agg_by_measure_q.c.nom,
-            agg_by_measure_q.c.avg_by_measure,
-            agg_by_sensor_q.c.avg_by_sensor,
-            agg_by_measure_q.c.nb_mesures,
-            agg_by_measure_q.c.nb_capteurs,
-        )
-        .outerjoin(
-            agg_by_sensor_q,
-            (agg_by_measure_q.c.id_arrondissement == agg_by_sensor_q.c.id_arrondissement)
-            & (agg_by_measure_q.c.nom == agg_by_sensor_q.c.nom),
+            per_sensor_q.c.id_arrondissement,
+            per_sensor_q.c.nom,
+            avg_by_measure.label("avg_by_measure"),
+            avg_by_sensor.label("avg_by_sensor"),
+            nb_mesures.label("nb_mesures"),
+            func.count(per_sensor_q.c.uuid_capteur).label("nb_capteurs"),
+            func.min(per_sensor_q.c.min_val).label("min_valeur"),
+            func.max(per_sensor_q.c.max_val).label("max_valeur"),
         )
+        .group_by(per_sensor_q.c.id_arrondissement, per_sensor_q.c.nom)
     )
 
     # Determine ordering — use .desc().nullslast() on the column to produce "col DESC NULLS LAST"
     if order_by == "sensor":
         final_q = final_q.order_by(
-            agg_by_sensor_q.c.avg_by_sensor.desc().nullslast(),
-            agg_by_measure_q.c.nb_mesures.desc(),
-            agg_by_measure_q.c.id_arrondissement.asc(),
+            avg_by_sensor.desc().nullslast(),
+            nb_mesures.desc(),
+            per_sensor_q.c.id_arrondissement.asc(),
         )
     else:
         final_q = final_q.order_by(
-            agg_by_measure_q.c.avg_by_measure.desc().nullslast(),
-            agg_by_measure_q.c.nb_mesures.desc(),
-            agg_by_measure_q.c.id_arrondissement.asc(),
+            avg_by_measure.desc().nullslast(),
+            nb_mesures.desc(),
+            per_sensor_q.c.id_arrondissement.asc(),
         )
 
-    final_q = final_q.limit(top_n)
-    results = final_q.all()
+    results = final_q.limit(top_n).all()
 
     out = []
     for idx, row in enumerate(results, start=1):
-        mapping = getattr(row, "_mapping", None)
-        if mapping is not None:
-            m = mapping
-            out.append({
-                "rank": idx,
-                "nom": m["nom"],
-                "avg_by_measure": float(m["avg_by_measure"]) if m["avg_by_measure"] is not None else None,
-                "avg_by_sensor": float(m["avg_by_sensor"]) if m["avg_by_sensor"] is not None else None,
-                "nb_mesures": int(m["nb_mesures"]) if m["nb_mesures"] is not None else 0,
-                "nb_capteurs": int(m["nb_capteurs"]) if m["nb_capteurs"] is not None else 0,
-            })
-        else:
-            out.append({
-                "rank": idx,
-                "nom": row[1],
-                "avg_by_measure": float(row[2]) if row[2] is not None else None,
-                "avg_by_sensor": float(row[3]) if row[3] is not None else None,
-                "nb_mesures": int(row[4]) if row[4] is not None else 0,
-                "nb_capteurs": int(row[5]) if row[5] is not None else 0,
-            })
+        m = row._mapping
+        out.append({
+            "rank": idx,
+            "nom": m["nom"],
+            "avg_by_measure": float(m["avg_by_measure"]) if m["avg_by_measure"] is not None else None,
+            "avg_by_sensor": float(m["avg_by_sensor"]) if m["avg_by_sensor"] is not None else None,
+            "nb_mesures": int(m["nb_mesures"]) if m["nb_mesures"] is not None else 0,
+            "nb_capteurs": int(m["nb_capteurs"]) if m["nb_capteurs"] is not None else 0,
+            "min_valeur": float(m["min_valeur"]) if m["min_valeur"] is not None else None,
+            "max_valeur": float(m["max_valeur"]) if m["max_valeur"] is not None else None,
+        })
 
     return out
 
 
-def _availability_by_arrondissement(db: Session):
-    last_ts_subq = (
+def _pollution_24h(db: Session, pollutant: str = "PM2.5", top_n: int = 10, order_by: str = "measure"):
+    return _pollution_window(db, pollutant=pollutant, hours=24, top_n=top_n, order_by=order_by)
+
+
+def _pollution_multi(db: Session, pollutants, hours: int = 24, top_n: int = None):
+    """
+    Plusieurs polluants par arrondissement en un seul parcours des rollups horaires
+    (GROUP BY arrondissement, polluant), avec l'indice de qualité de l'air de chaque
+    polluant et l'indice composite (le pire). Tri par indice composite décroissant.
+    """
+    if not pollutants:
+        raise ValueError("at least one pollutant is required")
+    if hours < 1:
+        raise ValueError("hours must be >= 1")
+
+    cutoff = rollup.window_start(hours)
+    active_caps_subq = _active_capteurs(db)
+    q = (
         db.query(
-            models.CapteurStatusHistory.uuid_capteur.label("uuid"),
-            func.max(models.CapteurStatusHistory.ts).label("max_ts"),
+            models.Capteur.id_arrondissement.label("id_arrondissement"),
+            models.Arrondissement.nom.label("nom"),
+            models.MesureHourly.pollutant.label("pollutant"),
+            func.sum(models.MesureHourly.sum_valeur).label("sum_val"),
+            func.sum(models.MesureHourly.nb_mesures).label("nb_mesures"),
+            func.min(models.MesureHourly.min_valeur).label("min_val"),
+            func.max(models.MesureHourly.max_valeur).label("max_val"),
+            func.count(func.distinct(models.MesureHourly.uuid_capteur)).label("nb_capteurs"),
         )
-        .group_by(models.CapteurStatusHistory.uuid_capteur)
-        .subquery()
+        .join(models.Capteur, models.MesureHourly.uuid_capteur == models.Capteur.uuid_capteur)
+        .join(models.Arrondissement, models.Capteur.id_arrondissement == models.Arrondissement.id_arrondissement)
+        .join(active_caps_subq, models.Capteur.uuid_capteur == active_caps_subq.c.uuid_capteur)
+        .filter(
+            models.MesureHourly.pollutant.in_(pollutants),
+            models.MesureHourly.bucket >= cutoff,
+        )
+        .group_by(models.Capteur.id_arrondissement, models.Arrondissement.nom, models.MesureHourly.pollutant)
     )
 
-    last_status_subq = (
+    by_arr = {}
+    for row in q.all():
+        m = row._mapping
+        n = int(m["nb_mesures"])
+        avg = round(float(m["sum_val"]) / n, 2) if n else None
+        entry = by_arr.setdefault(m["id_arrondissement"], {"id_arrondissement": m["id_arrondissement"], "nom": m["nom"], "pollutants": {}})
+        entry["pollutants"][m["pollutant"]] = {
+            "avg": avg,
+            "min": float(m["min_val"]),
+            "max": float(m["max_val"]),
+            "nb_mesures": n,
+            "nb_capteurs": int(m["nb_capteurs"]),
+            "aqi": aqi.index(m["pollutant"], avg),
+        }
+
+    out = []
+    for entry in by_arr.values():
+        index, dominant = aqi.composite({p: v["aqi"] for p, v in entry["pollutants"].items()})
+        out.append({**entry, "aqi": index, "category": aqi.category(index), "dominant_pollutant": dominant})
+    out.sort(key=lambda r: (r["aqi"] is None, -(r["aqi"] or 0), r["id_arrondissement"]))
+    return [{"rank": i, **r} for i, r in enumerate(out[:top_n], start=1)]
+
+
+def _pollution_hourly(db: Session, pollutant: str = "PM2.5", hours: int = 24, id_arrondissement: int = None):
+    """Série horaire par arrondissement (moyenne, min, max, nombre de mesures) lue dans les rollups."""
+    if hours < 1:
+        raise ValueError("hours must be >= 1")
+
+    cutoff = rollup.window_start(hours)
+    q = (
         db.query(
-            models.CapteurStatusHistory.uuid_capteur.label("uuid_capteur"),
-            models.CapteurStatusHistory.status.label("status"),
+            models.Capteur.id_arrondissement.label("id_arrondissement"),
+            models.Arrondissement.nom.label("nom"),
+            models.MesureHourly.bucket.label("bucket"),
+            func.sum(models.MesureHourly.sum_valeur).label("sum_val"),
+            func.sum(models.MesureHourly.nb_mesures).label("nb_mesures"),
+            func.min(models.MesureHourly.min_valeur).label("min_val"),
+            func.max(models.MesureHourly.max_valeur).label("max_val"),
         )
-        .join(
-            last_ts_subq,
-            (models.CapteurStatusHistory.uuid_capteur == last_ts_subq.c.uuid)
-            & (models.CapteurStatusHistory.ts == last_ts_subq.c.max_ts),
+        .join(models.Capteur, models.MesureHourly.uuid_capteur == models.Capteur.uuid_capteur)
+        .join(models.Arrondissement, models.Capteur.id_arrondissement == models.Arrondissement.id_arrondissement)
+        .filter(
+            models.MesureHourly.pollutant == pollutant,
+            models.MesureHourly.bucket >= cutoff,
         )
-        .subquery()
+    )
+    if id_arrondissement is not None:
+        q = q.filter(models.Capteur.id_arrondissement == id_arrondissement)
+    q = (
+        q.group_by(models.Capteur.id_arrondissement, models.Arrondissement.nom, models.MesureHourly.bucket)
+        .order_by(models.Capteur.id_arrondissement.asc(), models.MesureHourly.bucket.asc())
     )
 
+    out = []
+    for row in q.all():
+        m = row._mapping
+        n = int(m["nb_mesures"])
+        out.append({
+            "id_arrondissement": m["id_arrondissement"],
+            "nom": m["nom"],
+            "bucket": m["bucket"],
+            "avg": round(float(m["sum_val"]) / n, 2) if n else None,
+            "min": float(m["min_val"]),
+            "max": float(m["max_val"]),
+            "nb_mesures": n,
+        })
+    return out
+
+
+def _availability_by_arrondissement(db: Session):
     active_expr = func.sum(
         case(
-            [(func.coalesce(last_status_subq.c.status, models.Capteur.statut) == "active", 1)],
+            [(_resolved_status() == "active", 1)],
             else_=0,
         )
     ).label("active_count")
@@ -192,7 +239,7 @@ def _availability_by_arrondissement(db: Session):
             (100.0 * active_expr / func.nullif(total_expr, 0)).label("pct_active"),
         )
         .join(models.Capteur, models.Arrondissement.id_arrondissement == models.Capteur.id_arrondissement, isouter=False)
-        .outerjoin(last_status_subq, models.Capteur.uuid_capteur == last_status_subq.c.uuid_capteur)
+        .outerjoin(models.CapteurCurrentStatus, models.Capteur.uuid_capteur == models.CapteurCurrentStatus.uuid_capteur)
         .group_by(models.Arrondissement.id_arrondissement, models.Arrondissement.nom)
         .order_by(func.coalesce((100.0 * active_expr / func.nullif(total_expr, 0)), 0).desc())
     )
@@ -219,6 +266,15 @@ def _availability_by_arrondissement(db: Session):
     return out
 
 
+def _availability_range(ts_from: Optional[datetime], as_of: Optional[datetime], days: int):
+    # naïfs considérés en UTC, comme les rollups : comparables entre eux et à now()
+    as_of = rollup.to_utc(as_of) if as_of is not None else datetime.now(timezone.utc)
+    ts_from = rollup.to_utc(ts_from) if ts_from is not None else as_of - timedelta(days=days)
+    if ts_from >= as_of:
+        raise HTTPException(status_code=400, detail="ts_from must be before as_of")
+    return ts_from, as_of
+
+
 def _citizens_most_engaged(db: Session, limit: int = 20):
     rows = db.query(models.Citoyen).order_by(models.Citoyen.score_engagement.desc()).limit(limit).all()
     return [{"id_citoyen": r.id_citoyen, "nom": r.nom, "score_engagement": float(r.score_engagement or 0)} for r in rows]
@@ -247,32 +303,7 @@ def _predictive_this_month(db: Session):
     }
 
 
-@router.get("/pollution_24h")
-def pollution_24h(pollutant: str = "PM2.5", top_n: int = 10, order_by: str = "measure", db: Session = Depends(get_db)):
-    """
-    Retourne les arrondissements les plus pollués sur les dernières 24h.
-    Utilise uniquement des requêtes SQLAlchemy ORM (pas de SQL brut).
-    """
-    return _pollution_24h(db, pollutant=pollutant, top_n=top_n, order_by=order_by)
-
-
-@router.get("/availability_by_arrondissement")
-def availability_by_arrondissement(db: Session = Depends(get_db)):
-    return _availability_by_arrondissement(db)
-
-
-@router.get("/citizens_most_engaged")
-def citizens_most_engaged(limit: int = 20, db: Session = Depends(get_db)):
-    return _citizens_most_engaged(db, limit=limit)
-
-
-@router.get("/predictive_this_month")
-def predictive_this_month(db: Session = Depends(get_db)):
-    return _predictive_this_month(db)
-
-
-@router.get("/top_trajets")
-def top_trajets(limit: int = 20, db: Session = Depends(get_db)):
+def _top_trajets(db: Session, limit: int = 20):
     q = (
         db.query(
             models.Trajet.id_trajet,
@@ -293,4 +324,276 @@ def top_trajets(limit: int = 20, db: Session = Depends(get_db)):
             "destination": r[2],
             "co2_economie": float(r[3]) if r[3] is not None else None
         })
-    return out
\ No newline at end of file
+    return out
+
+
+def _live_aggregator():
+    agg = live_stats.aggregator
+    if not live_stats.LIVE_STATS_ENABLED or not agg.ready:
+        raise HTTPException(status_code=503, detail="Live statistics are not available (disabled or not rebuilt yet)")
+    return agg
+
+
+def _live_ranking(db: Session, pollutant: str = "PM2.5", window: str = "1h", top_n: int = 10, order_by: str = "mean"):
+    agg = _live_aggregator()
+    missing = agg.unknown_arrondissements(pollutant)
+    if missing:
+        agg.remember_names(dict(
+            db.query(models.Arrondissement.id_arrondissement, models.Arrondissement.nom)
+            .filter(models.Arrondissement.id_arrondissement.in_(missing))
+            .all()
+        ))
+    return agg.ranking(pollutant, window, top_n=top_n, order_by=order_by)
+
+
+def _heatmap_tile(db: Session, pollutant: str, hours: int, z: int, x: int, y: int, size: int, fmt: str, vmin: float, vmax: float):
+    # moyennes par capteur partagées par toutes les tuiles (invalidées à chaque ingestion du polluant)
+    _, lats, lons, values = analytics_cache.get_or_compute(
+        make_key("heatmap_points", pollutant=pollutant, hours=hours),
+        lambda: heatmap.sensor_points(db, pollutant, hours),
+        tags=_pollution_tags(pollutant),
+    )
+    grid = heatmap.idw_grid(lats, lons, values, z, x, y, size)
+    if fmt == "png":
+        return heatmap.encode_png(heatmap.colorize(grid, vmin, vmax))
+    return heatmap.grid_payload(grid, z, x, y)
+
+
+# Tags de cache : données dont dépend chaque endpoint (invalidés par les routes d'écriture)
+def _pollution_tags(pollutant: str):
+    return (f"mesure:{pollutant}", "capteur", "capteur_status")
+
+
+def _multi_pollution_tags(pollutants):
+    return tuple(f"mesure:{p}" for p in pollutants) + ("capteur", "capteur_status")
+
+
+def _pollutant_list(pollutants: str):
+    """'PM2.5, NO2,PM2.5' -> ['NO2', 'PM2.5'] (clé de cache indépendante de l'ordre)."""
+    names = sorted({p.strip() for p in pollutants.split(",") if p.strip()})
+    if not names:
+        raise HTTPException(status_code=400, detail="pollutants must list at least one pollutant")
+    return names
+
+AVAILABILITY_TAGS = ("capteur", "capteur_status")
+CITOYEN_TAGS = ("citoyen",)
+INTERVENTION_TAGS = ("intervention",)
+TRAJET_TAGS = ("trajet",)
+
+
+@router.get("/pollution_24h")
+def pollution_24h(pollutant: str = "PM2.5", top_n: int = 10, order_by: str = "measure", db: Session = Depends(get_read_db)):
+    """
+    Retourne les arrondissements les plus pollués sur les dernières 24h.
+    Utilise uniquement des requêtes SQLAlchemy ORM (pas de SQL brut), sur les rollups horaires.
+    """
+    return fastjson.json_response(analytics_cache.get_or_compute(
+        make_key("pollution_24h", pollutant=pollutant, top_n=top_n, order_by=order_by),
+        lambda: _pollution_24h(db, pollutant=pollutant, top_n=top_n, order_by=order_by),
+        tags=_pollution_tags(pollutant),
+    ))
+
+
+@router.get("/pollution_window")
+def pollution_window(pollutant: str = "PM2.5", hours: int = Query(24, ge=1, le=24 * 366), top_n: int = 10, order_by: str = "measure", db: Session = Depends(get_read_db)):
+    """
+    Comme /pollution_24h mais sur une fenêtre de `hours` heures, avec min/max par arrondissement.
+    """
+    return fastjson.json_response(analytics_cache.get_or_compute(
+        make_key("pollution_window", pollutant=pollutant, hours=hours, top_n=top_n, order_by=order_by),
+        lambda: _pollution_window(db, pollutant=pollutant, hours=hours, top_n=top_n, order_by=order_by),
+        tags=_pollution_tags(pollutant),
+    ))
+
+
+@router.get("/pollution_multi")
+def pollution_multi(pollutants: str = "PM2.5,PM10,NO2,O3", hours: int = Query(24, ge=1, le=24 * 366), top_n: Optional[int] = Query(None, ge=1), db: Session = Depends(get_read_db)):
+    """
+    Moyenne, min, max et indice de qualité de l'air (AQI) de chaque polluant de `pollutants`
+    (séparés par des virgules) par arrondissement, sur `hours` heures, en une seule requête ;
+    `aqi` est l'indice composite (le pire des polluants), `dominant_pollutant` le polluant en cause.
+    """
+    names = _pollutant_list(pollutants)
+    try:
+        return fastjson.json_response(analytics_cache.get_or_compute(
+            make_key("pollution_multi", pollutants=",".join(names), hours=hours, top_n=top_n),
+            lambda: _pollution_multi(db, names, hours=hours, top_n=top_n),
+            tags=_multi_pollution_tags(names),
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/pollution_hourly")
+def pollution_hourly(pollutant: str = "PM2.5", hours: int = Query(24, ge=1, le=24 * 366), id_arrondissement: Optional[int] = None, db: Session = Depends(get_read_db)):
+    return fastjson.json_response(analytics_cache.get_or_compute(
+        make_key("pollution_hourly", pollutant=pollutant, hours=hours, id_arrondissement=id_arrondissement),
+        lambda: _pollution_hourly(db, pollutant=pollutant, hours=hours, id_arrondissement=id_arrondissement),
+        tags=_pollution_tags(pollutant),
+    ))
+
+
+@router.get("/availability_by_arrondissement")
+def availability_by_arrondissement(db: Session = Depends(get_read_db)):
+    return fastjson.json_response(analytics_cache.get_or_compute(
+        make_key("availability_by_arrondissement"),
+        lambda: _availability_by_arrondissement(db),
+        tags=AVAILABILITY_TAGS,
+    ))
+
+
+@router.get("/availability/capteurs")
+def availability_by_capteur(
+    as_of: Optional[datetime] = None,
+    days: int = Query(30, ge=1, le=3660),
+    ts_from: Optional[datetime] = None,
+    uuid_capteur: Optional[UUID] = None,
+    id_arrondissement: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=100000),
+    order_by: str = "uptime",
+    db: Session = Depends(get_read_db),
+):
+    """
+    Disponibilité de chaque capteur sur [ts_from, as_of) (par défaut les `days` derniers jours) :
+    uptime pondéré par le temps, pannes, MTBF, MTTR et statut à `as_of`. Les moins disponibles d'abord.
+    """
+    start, end = _availability_range(ts_from, as_of, days)
+    try:
+        return fastjson.json_response(analytics_cache.get_or_compute(
+            make_key("availability_capteurs", ts_from=ts_from, as_of=as_of, days=days, uuid_capteur=uuid_capteur,
+                     id_arrondissement=id_arrondissement, limit=limit, order_by=order_by),
+            lambda: availability.by_capteur(db, start, end, uuid_capteur=uuid_capteur, id_arrondissement=id_arrondissement,
+                                            limit=limit, order_by=order_by),
+            tags=AVAILABILITY_TAGS,
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/availability/arrondissements")
+def availability_by_arrondissement_range(
+    as_of: Optional[datetime] = None,
+    days: int = Query(30, ge=1, le=3660),
+    ts_from: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Comme /availability/capteurs, agrégé par arrondissement ; pct_active : part des capteurs actifs à `as_of`."""
+    start, end = _availability_range(ts_from, as_of, days)
+    return fastjson.json_response(analytics_cache.get_or_compute(
+        make_key("availability_arrondissements", ts_from=ts_from, as_of=as_of, days=days),
+        lambda: availability.by_arrondissement(db, start, end),
+        tags=AVAILABILITY_TAGS,
+    ))
+
+
+@router.get("/citizens_most_engaged")
+def citizens_most_engaged(limit: int = 20, db: Session = Depends(get_read_db)):
+    return fastjson.json_response(analytics_cache.get_or_compute(
+        make_key("citizens_most_engaged", limit=limit),
+        lambda: _citizens_most_engaged(db, limit=limit),
+        tags=CITOYEN_TAGS,
+    ))
+
+
+@router.get("/predictive_this_month")
+def predictive_this_month(db: Session = Depends(get_read_db)):
+    return fastjson.json_response(analytics_cache.get_or_compute(
+        make_key("predictive_this_month"),
+        lambda: _predictive_this_month(db),
+        tags=INTERVENTION_TAGS,
+    ))
+
+
+@router.get("/top_trajets")
+def top_trajets(limit: int = 20, db: Session = Depends(get_read_db)):
+    return fastjson.json_response(analytics_cache.get_or_compute(
+        make_key("top_trajets", limit=limit),
+        lambda: _top_trajets(db, limit=limit),
+        tags=TRAJET_TAGS,
+    ))
+
+
+@router.get("/live_ranking")
+def live_ranking(pollutant: str = "PM2.5", window: str = "1h", top_n: int = Query(10, ge=1), order_by: str = "mean", db: Session = Depends(get_read_db)):
+    """
+    Classement des arrondissements sur une fenêtre glissante (15m, 1h, 24h...) servi depuis
+    l'agrégateur en mémoire alimenté par l'ingestion : moyenne, nombre, max, p50/p95/p99.
+    """
+    try:
+        return fastjson.json_response(_live_ranking(db, pollutant=pollutant, window=window, top_n=top_n, order_by=order_by))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/live_sensor_stats")
+def live_sensor_stats(uuid_capteur: UUID, pollutant: str = "PM2.5"):
+    """Statistiques glissantes d'un capteur pour chaque fenêtre configurée."""
+    return fastjson.json_response(_live_aggregator().sensor_stats(uuid_capteur, pollutant))
+
+
+@router.get("/heatmap/{z}/{x}/{y}")
+def heatmap_tile(
+    z: int = Path(..., ge=heatmap.HEATMAP_MIN_ZOOM, le=heatmap.HEATMAP_MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    pollutant: str = "PM2.5",
+    hours: int = Query(24, ge=1, le=24 * 366),
+    format: str = "png",
+    size: int = Query(256, ge=16, le=512),
+    vmin: float = 0.0,
+    vmax: float = 100.0,
+    db: Session = Depends(get_read_db),
+):
+    """
+    Tuile z/x/y (Web Mercator) de la pollution interpolée (IDW) entre capteurs, à partir
+    des moyennes sur `hours` heures. `format=png` (RGBA, couleur de vmin à vmax) ou `json`
+    (grille de valeurs, null hors de portée des capteurs).
+    """
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail="Tile out of range")
+    if format not in ("png", "json"):
+        raise HTTPException(status_code=400, detail="format must be png or json")
+    colors = {"vmin": vmin, "vmax": vmax} if format == "png" else {}
+    # positions utilisées par heatmap.invalidate_mesures pour cibler les tuiles
+    spatial.refresh(db)
+    heatmap.track_tile(pollutant, z, x, y)
+    tile = heatmap.tile_cache.get_or_compute(
+        make_key("heatmap", pollutant=pollutant, hours=hours, z=z, x=x, y=y, size=size, format=format, **colors),
+        lambda: _heatmap_tile(db, pollutant, hours, z, x, y, size, format, vmin, vmax),
+        tags=heatmap.tile_tags(pollutant, z, x, y),
+    )
+    if format == "png":
+        return Response(content=tile, media_type="image/png")
+    return fastjson.json_response(tile)
+
+
+@router.get("/series")
+def sensor_series(
+    uuid_capteur: UUID,
+    pollutant: str = "PM2.5",
+    ts_from: Optional[datetime] = None,
+    ts_to: Optional[datetime] = None,
+    bucket: str = "raw",
+    agg: str = "avg",
+    points: int = Query(2000, ge=0, le=100000),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Série d'un capteur pour un polluant, en colonnes (`ts`, `valeur`) pour les graphiques.
+    `bucket` : raw, ou minute/hour/day/week/month avec `agg` (avg, min, max) par bucket.
+    Réduite par LTTB à `points` points au plus (0 : série complète).
+    """
+    try:
+        return fastjson.json_response(analytics_cache.get_or_compute(
+            make_key("series", uuid_capteur=str(uuid_capteur), pollutant=pollutant, ts_from=ts_from, ts_to=ts_to,
+                     bucket=bucket, agg=agg, points=points),
+            lambda: series.series(db, uuid_capteur, pollutant, ts_from, ts_to, bucket=bucket, agg=agg, points=points),
+            tags=_pollution_tags(pollutant),
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/cache_stats")
+def cache_stats():
+    return {**analytics_cache.stats, "entries": len(analytics_cache.backend)}
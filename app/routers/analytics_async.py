@@ -0,0 +1,162 @@
+"""
+Variante async des routes /analytics (activée avec DB_ASYNC=1).
+
+Mêmes helpers, mêmes clés et tags de cache que le router synchrone ; les requêtes
+s'exécutent via AsyncSession.run_sync et la coalescence des requêtes utilise
+AnalyticsCache.aget_or_compute.
+"""
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_read_db
+from app.routers import analytics as sync_analytics
+from app.routers.analytics import (
+    _pollution_24h,
+    _pollution_window,
+    _pollution_hourly,
+    _pollution_multi,
+    _availability_by_arrondissement,
+    _availability_range,
+    _citizens_most_engaged,
+    _predictive_this_month,
+    _top_trajets,
+    _pollution_tags,
+    _multi_pollution_tags,
+    _pollutant_list,
+    AVAILABILITY_TAGS,
+    CITOYEN_TAGS,
+    INTERVENTION_TAGS,
+    TRAJET_TAGS,
+)
+from app.services import availability, fastjson
+from app.services.cache import analytics_cache, make_key
+
+router = APIRouter()
+
+
+@router.get("/pollution_24h")
+async def pollution_24h(pollutant: str = "PM2.5", top_n: int = 10, order_by: str = "measure", db: AsyncSession = Depends(get_async_read_db)):
+    return fastjson.json_response(await analytics_cache.aget_or_compute(
+        make_key("pollution_24h", pollutant=pollutant, top_n=top_n, order_by=order_by),
+        lambda: db.run_sync(_pollution_24h, pollutant=pollutant, top_n=top_n, order_by=order_by),
+        tags=_pollution_tags(pollutant),
+    ))
+
+
+@router.get("/pollution_window")
+async def pollution_window(pollutant: str = "PM2.5", hours: int = Query(24, ge=1, le=24 * 366), top_n: int = 10, order_by: str = "measure", db: AsyncSession = Depends(get_async_read_db)):
+    return fastjson.json_response(await analytics_cache.aget_or_compute(
+        make_key("pollution_window", pollutant=pollutant, hours=hours, top_n=top_n, order_by=order_by),
+        lambda: db.run_sync(_pollution_window, pollutant=pollutant, hours=hours, top_n=top_n, order_by=order_by),
+        tags=_pollution_tags(pollutant),
+    ))
+
+
+@router.get("/pollution_multi")
+async def pollution_multi(pollutants: str = "PM2.5,PM10,NO2,O3", hours: int = Query(24, ge=1, le=24 * 366), top_n: Optional[int] = Query(None, ge=1), db: AsyncSession = Depends(get_async_read_db)):
+    names = _pollutant_list(pollutants)
+    try:
+        return fastjson.json_response(await analytics_cache.aget_or_compute(
+            make_key("pollution_multi", pollutants=",".join(names), hours=hours, top_n=top_n),
+            lambda: db.run_sync(_pollution_multi, names, hours=hours, top_n=top_n),
+            tags=_multi_pollution_tags(names),
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/pollution_hourly")
+async def pollution_hourly(pollutant: str = "PM2.5", hours: int = Query(24, ge=1, le=24 * 366), id_arrondissement: Optional[int] = None, db: AsyncSession = Depends(get_async_read_db)):
+    return fastjson.json_response(await analytics_cache.aget_or_compute(
+        make_key("pollution_hourly", pollutant=pollutant, hours=hours, id_arrondissement=id_arrondissement),
+        lambda: db.run_sync(_pollution_hourly, pollutant=pollutant, hours=hours, id_arrondissement=id_arrondissement),
+        tags=_pollution_tags(pollutant),
+    ))
+
+
+@router.get("/availability_by_arrondissement")
+async def availability_by_arrondissement(db: AsyncSession = Depends(get_async_read_db)):
+    return fastjson.json_response(await analytics_cache.aget_or_compute(
+        make_key("availability_by_arrondissement"),
+        lambda: db.run_sync(_availability_by_arrondissement),
+        tags=AVAILABILITY_TAGS,
+    ))
+
+
+@router.get("/availability/capteurs")
+async def availability_by_capteur(
+    as_of: Optional[datetime] = None,
+    days: int = Query(30, ge=1, le=3660),
+    ts_from: Optional[datetime] = None,
+    uuid_capteur: Optional[UUID] = None,
+    id_arrondissement: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=100000),
+    order_by: str = "uptime",
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    start, end = _availability_range(ts_from, as_of, days)
+    try:
+        return fastjson.json_response(await analytics_cache.aget_or_compute(
+            make_key("availability_capteurs", ts_from=ts_from, as_of=as_of, days=days, uuid_capteur=uuid_capteur,
+                     id_arrondissement=id_arrondissement, limit=limit, order_by=order_by),
+            lambda: db.run_sync(availability.by_capteur, start, end, uuid_capteur=uuid_capteur, id_arrondissement=id_arrondissement,
+                                limit=limit, order_by=order_by),
+            tags=AVAILABILITY_TAGS,
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/availability/arrondissements")
+async def availability_by_arrondissement_range(
+    as_of: Optional[datetime] = None,
+    days: int = Query(30, ge=1, le=3660),
+    ts_from: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    start, end = _availability_range(ts_from, as_of, days)
+    return fastjson.json_response(await analytics_cache.aget_or_compute(
+        make_key("availability_arrondissements", ts_from=ts_from, as_of=as_of, days=days),
+        lambda: db.run_sync(availability.by_arrondissement, start, end),
+        tags=AVAILABILITY_TAGS,
+    ))
+
+
+@router.get("/citizens_most_engaged")
+async def citizens_most_engaged(limit: int = 20, db: AsyncSession = Depends(get_async_read_db)):
+    return fastjson.json_response(await analytics_cache.aget_or_compute(
+        make_key("citizens_most_engaged", limit=limit),
+        lambda: db.run_sync(_citizens_most_engaged, limit=limit),
+        tags=CITOYEN_TAGS,
+    ))
+
+
+@router.get("/predictive_this_month")
+async def predictive_this_month(db: AsyncSession = Depends(get_async_read_db)):
+    return fastjson.json_response(await analytics_cache.aget_or_compute(
+        make_key("predictive_this_month"),
+        lambda: db.run_sync(_predictive_this_month),
+        tags=INTERVENTION_TAGS,
+    ))
+
+
+@router.get("/top_trajets")
+async def top_trajets(limit: int = 20, db: AsyncSession = Depends(get_async_read_db)):
+    return fastjson.json_response(await analytics_cache.aget_or_compute(
+        make_key("top_trajets", limit=limit),
+        lambda: db.run_sync(_top_trajets, limit=limit),
+        tags=TRAJET_TAGS,
+    ))
+
+
+router.add_api_route("/cache_stats", sync_analytics.cache_stats, methods=["GET"])
+
+# lectures en mémoire (agrégateur glissant) : mêmes routes qu'en mode synchrone
+router.add_api_route("/live_ranking", sync_analytics.live_ranking, methods=["GET"])
+router.add_api_route("/live_sensor_stats", sync_analytics.live_sensor_stats, methods=["GET"])
+# tuiles : calcul NumPy, exécuté dans le threadpool plutôt que dans la boucle
+router.add_api_route("/heatmap/{z}/{x}/{y}", sync_analytics.heatmap_tile, methods=["GET"])
+# séries : lecture et réduction LTTB (NumPy) dans le threadpool
+router.add_api_route("/series", sync_analytics.sensor_series, methods=["GET"])
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from uuid import UUID
-from app.database import get_db
+from app.database import engine, get_db, get_read_db
 from app.schemas import capteur as sch
 from app import models
+from app.services import status as status_service
+from app.services.cache import analytics_cache
+from app.services.pagination import keyset_page
+from app.services import fastjson, heatmap, purge, references, spatial
 
 router = APIRouter()
 
@@ -12,12 +17,121 @@ def create(cap: sch.CapteurCreate, db: Session = Depends(get_db)):
     obj = models.Capteur(**cap.dict())
     db.add(obj)
     db.commit()
+    analytics_cache.invalidate("capteur")
+    heatmap.tile_cache.invalidate("capteur")
     db.refresh(obj)
+    spatial.index.upsert(obj.uuid_capteur, obj.latitude, obj.longitude)
+    references.capteurs.put(obj.uuid_capteur, obj.id_arrondissement)
     return obj
 
 @router.get("/", response_model=list[sch.CapteurOut])
-def list_capteurs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Capteur).offset(skip).limit(limit).all()
+def list_capteurs(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    # page suivante : ?cursor=<en-tête X-Next-Cursor>
+    key = [models.Capteur.uuid_capteur]
+    if fastjson.FAST_JSON:
+        q = fastjson.schema_query(db, sch.CapteurOut, models.Capteur, key)
+        return fastjson.rows_response(keyset_page(q, key, limit, cursor, response=response, skip=skip), sch.CapteurOut, response)
+    return keyset_page(db.query(models.Capteur), key, limit, cursor, response=response, skip=skip)
+
+def _spatial_response(db: Session, hits, pollutant: Optional[str]):
+    """Capteurs trouvés (uuid, lat, lon[, distance]) et, si `pollutant`, leur dernière mesure."""
+    latest = spatial.latest_readings(db, [h[0] for h in hits], pollutant) if pollutant else {}
+    out = []
+    for h in hits:
+        item = {"uuid_capteur": h[0], "latitude": h[1], "longitude": h[2]}
+        if len(h) > 3:
+            item["distance_m"] = round(h[3], 1)
+        if pollutant:
+            m = latest.get(h[0])
+            item["latest"] = {"ts": m[0], "valeur": m[1], "unite": m[2]} if m else None
+        out.append(item)
+    return fastjson.json_response(out)
+
+@router.get("/within")
+def within_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(1000, ge=1, le=10000),
+    pollutant: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Capteurs dans un rectangle ; `pollutant` ajoute la dernière mesure de chacun."""
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    if spatial.SPATIAL_INDEX_ENABLED:
+        spatial.refresh(db)
+        hits = spatial.index.bbox(min_lat, min_lon, max_lat, max_lon, limit=limit)
+    else:
+        hits = spatial.db_bbox(db, min_lat, min_lon, max_lat, max_lon, limit=limit)
+    return _spatial_response(db, hits, pollutant)
+
+@router.get("/nearby")
+def nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=100000),
+    limit: int = Query(100, ge=1, le=10000),
+    pollutant: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Capteurs à moins de radius_m mètres du point, du plus proche au plus lointain."""
+    if spatial.SPATIAL_INDEX_ENABLED:
+        spatial.refresh(db)
+        hits = spatial.index.radius(lat, lon, radius_m, limit=limit)
+    else:
+        hits = spatial.db_radius(db, lat, lon, radius_m, limit=limit)
+    return _spatial_response(db, hits, pollutant)
+
+@router.get("/nearest")
+def nearest(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=1000),
+    pollutant: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Les k capteurs les plus proches du point."""
+    if spatial.SPATIAL_INDEX_ENABLED:
+        spatial.refresh(db)
+        hits = spatial.index.nearest(lat, lon, k)
+    else:
+        hits = spatial.db_nearest(db, lat, lon, k)
+    return _spatial_response(db, hits, pollutant)
+
+@router.post("/purge", response_model=sch.CapteurPurgeJob, status_code=200, responses={202: {"model": sch.CapteurPurgeJob, "description": "Purge lancée en tâche de fond"}})
+def purge_capteurs(payload: sch.CapteurPurge, db: Session = Depends(get_db)):
+    """
+    Supprime les capteurs d'un propriétaire, d'un arrondissement et/ou d'une liste, avec leurs
+    mesures et leur historique (par lots). Jusqu'à PURGE_SYNC_MAX_ROWS mesures : exécutée dans
+    la requête (200) ; au-delà, tâche de fond (202) suivie par GET /capteurs/purge/{id}.
+    """
+    filters = payload.dict(exclude_none=True)
+    try:
+        uuids = purge.select_capteurs(db, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not uuids:
+        raise HTTPException(status_code=404, detail="No capteur matches")
+    job = purge.PurgeJob(uuids, {k: [str(u) for u in v] if k == "uuids" else v for k, v in filters.items()})
+    large = purge.count_mesures(db, uuids, purge.PURGE_SYNC_MAX_ROWS) > purge.PURGE_SYNC_MAX_ROWS
+    # libère la connexion de la requête avant la purge
+    db.close()
+    if large:
+        purge.runner.submit(engine, job)
+        return fastjson.FastJSONResponse(job.as_dict(), status_code=202)
+    purge.runner.run_now(engine, job)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Purge failed: {job.error}")
+    return job.as_dict()
+
+@router.get("/purge/{job_id}", response_model=sch.CapteurPurgeJob)
+def purge_progress(job_id: str):
+    job = purge.runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return job.as_dict()
 
 @router.get("/{uuid}", response_model=sch.CapteurOut)
 def get_cap(uuid: UUID, db: Session = Depends(get_db)):
@@ -26,6 +140,29 @@ def get_cap(uuid: UUID, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Capteur not found")
     return obj
 
+@router.post("/{uuid}/status", response_model=sch.CapteurStatusOut, status_code=201)
+def record_status(uuid: UUID, payload: sch.CapteurStatusCreate, db: Session = Depends(get_db)):
+    obj = db.query(models.Capteur).filter(models.Capteur.uuid_capteur == uuid).first()
+    if not obj:
+        raise HTTPException(status_code=404, detail="Capteur not found")
+    entry = status_service.record_status(db, obj, payload.status, payload.ts)
+    analytics_cache.invalidate("capteur_status", "capteur")
+    heatmap.tile_cache.invalidate("capteur_status")
+    return entry
+
+@router.get("/{uuid}/status", response_model=sch.CapteurStatusOut)
+def current_status(uuid: UUID, db: Session = Depends(get_db)):
+    cur = db.get(models.CapteurCurrentStatus, uuid)
+    if cur:
+        return cur
+    obj = db.query(models.Capteur).filter(models.Capteur.uuid_capteur == uuid).first()
+    if not obj:
+        raise HTTPException(status_code=404, detail="Capteur not found")
+    if obj.statut is None:
+        raise HTTPException(status_code=404, detail="No status recorded for this capteur")
+    # pas encore d'historique : statut déclaré à la création
+    return {"uuid_capteur": obj.uuid_capteur, "status": obj.statut, "ts": obj.date_installation}
+
 @router.put("/{uuid}", response_model=sch.CapteurOut)
 def update(uuid: UUID, payload: sch.CapteurCreate, db: Session = Depends(get_db)):
     obj = db.query(models.Capteur).filter(models.Capteur.uuid_capteur == uuid).first()
@@ -35,7 +172,11 @@ def update(uuid: UUID, payload: sch.CapteurCreate, db: Session = Depends(get_db)
         setattr(obj, k, v)
     db.add(obj)
     db.commit()
+    analytics_cache.invalidate("capteur")
+    heatmap.tile_cache.invalidate("capteur")
     db.refresh(obj)
+    spatial.index.upsert(obj.uuid_capteur, obj.latitude, obj.longitude)
+    references.capteurs.put(obj.uuid_capteur, obj.id_arrondissement)
     return obj
 
 @router.delete("/{uuid}")
@@ -45,4 +186,8 @@ def delete(uuid: UUID, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Capteur not found")
     db.delete(obj)
     db.commit()
+    analytics_cache.invalidate("capteur")
+    heatmap.tile_cache.invalidate("capteur")
+    spatial.index.remove(uuid)
+    references.capteurs.forget(uuid)
     return {"deleted": True}
\ No newline at end of file
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas import citoyen as sch
 from app import models
+from app.services.cache import analytics_cache
+from app.services.pagination import keyset_page
+from app.services import fastjson, references
 
 router = APIRouter()
 
@@ -11,9 +15,15 @@ def create_citoyen(payload: sch.CitoyenCreate, db: Session = Depends(get_db)):
     obj = models.Citoyen(**payload.dict())
     db.add(obj)
     db.commit()
+    analytics_cache.invalidate("citoyen")
     db.refresh(obj)
+    references.citoyens.put(obj.id_citoyen)
     return obj
 
 @router.get("/", response_model=list[sch.CitoyenOut])
-def list_citoyens(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Citoyen).offset(skip).limit(limit).all()
\ No newline at end of file
+def list_citoyens(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    key = [models.Citoyen.id_citoyen]
+    if fastjson.FAST_JSON:
+        q = fastjson.schema_query(db, sch.CitoyenOut, models.Citoyen, key)
+        return fastjson.rows_response(keyset_page(q, key, limit, cursor, response=response, skip=skip), sch.CitoyenOut, response)
+    return keyset_page(db.query(models.Citoyen), key, limit, cursor, response=response, skip=skip)
\ No newline at end of file
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import consultation as sch
 from app import models
+from app.services import references
 
 router = APIRouter()
 
@@ -12,4 +13,5 @@ def create_consultation(payload: sch.ConsultationCreate, db: Session = Depends(g
     db.add(obj)
     db.commit()
     db.refresh(obj)
+    references.consultations.put(obj.id_consultation)
     return obj
\ No newline at end of file
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas import intervention as sch
 from app import models
+from app.services.cache import analytics_cache
+from app.services.pagination import keyset_page
+from app.services import fastjson
 
 router = APIRouter()
 
@@ -11,12 +15,19 @@ def create_intervention(payload: sch.InterventionCreate, db: Session = Depends(g
     obj = models.Intervention(**payload.dict())
     db.add(obj)
     db.commit()
+    analytics_cache.invalidate("intervention")
     db.refresh(obj)
     return obj
 
 @router.get("/", response_model=list[sch.InterventionOut])
-def list_interventions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Intervention).order_by(models.Intervention.date_heure.desc()).offset(skip).limit(limit).all()
+def list_interventions(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    # plus récentes d'abord ; id_intervention départage les date_heure égales
+    key = [models.Intervention.date_heure, models.Intervention.id_intervention]
+    if fastjson.FAST_JSON:
+        q = fastjson.schema_query(db, sch.InterventionOut, models.Intervention, key)
+        rows = keyset_page(q, key, limit, cursor, descending=True, response=response, skip=skip)
+        return fastjson.rows_response(rows, sch.InterventionOut, response)
+    return keyset_page(db.query(models.Intervention), key, limit, cursor, descending=True, response=response, skip=skip)
 
 @router.post("/{id_intervention}/close", response_model=sch.InterventionOut)
 def close_intervention(id_intervention: int, db: Session = Depends(get_db)):
@@ -31,5 +42,6 @@ def close_intervention(id_intervention: int, db: Session = Depends(get_db)):
     inter.ia_valide = True
     db.add(inter)
     db.commit()
+    analytics_cache.invalidate("intervention")
     db.refresh(inter)
     return inter
\ No newline at end of file
@@ -1,23 +1,308 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas import mesure as sch
+from app.services import anomaly, export, fastjson, heatmap, ingestion, live_stats, references, rollup, write_behind
+from app.services.pubsub import TooManySubscribers, hub, mesure_messages
+from app.services.cache import analytics_cache
+from app.services.pagination import keyset_page
 from app import models
 
 router = APIRouter()
 
-@router.post("/", response_model=sch.MesureOut)
-def create_mesure(payload: sch.MesureCreate, db: Session = Depends(get_db)):
-    # validate capteur exist
-    cap = db.query(models.Capteur).filter(models.Capteur.uuid_capteur == payload.uuid_capteur).first()
-    if not cap:
+# Taille maximale d'un lot accepté par POST /mesures/batch
+BATCH_MAX_ROWS = int(os.getenv("MESURE_BATCH_MAX_ROWS", "50000"))
+# Intervalle des commentaires keepalive du flux SSE /mesures/stream (secondes)
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("MESURE_STREAM_HEARTBEAT", "15"))
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+def _after_commit(rows, arrondissements):
+    """Mesures commitées (dicts) : invalidation du cache analytics et des tuiles, flux temps réel, agrégats glissants, anomalies."""
+    analytics_cache.invalidate(*{f"mesure:{r['pollutant']}" for r in rows})
+    heatmap.invalidate_mesures(rows)
+    if len(hub):
+        hub.publish(mesure_messages(rows, arrondissements))
+    if live_stats.LIVE_STATS_ENABLED:
+        live_stats.aggregator.add(rows, arrondissements)
+    if anomaly.ANOMALY_DETECTION_ENABLED:
+        anomaly.process(rows)
+
+def _create_mesure(db: Session, payload: sch.MesureCreate):
+    # validate capteur exist (registre en mémoire, base en cas d'absence)
+    known = references.capteurs.lookup(db, [payload.uuid_capteur])
+    if payload.uuid_capteur not in known:
         raise HTTPException(status_code=400, detail="Capteur not found")
     obj = models.Mesure(**payload.dict())
     db.add(obj)
-    db.commit()
+    try:
+        rollup.apply(db, [payload.dict()])
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not references.is_fk_violation(e):
+            raise
+        # capteur supprimé depuis sa mise en registre
+        references.capteurs.forget(payload.uuid_capteur)
+        raise HTTPException(status_code=400, detail="Capteur not found")
+    _after_commit([payload.dict()], known)
     db.refresh(obj)
     return obj
 
+def _enqueue_mesure(db: Session, payload: sch.MesureCreate):
+    """Mode différé : capteur vérifié, mesure mise en file (202) ; 503 si la file est pleine."""
+    if not references.capteurs.exists(db, payload.uuid_capteur):
+        raise HTTPException(status_code=400, detail="Capteur not found")
+    try:
+        depth = write_behind.writer.submit([payload.dict()])
+    except write_behind.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return fastjson.FastJSONResponse({"status": "queued", "queue_depth": depth}, status_code=202)
+
+WRITE_BEHIND_RESPONSES = {
+    202: {"model": sch.MesureQueued, "description": "Mesure mise en file (WRITE_BEHIND_ENABLED)"},
+    503: {"description": "File d'ingestion différée pleine (Retry-After)"},
+}
+
+@router.post("/", response_model=sch.MesureOut, responses=WRITE_BEHIND_RESPONSES)
+def create_mesure(payload: sch.MesureCreate, db: Session = Depends(get_db)):
+    if write_behind.WRITE_BEHIND_ENABLED:
+        return _enqueue_mesure(db, payload)
+    return _create_mesure(db, payload)
+
+def _parse_batch_body(body: bytes, content_type: str):
+    """Retourne une liste de (index, item | None, erreur | None) à partir d'un tableau JSON ou de NDJSON."""
+    if content_type.split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES:
+        parsed = []
+        index = 0
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                parsed.append((index, json.loads(line), None))
+            except ValueError as e:
+                parsed.append((index, None, f"invalid JSON: {e}"))
+            index += 1
+        return parsed
+
+    try:
+        items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array of mesures")
+    return [(i, item, None) for i, item in enumerate(items)]
+
+def _ingest_batch(db: Session, parsed):
+    errors = []
+    valid = []
+    for index, item, error in parsed:
+        if error is not None:
+            errors.append({"index": index, "detail": error})
+            continue
+        try:
+            valid.append((index, sch.MesureCreate.model_validate(item)))
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc']) or 'body'}: {err['msg']}" for err in e.errors()
+            )
+            errors.append({"index": index, "detail": detail})
+
+    # validate capteurs exist: registre en mémoire, une requête pour les capteurs qu'il ne connaît pas
+    uuids = {m.uuid_capteur for _, m in valid}
+    for attempt in (1, 2):
+        known = references.capteurs.lookup(db, uuids)
+        rows = []
+        unknown = []
+        for index, m in valid:
+            if m.uuid_capteur not in known:
+                unknown.append({"index": index, "detail": "Capteur not found"})
+            else:
+                rows.append(m.dict())
+        try:
+            inserted = ingestion.insert_mesures(db, rows)
+            db.commit()
+            break
+        except IntegrityError as e:
+            db.rollback()
+            if attempt == 2 or not references.is_fk_violation(e):
+                raise
+            # un capteur du registre a été supprimé entre-temps : revérifier le lot en base
+            references.capteurs.forget(*uuids)
+    errors.extend(unknown)
+    _after_commit(rows, known)
+
+    errors.sort(key=lambda e: e["index"])
+    return {"received": len(parsed), "inserted": inserted, "errors": errors}
+
+BATCH_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {"type": "array", "items": sch.MesureCreate.model_json_schema()},
+            },
+            "application/x-ndjson": {"schema": {"type": "string", "description": "Une mesure JSON par ligne"}},
+        },
+    }
+}
+
+@router.post("/batch", response_model=sch.MesureBatchResult, openapi_extra=BATCH_OPENAPI)
+async def create_mesures_batch(request: Request, db: Session = Depends(get_db)):
+    """
+    Ingestion d'un lot de mesures (tableau JSON ou NDJSON) en une seule transaction.
+    Les lignes invalides ou dont le capteur est inconnu sont rejetées individuellement
+    et listées dans `errors`, sans faire échouer le reste du lot.
+    """
+    parsed = _parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    if len(parsed) > BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {BATCH_MAX_ROWS} mesures)")
+    return await run_in_threadpool(_ingest_batch, db, parsed)
+
+# clé de tri des listes : plus récentes d'abord, id départage les ts égaux
+MESURE_KEY = [models.Mesure.ts, models.Mesure.id]
+
+def _filter_mesures(stmt, uuid_capteur=None, pollutant=None, ts_from=None, ts_to=None, id_arrondissement=None):
+    """Filtres communs des listes de mesures ; ts_from inclus, ts_to exclu."""
+    if id_arrondissement is not None:
+        stmt = stmt.join(models.Capteur, models.Capteur.uuid_capteur == models.Mesure.uuid_capteur)
+        stmt = stmt.where(models.Capteur.id_arrondissement == id_arrondissement)
+    if uuid_capteur is not None:
+        stmt = stmt.where(models.Mesure.uuid_capteur == uuid_capteur)
+    if pollutant is not None:
+        stmt = stmt.where(models.Mesure.pollutant == pollutant)
+    if ts_from is not None:
+        stmt = stmt.where(models.Mesure.ts >= ts_from)
+    if ts_to is not None:
+        stmt = stmt.where(models.Mesure.ts < ts_to)
+    return stmt
+
 @router.get("/", response_model=list[sch.MesureOut])
-def list_mesures(limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Mesure).order_by(models.Mesure.ts.desc()).limit(limit).all()
\ No newline at end of file
+def list_mesures(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    uuid_capteur: Optional[UUID] = None,
+    pollutant: Optional[str] = None,
+    ts_from: Optional[datetime] = None,
+    ts_to: Optional[datetime] = None,
+    db: Session = Depends(get_read_db),
+):
+    if fastjson.FAST_JSON:
+        q = _filter_mesures(fastjson.schema_query(db, sch.MesureOut, models.Mesure), uuid_capteur, pollutant, ts_from, ts_to)
+        return fastjson.rows_response(keyset_page(q, MESURE_KEY, limit, cursor, descending=True, response=response), sch.MesureOut, response)
+    q = _filter_mesures(db.query(models.Mesure), uuid_capteur, pollutant, ts_from, ts_to)
+    return keyset_page(q, MESURE_KEY, limit, cursor, descending=True, response=response)
+
+@router.get("/export", response_class=StreamingResponse, responses={200: {"content": {t: {} for t in export.MEDIA_TYPES.values()}}})
+def export_mesures(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$"),
+    uuid_capteur: Optional[UUID] = None,
+    id_arrondissement: Optional[int] = None,
+    pollutant: Optional[str] = None,
+    ts_from: Optional[datetime] = None,
+    ts_to: Optional[datetime] = None,
+):
+    """
+    Export en flux des mesures filtrées, triées par (ts, id) croissants.
+    Formats : ndjson (défaut), csv, arrow (flux IPC, nécessite pyarrow).
+    """
+    if format == "arrow" and export.pa is None:
+        raise HTTPException(status_code=400, detail="Arrow export requires pyarrow")
+    stmt = _filter_mesures(export.export_statement(), uuid_capteur, pollutant, ts_from, ts_to, id_arrondissement)
+    stmt = stmt.order_by(models.Mesure.ts, models.Mesure.id)
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        export.STREAMERS[format](stmt),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="mesures.{extension}"'},
+    )
+
+def _dropped_notice(sub):
+    n = sub.take_dropped()
+    return json.dumps({"dropped": n}) if n else None
+
+async def _wait_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+@router.websocket("/ws")
+async def mesures_ws(
+    websocket: WebSocket,
+    uuid_capteur: Optional[UUID] = None,
+    pollutant: Optional[str] = None,
+    id_arrondissement: Optional[int] = None,
+):
+    """
+    Mesures en temps réel, filtrables par capteur, polluant et arrondissement.
+    Un message JSON par mesure ; {"dropped": n} signale n mesures perdues par un client trop lent.
+    """
+    try:
+        sub = hub.subscribe(uuid_capteur=uuid_capteur, pollutant=pollutant, id_arrondissement=id_arrondissement)
+    except TooManySubscribers:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    disconnected = asyncio.ensure_future(_wait_disconnect(websocket))
+    try:
+        while True:
+            batch = asyncio.ensure_future(sub.next_batch())
+            await asyncio.wait({batch, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                batch.cancel()
+                break
+            notice = _dropped_notice(sub)
+            if notice:
+                await websocket.send_text(notice)
+            for data in batch.result():
+                await websocket.send_text(data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        hub.unsubscribe(sub)
+
+@router.get("/stream", response_class=StreamingResponse, responses={200: {"content": {"text/event-stream": {}}}})
+async def mesures_stream(
+    request: Request,
+    uuid_capteur: Optional[UUID] = None,
+    pollutant: Optional[str] = None,
+    id_arrondissement: Optional[int] = None,
+):
+    """
+    Variante Server-Sent Events de /mesures/ws : un événement par mesure,
+    un événement `dropped` quand le client a pris du retard.
+    """
+    try:
+        sub = hub.subscribe(uuid_capteur=uuid_capteur, pollutant=pollutant, id_arrondissement=id_arrondissement)
+    except TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many live subscribers")
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    batch = await asyncio.wait_for(sub.next_batch(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                notice = _dropped_notice(sub)
+                head = f"event: dropped\ndata: {notice}\n\n" if notice else ""
+                yield head + "".join(f"data: {data}\n\n" for data in batch)
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
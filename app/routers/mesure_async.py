@@ -0,0 +1,63 @@
+"""
+Variante async des routes /mesures (activée avec DB_ASYNC=1).
+
+Les routes attendent la base sans occuper un worker du threadpool ; la logique métier
+reste celle du router synchrone, exécutée via AsyncSession.run_sync.
+"""
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, get_async_read_db
+from app.schemas import mesure as sch
+from app.routers.mesure import BATCH_MAX_ROWS, BATCH_OPENAPI, MESURE_KEY, WRITE_BEHIND_RESPONSES, _create_mesure, _enqueue_mesure, _filter_mesures, _ingest_batch, _parse_batch_body, export_mesures, mesures_stream, mesures_ws
+from app.services import fastjson, write_behind
+from app.services.pagination import apply_keyset, set_next_cursor
+from app import models
+
+router = APIRouter()
+
+@router.post("/", response_model=sch.MesureOut, responses=WRITE_BEHIND_RESPONSES)
+async def create_mesure(payload: sch.MesureCreate, db: AsyncSession = Depends(get_async_db)):
+    if write_behind.WRITE_BEHIND_ENABLED:
+        return await db.run_sync(_enqueue_mesure, payload)
+    return await db.run_sync(_create_mesure, payload)
+
+@router.post("/batch", response_model=sch.MesureBatchResult, openapi_extra=BATCH_OPENAPI)
+async def create_mesures_batch(request: Request, db: AsyncSession = Depends(get_async_db)):
+    parsed = _parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    if len(parsed) > BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {BATCH_MAX_ROWS} mesures)")
+    return await db.run_sync(_ingest_batch, parsed)
+
+@router.get("/", response_model=list[sch.MesureOut])
+async def list_mesures(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    uuid_capteur: Optional[UUID] = None,
+    pollutant: Optional[str] = None,
+    ts_from: Optional[datetime] = None,
+    ts_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    if fastjson.FAST_JSON:
+        stmt = select(*fastjson.schema_columns(sch.MesureOut, models.Mesure))
+    else:
+        stmt = select(models.Mesure)
+    stmt = _filter_mesures(stmt, uuid_capteur, pollutant, ts_from, ts_to)
+    stmt = apply_keyset(stmt, MESURE_KEY, cursor, descending=True)
+    result = await db.execute(stmt.limit(limit))
+    rows = result.all() if fastjson.FAST_JSON else result.scalars().all()
+    set_next_cursor(response, rows, MESURE_KEY, limit)
+    if fastjson.FAST_JSON:
+        return fastjson.rows_response(rows, sch.MesureOut, response)
+    return rows
+
+# routes sans session de requête (export sur sa propre connexion, flux temps réel) : identiques au mode synchrone
+router.add_api_route("/export", export_mesures, methods=["GET"], response_class=StreamingResponse)
+router.add_api_route("/stream", mesures_stream, methods=["GET"], response_class=StreamingResponse)
+router.add_api_websocket_route("/ws", mesures_ws)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+from app.services import anomaly, query_stats
+from app.services.metrics import registry
+
+router = APIRouter()
+
+@router.get("", response_class=PlainTextResponse)
+def metrics():
+    """Métriques au format texte Prometheus (pools de connexions, cache analytics...)."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/slow_queries")
+def slow_queries(limit: int = Query(20, ge=1, le=1000)):
+    """Dernières instructions SQL plus longues que SLOW_QUERY_MS, avec leur plan EXPLAIN (lectures)."""
+    return {
+        "threshold_ms": query_stats.SLOW_QUERY_MS,
+        "queries": query_stats.recent_slow_queries(limit),
+    }
+
+
+@router.get("/anomalies")
+def anomalies(limit: int = Query(50, ge=1, le=anomaly.RECENT_MAX)):
+    """Dernières anomalies détectées à l'ingestion (spike, drift, stuck), la plus récente en premier."""
+    return {
+        "enabled": anomaly.ANOMALY_DETECTION_ENABLED,
+        "anomalies": list(anomaly.detector.recent)[::-1][:limit],
+    }
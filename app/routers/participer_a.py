@@ -1,19 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import participer_a as sch
 from app import models
+from app.services import references
 
 router = APIRouter()
 
 @router.post("/", response_model=sch.ParticiperAOut)
 def create_participation(payload: sch.ParticiperACreate, db: Session = Depends(get_db)):
-    c = db.get(models.Citoyen, payload.id_citoyen)
-    con = db.get(models.Consultation, payload.id_consultation)
-    if not c or not con:
+    if not references.citoyens.exists(db, payload.id_citoyen) or not references.consultations.exists(db, payload.id_consultation):
         raise HTTPException(status_code=400, detail="Citoyen or Consultation not found")
     obj = models.ParticiperA(**payload.dict())
     db.add(obj)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not references.is_fk_violation(e):
+            raise
+        references.citoyens.forget(payload.id_citoyen)
+        references.consultations.forget(payload.id_consultation)
+        raise HTTPException(status_code=400, detail="Citoyen or Consultation not found")
     db.refresh(obj)
     return obj
\ No newline at end of file
@@ -1,10 +1,13 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas import proprietaire as sch
 from app import models
+from app.services.pagination import keyset_page
+from app.services import fastjson
 
 router = APIRouter()
 
@@ -34,8 +37,12 @@ def create_proprietaire(payload: sch.ProprietaireCreate, db: Session = Depends(g
     }
 
 @router.get("/", response_model=list[sch.ProprietaireOut])
-def list_proprietaires(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Proprietaire).offset(skip).limit(limit).all()
+def list_proprietaires(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    key = [models.Proprietaire.id_proprietaire]
+    if fastjson.FAST_JSON:
+        q = fastjson.schema_query(db, sch.ProprietaireOut, models.Proprietaire, key)
+        return fastjson.rows_response(keyset_page(q, key, limit, cursor, response=response, skip=skip), sch.ProprietaireOut, response)
+    return keyset_page(db.query(models.Proprietaire), key, limit, cursor, response=response, skip=skip)
 
 @router.get("/{id_}", response_model=sch.ProprietaireOut)
 def get_one(id_: int, db: Session = Depends(get_db)):
@@ -1,17 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import realiser as sch
 from app import models
+from app.services import references
 
 router = APIRouter()
 
 @router.post("/", response_model=sch.RealiserCreate)
 def add_realiser(payload: sch.RealiserCreate, db: Session = Depends(get_db)):
     # validate existence
-    inter = db.query(models.Intervention).filter(models.Intervention.id_intervention == payload.id_intervention).first()
-    tech = db.query(models.Technicien).filter(models.Technicien.id_technicien == payload.id_technicien).first()
-    if not inter or not tech:
+    inter = db.get(models.Intervention, payload.id_intervention)
+    if not inter or not references.techniciens.exists(db, payload.id_technicien):
         raise HTTPException(status_code=400, detail="Intervention or Technicien not found")
     existing = db.query(models.Realiser).filter(
         models.Realiser.id_intervention == payload.id_intervention,
@@ -21,7 +22,14 @@ def add_realiser(payload: sch.RealiserCreate, db: Session = Depends(get_db)):
         return existing
     obj = models.Realiser(id_intervention=payload.id_intervention, id_technicien=payload.id_technicien, role=payload.role)
     db.add(obj)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not references.is_fk_violation(e):
+            raise
+        references.techniciens.forget(payload.id_technicien)
+        raise HTTPException(status_code=400, detail="Intervention or Technicien not found")
     db.refresh(obj)
     return obj
 
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas import technicien as sch
 from app import models
+from app.services.pagination import keyset_page
+from app.services import fastjson, references
 
 router = APIRouter()
 
@@ -12,8 +15,13 @@ def create_technicien(payload: sch.TechnicienCreate, db: Session = Depends(get_d
     db.add(obj)
     db.commit()
     db.refresh(obj)
+    references.techniciens.put(obj.id_technicien)
     return obj
 
 @router.get("/", response_model=list[sch.TechnicienOut])
-def list_techniciens(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Technicien).offset(skip).limit(limit).all()
\ No newline at end of file
+def list_techniciens(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, db: Session = Depends(get_read_db)):
+    key = [models.Technicien.id_technicien]
+    if fastjson.FAST_JSON:
+        q = fastjson.schema_query(db, sch.TechnicienOut, models.Technicien, key)
+        return fastjson.rows_response(keyset_page(q, key, limit, cursor, response=response, skip=skip), sch.TechnicienOut, response)
+    return keyset_page(db.query(models.Technicien), key, limit, cursor, response=response, skip=skip)
\ No newline at end of file
@@ -1,25 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas import vehicule as sch
 from app import models
+from app.services import references
+from app.services.cache import analytics_cache
 
 router = APIRouter()
 
 @router.post("/", response_model=sch.TrajetOut)
 def create_trajet(payload: sch.TrajetCreate, db: Session = Depends(get_db)):
-    if payload.plaque:
-        v = db.query(models.Vehicule).filter(models.Vehicule.plaque == payload.plaque).first()
-        if not v:
-            raise HTTPException(status_code=400, detail="Vehicule not found")
+    if payload.plaque and not references.vehicules.exists(db, payload.plaque):
+        raise HTTPException(status_code=400, detail="Vehicule not found")
     obj = models.Trajet(**payload.dict())
     db.add(obj)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if not references.is_fk_violation(e):
+            raise
+        references.vehicules.forget(payload.plaque)
+        raise HTTPException(status_code=400, detail="Vehicule not found")
+    analytics_cache.invalidate("trajet")
     db.refresh(obj)
     return obj
 
 @router.get("/top")
-def top_trajets(limit: int = 20, db: Session = Depends(get_db)):
+def top_trajets(limit: int = 20, db: Session = Depends(get_read_db)):
     q = (
         db.query(
             models.Trajet.id_trajet,
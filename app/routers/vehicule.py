@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import vehicule as sch
 from app import models
+from app.services import references
 
 router = APIRouter()
 
@@ -12,4 +13,5 @@ def create_vehicule(payload: sch.VehiculeCreate, db: Session = Depends(get_db)):
     db.add(obj)
     db.commit()
     db.refresh(obj)
+    references.vehicules.put(obj.plaque)
     return obj
\ No newline at end of file
@@ -1,6 +1,8 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+from uuid import UUID
+from app.models.capteur import CapteurStatusEnum
 
 class CapteurBase(BaseModel):
     type_capteur: str
@@ -19,3 +21,33 @@ class CapteurCreate(CapteurBase):
 class CapteurOut(CapteurBase):
     class Config:
         orm_mode = True
+
+class CapteurStatusCreate(BaseModel):
+    status: CapteurStatusEnum
+    ts: Optional[datetime] = None
+
+class CapteurStatusOut(BaseModel):
+    uuid_capteur: UUID
+    status: CapteurStatusEnum
+    ts: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class CapteurPurge(BaseModel):
+    # filtres combinés ; au moins un requis
+    id_proprietaire: Optional[int] = None
+    id_arrondissement: Optional[int] = None
+    uuids: Optional[List[UUID]] = None
+
+class CapteurPurgeJob(BaseModel):
+    id: str
+    status: str
+    filters: dict
+    capteurs_total: int
+    capteurs_deleted: int
+    rows_deleted: Dict[str, int]
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, List
 from datetime import datetime
 from decimal import Decimal
 from uuid import UUID
@@ -7,13 +7,28 @@ from uuid import UUID
 class MesureCreate(BaseModel):
     uuid_capteur: UUID
     ts: datetime
-    pollutant: str
-    valeur: Decimal
-    unite: Optional[str]
+    # bornes des colonnes (String(100), Numeric(14,6), String(30)) : une valeur hors bornes
+    # est refusée ici plutôt qu'à l'écriture (qui, en ingestion différée, a lieu après le 202)
+    pollutant: str = Field(max_length=100)
+    valeur: Decimal = Field(gt=-10**8, lt=10**8)
+    unite: Optional[str] = Field(max_length=30)
 
 class MesureOut(MesureCreate):
     id: int
     class Config:
         model_config = {
             "from_attributes": True
-        }
\ No newline at end of file
+        }
+
+class MesureBatchError(BaseModel):
+    index: int
+    detail: str
+
+class MesureBatchResult(BaseModel):
+    received: int
+    inserted: int
+    errors: List[MesureBatchError] = []
+
+class MesureQueued(BaseModel):
+    status: str = "queued"
+    queue_depth: int
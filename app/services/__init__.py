@@ -0,0 +1 @@
+# package marker for services
\ No newline at end of file
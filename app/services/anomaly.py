@@ -0,0 +1,246 @@
+"""
+Détection d'anomalies sur les mesures ingérées, qui ouvre des interventions prédictives.
+
+Chaque couple (capteur, polluant) garde une moyenne EWMA rapide (ANOMALY_ALPHA) et une
+lente (ANOMALY_SLOW_ALPHA), une variance EWMA du bruit (écarts entre mesures successives,
+taux ANOMALY_SLOW_ALPHA), la dernière valeur et la longueur de la série de valeurs
+identiques. Trois signaux, après ANOMALY_WARMUP mesures :
+
+- spike : |valeur - moyenne rapide| > ANOMALY_SPIKE_Z écarts-types du bruit ;
+- drift : la moyenne rapide s'écarte de la moyenne lente de plus de ANOMALY_DRIFT_Z
+  écarts-types du bruit, après 1 / ANOMALY_SLOW_ALPHA mesures, sur les moyennes d'avant la
+  mesure courante : une valeur isolée, même très éloignée, est un spike, pas une dérive ;
+- spike l'emporte sur drift quand les deux sont vrais pour une mesure ;
+- stuck : ANOMALY_STUCK_COUNT valeurs identiques d'affilée.
+
+L'état est rangé en colonnes NumPy (un indice par couple) et chaque lot ingéré est traité
+en colonnes : les mesures sont triées par (couple, ts) et la récurrence EWMA avance d'un
+rang à la fois pour tous les couples du lot. Le coût en Python suit donc le nombre maximal
+de mesures d'un même couple dans le lot, pas la taille du lot.
+
+Un capteur signalé reçoit une intervention `predictive` (ia_valide à false) sauf s'il en a
+déjà une de moins de ANOMALY_DEDUP_SECONDS : un capteur bruité n'en ouvre qu'une par
+fenêtre. L'état est local au processus et repart de zéro au démarrage (ANOMALY_WARMUP
+mesures avant les premiers signaux) ; la déduplication, elle, est vérifiée en base.
+
+ANOMALY_DETECTION_ENABLED=true pour l'activer.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from app import models
+from app.services.metrics import registry
+
+ANOMALY_DETECTION_ENABLED = os.getenv("ANOMALY_DETECTION_ENABLED", "false").lower() in ("1", "true", "yes")
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.05"))
+ANOMALY_SLOW_ALPHA = float(os.getenv("ANOMALY_SLOW_ALPHA", "0.01"))
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "30"))
+ANOMALY_SPIKE_Z = float(os.getenv("ANOMALY_SPIKE_Z", "6"))
+ANOMALY_DRIFT_Z = float(os.getenv("ANOMALY_DRIFT_Z", "3"))
+ANOMALY_STUCK_COUNT = int(os.getenv("ANOMALY_STUCK_COUNT", "20"))
+ANOMALY_DEDUP_SECONDS = float(os.getenv("ANOMALY_DEDUP_SECONDS", "86400"))
+
+# écart-type plancher : une série constante ne fait pas d'un écart infime un spike
+MIN_STD = 1e-3
+# anomalies récentes gardées pour /metrics/anomalies
+RECENT_MAX = 200
+
+KINDS = (None, "spike", "drift", "stuck")
+SPIKE, DRIFT, STUCK = 1, 2, 3
+
+DETECTED = registry.counter("anomaly_detected_total", "Sensors flagged per ingestion batch, by kind")
+INTERVENTIONS = registry.counter("anomaly_interventions_total", "Predictive interventions opened by the anomaly detector")
+TRACKED = registry.gauge("anomaly_tracked_series", "(capteur, pollutant) series tracked by the anomaly detector")
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class AnomalyDetector:
+    def __init__(self, alpha: float = ANOMALY_ALPHA, slow_alpha: float = ANOMALY_SLOW_ALPHA, warmup: int = ANOMALY_WARMUP,
+                 spike_z: float = ANOMALY_SPIKE_Z, drift_z: float = ANOMALY_DRIFT_Z, stuck_count: int = ANOMALY_STUCK_COUNT,
+                 dedup_seconds: float = ANOMALY_DEDUP_SECONDS):
+        self.alpha = alpha
+        self.slow_alpha = slow_alpha
+        self.warmup = warmup
+        self.slow_warmup = max(warmup, math.ceil(1 / slow_alpha))
+        self.spike_z = spike_z
+        self.drift_z = drift_z
+        self.stuck_count = stuck_count
+        self.dedup_seconds = dedup_seconds
+        self._slots = {}  # (uuid_capteur, pollutant) -> indice dans les colonnes
+        self._lock = threading.Lock()
+        self._raised = {}  # uuid_capteur -> instant (monotonic) de la dernière intervention ouverte ou trouvée
+        self.recent = deque(maxlen=RECENT_MAX)
+        self._allocate(1024)
+        TRACKED.set_function(lambda: len(self._slots))
+
+    def _allocate(self, size: int):
+        old = getattr(self, "n", None)
+        cols = {
+            "n": np.zeros(size, dtype=np.int64),
+            "mean": np.zeros(size),
+            "noise": np.zeros(size),
+            "slow_mean": np.zeros(size),
+            "last": np.full(size, np.nan),
+            "run": np.zeros(size, dtype=np.int64),
+        }
+        if old is not None:
+            for name, col in cols.items():
+                col[:len(old)] = getattr(self, name)
+        for name, col in cols.items():
+            setattr(self, name, col)
+
+    def _slot(self, key) -> int:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = len(self._slots)
+            if slot >= len(self.n):
+                self._allocate(2 * len(self.n))
+        return slot
+
+    def _step(self, s, x):
+        """Une mesure pour chacun des couples `s` (indices distincts) : met l'état à jour, renvoie le code d'anomalie."""
+        n, mean, slow_mean, noise, last = self.n[s], self.mean[s], self.slow_mean[s], self.noise[s], self.last[s]
+        first = n == 0
+        std = np.maximum(np.sqrt(noise), MIN_STD)
+
+        spike = (n >= self.warmup) & (np.abs(x - mean) > self.spike_z * std)
+        # sur les moyennes d'avant x : un point aberrant déplace la moyenne rapide mais ne dérive pas
+        drift = (n >= self.slow_warmup) & (np.abs(mean - slow_mean) > self.drift_z * std)
+        run = np.where(x == last, self.run[s] + 1, 0)
+        stuck = run >= self.stuck_count - 1
+
+        # un spike n'entre dans l'état qu'à la limite de détection : il ne déplace pas les moyennes
+        # (pas de fausse dérive aux mesures suivantes) et ne gonfle pas le bruit
+        limit = np.where(n >= self.warmup, self.spike_z * std, np.inf)
+        kept = np.clip(x, mean - limit, mean + limit)
+        mean = np.where(first, x, mean + self.alpha * (kept - mean))
+        slow_mean = np.where(first, x, slow_mean + self.slow_alpha * (kept - slow_mean))
+        # variance du bruit par les écarts successifs (E[(x_t - x_t-1)^2] / 2) : insensible à une
+        # dérive lente ou à un changement de niveau ; moyenne simple tant que n < 1 / slow_alpha
+        rate = np.maximum(self.slow_alpha, 1.0 / np.maximum(n, 1))
+        step = np.clip(x - np.where(first, x, last), -limit, limit)
+        noise = np.where(first, 0.0, noise + rate * (np.square(step) / 2 - noise))
+
+        self.n[s] = n + 1
+        self.mean[s], self.slow_mean[s], self.noise[s] = mean, slow_mean, noise
+        self.last[s], self.run[s] = x, run
+        return np.where(stuck, STUCK, np.where(spike, SPIKE, np.where(drift, DRIFT, 0)))
+
+    def observe(self, rows):
+        """Mesures (dicts) d'un lot ingéré ; renvoie une anomalie (la première) par couple signalé."""
+        if not rows:
+            return []
+        with self._lock:
+            slots = np.fromiter((self._slot((r["uuid_capteur"], r["pollutant"])) for r in rows), dtype=np.int64, count=len(rows))
+            ts = np.fromiter((_epoch(r["ts"]) for r in rows), dtype=np.float64, count=len(rows))
+            x = np.fromiter((float(r["valeur"]) for r in rows), dtype=np.float64, count=len(rows))
+
+            order = np.lexsort((ts, slots))
+            slots = slots[order]
+            # rang de chaque mesure dans son couple, puis positions regroupées par rang
+            pos = np.arange(len(slots))
+            starts = np.r_[True, slots[1:] != slots[:-1]]
+            rank = pos - np.maximum.accumulate(np.where(starts, pos, 0))
+            by_rank = np.argsort(rank, kind="stable")
+            kinds = np.zeros(len(slots), dtype=np.int8)
+            offset = 0
+            for count in np.bincount(rank):
+                at = by_rank[offset:offset + count]
+                offset += count
+                kinds[at] = self._step(slots[at], x[order[at]])
+
+            flagged = np.flatnonzero(kinds)
+            _, first = np.unique(slots[flagged], return_index=True)
+            out = []
+            for i in flagged[first]:
+                row = rows[order[i]]
+                s = slots[i]
+                out.append({
+                    "uuid_capteur": row["uuid_capteur"],
+                    "pollutant": row["pollutant"],
+                    "kind": KINDS[kinds[i]],
+                    "ts": row["ts"],
+                    "valeur": float(row["valeur"]),
+                    "mean": round(float(self.mean[s]), 4),
+                    "std": round(float(np.sqrt(self.noise[s])), 4),
+                })
+        for a in out:
+            DETECTED.inc(kind=a["kind"])
+        self.recent.extend(out)
+        return out
+
+    def raise_interventions(self, db, anomalies):
+        """
+        Ouvre une intervention prédictive par capteur signalé, hors de ceux qui en ont une
+        de moins de dedup_seconds (mémoire du processus puis base). Commit inclus ;
+        renvoie le nombre d'interventions créées.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = {a["uuid_capteur"] for a in anomalies if self._raised.get(a["uuid_capteur"], -math.inf) + self.dedup_seconds <= now}
+            for u in candidates:
+                self._raised[u] = now
+        if not candidates:
+            return 0
+        at = datetime.now(timezone.utc)
+        try:
+            recent = {
+                r[0]
+                for r in db.query(models.Intervention.uuid_capteur).filter(
+                    models.Intervention.uuid_capteur.in_(candidates),
+                    models.Intervention.nature == "predictive",
+                    models.Intervention.date_heure >= at - timedelta(seconds=self.dedup_seconds),
+                ).distinct()
+            }
+            created = candidates - recent
+            db.add_all(
+                models.Intervention(date_heure=at, nature="predictive", ia_valide=False, uuid_capteur=u)
+                for u in created
+            )
+            db.commit()
+        except Exception:
+            # rien d'écrit : ces capteurs pourront être signalés au prochain lot
+            with self._lock:
+                for u in candidates:
+                    self._raised.pop(u, None)
+            raise
+        INTERVENTIONS.inc(len(created))
+        return len(created)
+
+
+detector = AnomalyDetector()
+
+
+def process(rows):
+    """Après commit d'un lot de mesures : détection, puis interventions sur leur propre session."""
+    anomalies = detector.observe(rows)
+    if not anomalies:
+        return 0
+    from app.database import SessionLocal
+    from app.services.cache import analytics_cache
+
+    db = SessionLocal()
+    try:
+        created = detector.raise_interventions(db, anomalies)
+    except Exception:
+        db.rollback()
+        logger.exception("could not open predictive interventions for %d flagged sensor(s)", len(anomalies))
+        return 0
+    finally:
+        db.close()
+    if created:
+        analytics_cache.invalidate("intervention")
+        logger.info("opened %d predictive intervention(s): %s", created, ", ".join(f"{a['uuid_capteur']} {a['kind']}" for a in anomalies))
+    return created
@@ -0,0 +1,81 @@
+"""
+Indice de qualité de l'air (échelle 0-500 de l'US EPA) à partir de concentrations moyennes.
+
+Chaque polluant a une table de points (concentration, indice) ; l'indice est interpolé
+linéairement entre deux points et plafonné au dernier. L'indice composite d'un lieu est le
+maximum des indices de ses polluants, le polluant correspondant est le polluant dominant.
+
+Tables par défaut en µg/m³ (unité des mesures) : seuils EPA pour PM2.5 et PM10 ; NO2, O3
+et SO2 convertis des ppb de l'EPA à 25 °C. Les moyennes sont celles de la fenêtre
+demandée, pas les durées réglementaires de chaque polluant (1 h, 8 h, 24 h) : l'indice est
+indicatif. AQI_BREAKPOINTS désigne un fichier JSON qui remplace ou complète ces tables :
+{"PM2.5": [[0, 0], [9.0, 50], [35.4, 100], ...], ...}.
+"""
+import json
+import os
+import numpy as np
+
+AQI_BREAKPOINTS = os.getenv("AQI_BREAKPOINTS")
+
+_INDEX = (0, 50, 100, 150, 200, 300, 500)
+
+
+def _ppb(factor: float, limits):
+    return [round(c * factor, 1) for c in limits]
+
+
+DEFAULT_BREAKPOINTS = {
+    "PM2.5": [0, 9.0, 35.4, 55.4, 125.4, 225.4, 325.4],
+    "PM10": [0, 54, 154, 254, 354, 424, 604],
+    "NO2": _ppb(1.88, [0, 53, 100, 360, 649, 1249, 2049]),
+    "O3": _ppb(1.96, [0, 54, 70, 85, 105, 200, 604]),
+    "SO2": _ppb(2.62, [0, 35, 75, 185, 304, 604, 1004]),
+}
+
+CATEGORIES = (
+    (50, "good"),
+    (100, "moderate"),
+    (150, "unhealthy_for_sensitive_groups"),
+    (200, "unhealthy"),
+    (300, "very_unhealthy"),
+    (float("inf"), "hazardous"),
+)
+
+
+def load_tables(path: str = None):
+    """{polluant: (concentrations, indices)} : tables par défaut, complétées par le fichier JSON."""
+    tables = {p: (np.array(c, dtype=np.float64), np.array(_INDEX, dtype=np.float64)) for p, c in DEFAULT_BREAKPOINTS.items()}
+    if path:
+        with open(path) as f:
+            for pollutant, points in json.load(f).items():
+                points = np.array(points, dtype=np.float64)
+                if points.ndim != 2 or points.shape[1] != 2 or len(points) < 2 or np.any(np.diff(points[:, 0]) <= 0):
+                    raise ValueError(f"{path}: {pollutant} must be a list of [concentration, index] with increasing concentrations")
+                tables[pollutant] = (points[:, 0], points[:, 1])
+    return tables
+
+
+TABLES = load_tables(AQI_BREAKPOINTS)
+
+
+def index(pollutant: str, concentration):
+    """Indice d'un polluant (None sans table ou sans valeur)."""
+    table = TABLES.get(pollutant)
+    if table is None or concentration is None:
+        return None
+    return int(round(float(np.interp(concentration, *table))))
+
+
+def category(aqi):
+    if aqi is None:
+        return None
+    return next(name for limit, name in CATEGORIES if aqi <= limit)
+
+
+def composite(indexes: dict):
+    """(indice, polluant dominant) depuis {polluant: indice} ; (None, None) si aucun indice."""
+    known = {p: i for p, i in indexes.items() if i is not None}
+    if not known:
+        return None, None
+    dominant = max(known, key=lambda p: (known[p], p))
+    return known[dominant], dominant
@@ -0,0 +1,161 @@
+"""
+Disponibilité des capteurs sur une période, à partir des transitions de capteur_status_history.
+
+Les transitions deviennent des intervalles en une requête : pour chaque capteur, le statut
+en vigueur au début de la période (dernière transition antérieure, une recherche dans
+l'index (uuid_capteur, ts) par capteur) puis les transitions de la période ; LEAD donne la
+fin de chaque intervalle (la fin de période pour le dernier), LAG le statut précédent.
+Seul `active` compte comme disponible.
+
+Par capteur et par arrondissement, sur [ts_from, as_of) :
+
+- uptime_pct : temps actif / temps observé (pondéré par la durée, pas par capteur) ;
+- failures : passages de active à un autre statut ; repairs : retours à active ;
+- mtbf_seconds : temps actif / failures ;
+- mttr_seconds : durée moyenne d'indisponibilité réparée (les pannes en cours à as_of
+  n'en font pas partie) ;
+- status : statut à as_of (instantané historique, comme /availability_by_arrondissement).
+
+Un capteur sans transition avant as_of n'est pas observé (observed_seconds nul).
+"""
+from datetime import datetime
+from sqlalchemy import and_, case, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import Session
+from app import models
+from app.models.capteur import CapteurStatusEnum
+
+ACTIVE = CapteurStatusEnum.active
+
+
+def _intervals(ts_from: datetime, as_of: datetime, uuid_capteur=None, id_arrondissement: int = None):
+    h = models.CapteurStatusHistory
+    c = models.Capteur
+    capteurs = select(c.uuid_capteur)
+    if uuid_capteur is not None:
+        capteurs = capteurs.where(c.uuid_capteur == uuid_capteur)
+    if id_arrondissement is not None:
+        capteurs = capteurs.where(c.id_arrondissement == id_arrondissement)
+    capteurs = capteurs.subquery("capteurs")
+
+    seed = (
+        select(h.status)
+        .where(h.uuid_capteur == capteurs.c.uuid_capteur, h.ts < ts_from)
+        .order_by(h.ts.desc(), h.id.desc())
+        .limit(1)
+        .lateral("seed")
+    )
+    events = union_all(
+        # statut en vigueur à ts_from, placé avant toute transition de la période
+        select(capteurs.c.uuid_capteur, seed.c.status, literal(ts_from, h.ts.type).label("ts"), literal(0, h.id.type).label("id"))
+        .select_from(capteurs.join(seed, literal(True))),
+        select(h.uuid_capteur, h.status, h.ts, h.id)
+        .join(capteurs, capteurs.c.uuid_capteur == h.uuid_capteur)
+        .where(h.ts >= ts_from, h.ts < as_of),
+    ).subquery("events")
+
+    window = {"partition_by": events.c.uuid_capteur, "order_by": (events.c.ts, events.c.id)}
+    spans = select(
+        events.c.uuid_capteur,
+        events.c.status,
+        events.c.ts,
+        events.c.id,
+        func.extract("epoch", func.lead(events.c.ts, 1, literal(as_of, events.c.ts.type)).over(**window) - events.c.ts).label("seconds"),
+        func.lag(events.c.status).over(**window).label("previous"),
+    ).subquery("spans")
+
+    # début du dernier retour à active : l'indisponibilité antérieure est réparée
+    repair = and_(spans.c.status == ACTIVE, spans.c.previous != ACTIVE)
+    flagged = select(
+        spans,
+        func.max(case((repair, spans.c.ts))).over(partition_by=spans.c.uuid_capteur).label("last_repair"),
+    ).subquery("flagged")
+
+    f = flagged.c
+    return (
+        select(
+            f.uuid_capteur,
+            func.sum(f.seconds).label("observed"),
+            func.sum(case((f.status == ACTIVE, f.seconds), else_=0)).label("up"),
+            func.sum(case((and_(f.status != ACTIVE, f.previous == ACTIVE), 1), else_=0)).label("failures"),
+            func.sum(case((and_(f.status == ACTIVE, f.previous != ACTIVE), 1), else_=0)).label("repairs"),
+            func.sum(case((and_(f.status != ACTIVE, f.ts < f.last_repair), f.seconds), else_=0)).label("repaired_down"),
+            func.array_agg(aggregate_order_by(f.status, f.ts.desc(), f.id.desc()))[1].label("status"),
+        )
+        .group_by(f.uuid_capteur)
+        .cte("sensor_availability")
+    )
+
+
+def _ratio(num, den, digits: int = 1):
+    return round(float(num) / float(den), digits) if den else None
+
+
+def _figures(observed, up, failures, repairs, repaired_down):
+    return {
+        "observed_seconds": round(float(observed or 0), 1),
+        "uptime_pct": _ratio(100 * (up or 0), observed, 2),
+        "failures": int(failures or 0),
+        "repairs": int(repairs or 0),
+        "mtbf_seconds": _ratio(up, failures),
+        "mttr_seconds": _ratio(repaired_down, repairs),
+    }
+
+
+def by_capteur(db: Session, ts_from: datetime, as_of: datetime, uuid_capteur=None, id_arrondissement: int = None,
+               limit: int = 100, order_by: str = "uptime"):
+    """Disponibilité par capteur ; order_by=uptime (les moins disponibles d'abord) ou failures."""
+    if order_by not in ("uptime", "failures"):
+        raise ValueError("order_by must be uptime or failures")
+    s = _intervals(ts_from, as_of, uuid_capteur, id_arrondissement)
+    uptime = s.c.up / func.nullif(s.c.observed, 0)
+    q = (
+        select(s, models.Capteur.id_arrondissement)
+        .join(models.Capteur, models.Capteur.uuid_capteur == s.c.uuid_capteur)
+        .order_by(*((uptime.asc().nulls_last(),) if order_by == "uptime" else (s.c.failures.desc(),)), s.c.uuid_capteur)
+        .limit(limit)
+    )
+    return [
+        {
+            "uuid_capteur": str(r.uuid_capteur),
+            "id_arrondissement": r.id_arrondissement,
+            "status": r.status.value if r.status is not None else None,
+            **_figures(r.observed, r.up, r.failures, r.repairs, r.repaired_down),
+        }
+        for r in db.execute(q)
+    ]
+
+
+def by_arrondissement(db: Session, ts_from: datetime, as_of: datetime):
+    """Disponibilité pondérée par le temps de chaque arrondissement et part des capteurs actifs à as_of."""
+    s = _intervals(ts_from, as_of)
+    a = models.Arrondissement
+    q = (
+        select(
+            a.id_arrondissement,
+            a.nom,
+            func.count(s.c.uuid_capteur).label("nb_capteurs"),
+            func.sum(case((s.c.status == ACTIVE, 1), else_=0)).label("nb_active"),
+            func.sum(s.c.observed).label("observed"),
+            func.sum(s.c.up).label("up"),
+            func.sum(s.c.failures).label("failures"),
+            func.sum(s.c.repairs).label("repairs"),
+            func.sum(s.c.repaired_down).label("repaired_down"),
+        )
+        .select_from(s)
+        .join(models.Capteur, models.Capteur.uuid_capteur == s.c.uuid_capteur)
+        .join(a, a.id_arrondissement == models.Capteur.id_arrondissement)
+        .group_by(a.id_arrondissement, a.nom)
+    )
+    out = [
+        {
+            "id_arrondissement": r.id_arrondissement,
+            "nom": r.nom,
+            "nb_capteurs": r.nb_capteurs,
+            "pct_active": _ratio(100 * r.nb_active, r.nb_capteurs, 2),
+            **_figures(r.observed, r.up, r.failures, r.repairs, r.repaired_down),
+        }
+        for r in db.execute(q)
+    ]
+    out.sort(key=lambda r: (r["uptime_pct"] is None, r["uptime_pct"] or 0, r["id_arrondissement"]))
+    return out
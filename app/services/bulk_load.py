@@ -0,0 +1,310 @@
+"""
+Import en masse hors API (capteurs, mesures, historique de statut) par COPY.
+
+Le fichier source (CSV avec en-tête, ou Parquet) est lu en flux et découpé en lots de
+--batch-rows lignes. Les lots sont écrits par COPY ... FROM STDIN dans des processus
+séparés (--workers), chacun avec sa propre connexion et un commit par lot. Les colonnes
+du fichier doivent porter les noms des colonnes de la table ; une valeur vide vaut NULL.
+
+Reprise : chaque lot est noté dans la table bulk_load_batch dans la transaction de son
+COPY (fichier identifié par chemin, taille et date de modification). Relancer la même
+commande après une interruption ou un lot en erreur n'écrit que les lots manquants, sans
+doublon ; le découpage en lots est celui de la première exécution.
+
+--defer-indexes supprime les index secondaires déclarés sur le modèle (hors clé primaire
+et index uniques) avant le chargement et les recrée à la fin : bien plus rapide pour un
+gros import sur une table peu lue, mais les requêtes qui s'appuient sur ces index sont
+lentes pendant ce temps. Ignoré sur une table partitionnée. Chaque exécution se termine
+en recréant les index manquants, ce qui couvre une reprise après interruption.
+
+Après un import de mesures, les rollups horaires sont recalculés à partir de la plus
+ancienne mesure importée ; après un import de statuts, la projection
+capteur_current_status est reconstruite (--no-rebuild pour s'en passer).
+
+    python -m app.services.bulk_load mesure mesures_2023.csv --workers 4
+    python -m app.services.bulk_load status historique.parquet --defer-indexes
+"""
+import argparse
+import csv
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from sqlalchemy import Integer, func, text
+from app import models
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # dépendance optionnelle (fichiers Parquet)
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+TABLES = {
+    "capteur": models.Capteur.__table__,
+    "mesure": models.Mesure.__table__,
+    "status": models.CapteurStatusHistory.__table__,
+}
+DEFAULT_BATCH_ROWS = 50000
+PROGRESS_SECONDS = 5
+
+# connexion psycopg du processus de travail (ouverte par _init_worker)
+_conn = None
+
+
+def required_columns(table):
+    """Colonnes NOT NULL sans valeur par défaut côté serveur (COPY n'applique pas les défauts Python)."""
+    return [
+        c.name for c in table.columns
+        # clé primaire entière : séquence côté serveur
+        if not c.nullable and c.server_default is None and not (c.primary_key and isinstance(c.type, Integer))
+    ]
+
+
+def check_columns(table, columns):
+    unknown = [c for c in columns if c not in table.columns]
+    if unknown:
+        raise ValueError(f"unknown columns for {table.name}: {', '.join(unknown)}")
+    missing = [c for c in required_columns(table) if c not in columns]
+    if missing:
+        raise ValueError(f"missing required columns for {table.name}: {', '.join(missing)}")
+
+
+def read_batches(path: str, fmt: str, batch_rows: int):
+    """(colonnes, itérateur de lots de tuples) ; les valeurs vides d'un CSV deviennent None."""
+    if fmt == "parquet":
+        if pq is None:
+            raise RuntimeError("Parquet input requires pyarrow (pip install pyarrow)")
+        source = pq.ParquetFile(path)
+        columns = source.schema_arrow.names
+
+        def parquet_batches():
+            for batch in source.iter_batches(batch_size=batch_rows):
+                yield list(zip(*(col.to_pylist() for col in batch.columns)))
+
+        return columns, parquet_batches()
+
+    f = open(path, newline="", encoding="utf-8")
+    reader = csv.reader(f)
+    columns = [c.strip() for c in next(reader)]
+
+    def csv_batches():
+        try:
+            batch = []
+            for row in reader:
+                batch.append(tuple(v if v != "" else None for v in row))
+                if len(batch) >= batch_rows:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            f.close()
+
+    return columns, csv_batches()
+
+
+def _min_ts(batch, ts_index: int):
+    """Plus ancien ts d'un lot (datetime, ou texte ISO 8601 d'un CSV) ; None si illisible."""
+    out = None
+    for row in batch:
+        ts = row[ts_index]
+        if isinstance(ts, str):
+            try:
+                ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            except ValueError:
+                return None
+        if ts is None:
+            continue
+        ts = ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+        if out is None or ts < out:
+            out = ts
+    return out
+
+
+def source_key(path: str) -> str:
+    """Identité d'un fichier source : chemin absolu, taille et date de modification."""
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}@{st.st_size}:{int(st.st_mtime)}"
+
+
+def loaded_batches(db, source: str, table_name: str):
+    """Lots déjà commités : {batch_no: batch_rows}."""
+    b = models.BulkLoadBatch
+    return dict(db.query(b.batch_no, b.batch_rows).filter(b.source == source, b.table_name == table_name).all())
+
+
+# --- index différés ---
+
+def deferrable_indexes(engine, table):
+    """Index non uniques du modèle ; aucun sur une table partitionnée."""
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table.name}).scalar():
+            return []
+    return sorted((ix for ix in table.indexes if not ix.unique), key=lambda ix: ix.name)
+
+
+def drop_indexes(engine, indexes):
+    with engine.begin() as conn:
+        for ix in indexes:
+            conn.execute(text(f'DROP INDEX IF EXISTS "{ix.name}"'))
+    logger.info("deferred %d index(es): %s", len(indexes), ", ".join(ix.name for ix in indexes))
+
+
+def create_missing_indexes(engine, table):
+    with engine.connect() as conn:
+        existing = {r[0] for r in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": table.name})}
+    for ix in sorted(table.indexes, key=lambda ix: ix.name):
+        if ix.name not in existing:
+            started = time.monotonic()
+            ix.create(bind=engine)
+            logger.info("created index %s in %.1fs", ix.name, time.monotonic() - started)
+
+
+# --- processus de travail ---
+
+def _init_worker(dsn: str):
+    global _conn
+    import psycopg
+
+    _conn = psycopg.connect(dsn)
+
+
+def _copy_batch(table_name: str, columns, source: str, batch_rows: int, batch_no: int, rows, min_ts):
+    """COPY d'un lot et enregistrement dans bulk_load_batch, dans une seule transaction."""
+    cols = ", ".join(f'"{c}"' for c in columns)
+    try:
+        with _conn.cursor() as cur:
+            with cur.copy(f'COPY "{table_name}" ({cols}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+            # clé primaire : un lot déjà importé par une autre exécution annule ce COPY
+            cur.execute(
+                "INSERT INTO bulk_load_batch (source, table_name, batch_no, batch_rows, nb_rows, min_ts) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                (source, table_name, batch_no, batch_rows, len(rows), min_ts),
+            )
+        _conn.commit()
+    except Exception:
+        _conn.rollback()
+        raise
+    return len(rows)
+
+
+def load(engine, dsn: str, table_name: str, path: str, fmt: str, workers: int, batch_rows: int, defer_indexes: bool):
+    """Charge le fichier dans la table ; retourne la liste des lots en erreur."""
+    from app.database import SessionLocal
+
+    table = TABLES[table_name]
+    source = source_key(path)
+    db = SessionLocal()
+    try:
+        done = loaded_batches(db, source, table.name)
+    finally:
+        db.close()
+    if done:
+        previous = next(iter(done.values()))
+        if previous != batch_rows:
+            logger.info("resuming with the first run's --batch-rows %s", previous)
+            batch_rows = previous
+        logger.info("resuming: %d batch(es) already loaded", len(done))
+    columns, batches = read_batches(path, fmt, batch_rows)
+    check_columns(table, columns)
+    ts_index = columns.index("ts") if "ts" in columns else None
+
+    if defer_indexes:
+        indexes = deferrable_indexes(engine, table)
+        if indexes:
+            drop_indexes(engine, indexes)
+
+    started = time.monotonic()
+    last_report = started
+    loaded = 0
+    failed = []
+    pending = {}
+
+    def collect(finished):
+        nonlocal loaded
+        for fut in finished:
+            batch_no = pending.pop(fut)
+            try:
+                loaded += fut.result()
+            except Exception as e:
+                failed.append(batch_no)
+                logger.error("batch %d failed: %s", batch_no, e)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dsn,)) as pool:
+        for batch_no, batch in enumerate(batches):
+            if batch_no in done:
+                continue
+            min_ts = _min_ts(batch, ts_index) if ts_index is not None else None
+            fut = pool.submit(_copy_batch, table.name, columns, source, batch_rows, batch_no, batch, min_ts)
+            pending[fut] = batch_no
+            # au plus deux lots en attente par processus : la lecture ne prend pas d'avance sur COPY
+            finished, _ = wait(pending, timeout=None if len(pending) >= 2 * workers else 0, return_when=FIRST_COMPLETED)
+            collect(finished)
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_SECONDS:
+                logger.info("%s: %d rows, %.0f rows/s", table.name, loaded, loaded / (now - started))
+                last_report = now
+        collect(wait(pending)[0])
+
+    elapsed = time.monotonic() - started
+    logger.info("%s: %d rows in %.1fs (%.0f rows/s), %d batch(es) failed", table.name, loaded, elapsed, loaded / elapsed if elapsed else 0, len(failed))
+    create_missing_indexes(engine, table)
+    return sorted(failed)
+
+
+def rebuild_derived(table_name: str, path: str):
+    """Rollups horaires après des mesures, projection de statut après des transitions."""
+    from app.database import SessionLocal
+    from app.services import rollup, status
+
+    db = SessionLocal()
+    try:
+        if table_name == "mesure":
+            b = models.BulkLoadBatch
+            since, unknown = db.query(func.min(b.min_ts), func.bool_or(b.min_ts.is_(None))).filter(
+                b.source == source_key(path), b.table_name == table_name
+            ).one()
+            since = None if unknown else since
+            rollup.rebuild(db, since=since)
+            logger.info("rebuilt hourly rollups since %s", since or "the beginning")
+        elif table_name == "status":
+            status.rebuild_current_status(db)
+            logger.info("rebuilt capteur_current_status")
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import en masse (COPY) de capteurs, mesures ou historique de statut")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("source", help="fichier CSV (avec en-tête) ou Parquet")
+    parser.add_argument("--format", choices=("csv", "parquet"), default=None, help="déduit de l'extension par défaut")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    parser.add_argument("--defer-indexes", action="store_true", help="supprimer les index secondaires pendant l'import")
+    parser.add_argument("--no-rebuild", action="store_true", help="ne pas recalculer rollups / statut courant")
+    args = parser.parse_args(argv)
+
+    from app.database import DATABASE_URL, engine
+    from sqlalchemy.engine import make_url
+
+    logging.basicConfig(level=logging.INFO)
+    fmt = args.format or ("parquet" if args.source.endswith((".parquet", ".pq")) else "csv")
+    # psycopg (v3) pour COPY, quel que soit le pilote de DATABASE_URL
+    dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    try:
+        failed = load(engine, dsn, args.table, args.source, fmt, max(1, args.workers), args.batch_rows, args.defer_indexes)
+    except (ValueError, RuntimeError) as e:
+        raise SystemExit(str(e))
+    if failed:
+        raise SystemExit(f"{len(failed)} batch(es) failed ({', '.join(map(str, failed[:10]))}); fix the input and rerun the same command to resume")
+    if not args.no_rebuild:
+        rebuild_derived(args.table, args.source)
+
+
+if __name__ == "__main__":
+    main()
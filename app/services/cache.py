@@ -0,0 +1,301 @@
+"""
+Cache des résultats analytics : TTL + LRU borné, invalidation par tags et coalescence
+des requêtes concurrentes (single-flight).
+
+Chaque entrée est associée à des tags décrivant les données dont elle dépend
+(ex. "mesure:PM2.5", "capteur", "intervention"). Les routes d'écriture invalident
+les tags concernés après commit, ce qui ne purge que les entrées affectées.
+
+Le backend est interchangeable (set_backend) : MemoryCacheBackend par défaut, un
+backend partagé (Redis, memcached...) peut implémenter la même interface.
+
+Avec des réplicas en lecture (set_replica_staleness), un résultat dont un tag a été
+invalidé depuis moins que le retard maximal des réplicas a pu être calculé sur un réplica
+qui n'a pas encore l'écriture : il n'est gardé que ce retard maximal, pas tout son TTL.
+"""
+import abc
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.services.metrics import registry
+
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "30"))
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "1024"))
+ANALYTICS_CACHE_ENABLED = os.getenv("ANALYTICS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_MISSING = object()
+# tags invalidés gardés avant un élagage (voir AnalyticsCache._prune)
+TAG_STATE_MIN = 4096
+# retard maximal d'une lecture sur réplica (0 : pas de réplica), voir set_replica_staleness
+_replica_staleness = 0.0
+
+
+def set_replica_staleness(seconds: float):
+    global _replica_staleness
+    _replica_staleness = seconds
+
+
+def make_key(name: str, **params) -> str:
+    """Clé stable : nom de l'endpoint + paramètres triés."""
+    return name + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+
+class CacheBackend(abc.ABC):
+    """Interface minimale d'un backend de cache."""
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Retourne la valeur, ou _MISSING si absente / expirée."""
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl: float, tags=()):
+        """Stocke la valeur pour ttl secondes, associée aux tags."""
+
+    @abc.abstractmethod
+    def invalidate_tags(self, tags) -> int:
+        """Supprime les entrées portant au moins un des tags ; retourne le nombre d'entrées supprimées."""
+
+    @abc.abstractmethod
+    def clear(self):
+        """Vide le cache."""
+
+    @abc.abstractmethod
+    def __len__(self):
+        """Nombre d'entrées."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Cache en mémoire du processus : LRU borné à max_entries, expiration par TTL."""
+
+    def __init__(self, max_entries: int = ANALYTICS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._by_tag = {}  # tag -> set(keys)
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl: float, tags=()):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags) -> int:
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._by_tag.get(tag, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _LeaderCancelled(Exception):
+    """Le calcul partagé a été annulé avec la requête qui le menait (voir aget_or_compute)."""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class AnalyticsCache:
+    def __init__(self, backend: CacheBackend = None, ttl: float = ANALYTICS_CACHE_TTL, enabled: bool = ANALYTICS_CACHE_ENABLED):
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl = ttl
+        self.enabled = enabled
+        self._flights = {}
+        self._async_flights = {}
+        # invalidations : numéro croissant, et par tag (numéro, instant monotonic) de la dernière.
+        # Un calcul note le numéro courant à son début ; un tag invalidé depuis rend son
+        # résultat périmé. Les tags plus anciens que tout calcul en cours (et que la fenêtre
+        # des réplicas) ne servent plus à rien et sont élagués : l'état reste borné même avec
+        # un tag par tuile.
+        self._seq = 0
+        self._invalidated = {}
+        self._starts = {}  # numéro de début -> nombre de calculs en cours
+        self._prune_at = TAG_STATE_MIN
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    def set_backend(self, backend: CacheBackend):
+        self.backend = backend
+
+    def _begin(self):
+        """Début d'un calcul (sous self._lock) : numéro d'invalidation courant."""
+        start = self._seq
+        self._starts[start] = self._starts.get(start, 0) + 1
+        return start
+
+    def _end(self, start, tags):
+        """Fin d'un calcul (sous self._lock) : True si aucun de ses tags n'a été invalidé depuis son début."""
+        n = self._starts.pop(start) - 1
+        if n:
+            self._starts[start] = n
+        return all(self._invalidated.get(t, (0, 0.0))[0] <= start for t in tags)
+
+    def _prune(self, now):
+        floor = min(self._starts, default=self._seq)
+        horizon = now - _replica_staleness
+        self._invalidated = {t: v for t, v in self._invalidated.items() if v[0] > floor or v[1] > horizon}
+        self._prune_at = max(TAG_STATE_MIN, 2 * len(self._invalidated))
+
+    def _store_ttl(self, tags, ttl):
+        ttl = self.ttl if ttl is None else ttl
+        if _replica_staleness > 0 and tags:
+            # invalidé récemment : le calcul a pu lire un réplica en retard sur cette écriture
+            last = max(self._invalidated.get(t, (0, float("-inf")))[1] for t in tags)
+            if time.monotonic() - last < _replica_staleness:
+                return min(ttl, _replica_staleness)
+        return ttl
+
+    def get_or_compute(self, key: str, compute, tags=(), ttl: float = None):
+        """
+        Retourne la valeur en cache ou la calcule. Si plusieurs requêtes manquent la même
+        clé en même temps, une seule exécute `compute` ; les autres attendent son résultat.
+        """
+        if not self.enabled:
+            return compute()
+
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            self.stats["hits"] += 1
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                start = self._begin()
+
+        if not leader:
+            self.stats["coalesced"] += 1
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        self.stats["misses"] += 1
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                # une écriture pendant le calcul rend le résultat potentiellement périmé : ne pas le stocker
+                if self._end(start, tags) and flight.error is None:
+                    self.backend.set(key, flight.value, self._store_ttl(tags, ttl), tags)
+            flight.done.set()
+        return flight.value
+
+    async def aget_or_compute(self, key: str, compute, tags=(), ttl: float = None):
+        """
+        Variante pour les routes async : `compute` retourne un awaitable, et la coalescence
+        utilise des futures asyncio plutôt que des threading.Event (qui bloqueraient la boucle).
+        """
+        if not self.enabled:
+            return await compute()
+
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            self.stats["hits"] += 1
+            return value
+
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(flight)
+            except _LeaderCancelled:
+                # la requête qui calculait a été annulée : reprendre le calcul (un seul des suiveurs le mène)
+                return await self.aget_or_compute(key, compute, tags, ttl)
+
+        flight = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        with self._lock:
+            start = self._begin()
+        self.stats["misses"] += 1
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            # ne pas annuler le future partagé : les suiveurs n'ont pas été annulés, eux
+            flight.set_exception(_LeaderCancelled())
+            flight.exception()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # l'exception est relayée aux requêtes en attente ; éviter l'avertissement "never retrieved"
+            flight.exception()
+            raise
+        else:
+            flight.set_result(value)
+        finally:
+            del self._async_flights[key]
+            with self._lock:
+                fresh = self._end(start, tags)
+        if fresh:
+            with self._lock:
+                self.backend.set(key, value, self._store_ttl(tags, ttl), tags)
+        return value
+
+    def invalidate(self, *tags):
+        if not tags:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            self._seq += 1
+            for t in tags:
+                self._invalidated[t] = (self._seq, now)
+            if len(self._invalidated) > self._prune_at:
+                self._prune(now)
+            self.stats["invalidations"] += 1
+            return self.backend.invalidate_tags(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+
+analytics_cache = AnalyticsCache()
+
+_entries_gauge = registry.gauge("analytics_cache_entries", "Entries held by the analytics cache")
+_entries_gauge.set_function(lambda: len(analytics_cache.backend))
+_stats_gauge = registry.gauge("analytics_cache_events", "Analytics cache hits, misses, coalesced misses and invalidations")
+for _event in analytics_cache.stats:
+    _stats_gauge.set_function(lambda e=_event: analytics_cache.stats[e], event=_event)
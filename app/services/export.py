@@ -0,0 +1,116 @@
+"""
+Export en flux des mesures (NDJSON, CSV, Arrow IPC).
+
+La requête est exécutée sur un curseur serveur (yield_per) et les lignes sont
+sérialisées par paquets de EXPORT_CHUNK_ROWS : la mémoire reste constante quel que
+soit le volume exporté. Chaque export ouvre sa propre connexion (sur un réplica si
+DATABASE_REPLICA_URLS), fermée à la fin du flux ou à la déconnexion du client.
+
+Arrow nécessite pyarrow (dépendance optionnelle).
+"""
+import csv
+import io
+import json
+import os
+from sqlalchemy import select
+from app.database import engine, replica_router
+from app import models
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    pa = None
+
+EXPORT_CHUNK_ROWS = int(os.getenv("MESURE_EXPORT_CHUNK_ROWS", "5000"))
+
+COLUMNS = (
+    models.Mesure.id,
+    models.Mesure.uuid_capteur,
+    models.Mesure.ts,
+    models.Mesure.pollutant,
+    models.Mesure.valeur,
+    models.Mesure.unite,
+)
+FIELDS = [c.key for c in COLUMNS]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def export_statement():
+    """select() des colonnes exportées, à compléter par les filtres du router."""
+    return select(*COLUMNS)
+
+
+def iter_chunks(stmt, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # lecture longue : sur un réplica si configuré
+    replica = replica_router.acquire()
+    try:
+        with (replica.engine if replica is not None else engine).connect() as conn:
+            result = conn.execution_options(yield_per=chunk_rows).execute(stmt)
+            for chunk in result.partitions():
+                yield chunk
+    finally:
+        replica_router.release(replica)
+
+
+def _plain(row):
+    # mêmes représentations que MesureOut en JSON : uuid / Decimal en texte, ts ISO 8601
+    return (row.id, str(row.uuid_capteur), row.ts.isoformat(), row.pollutant, str(row.valeur), row.unite)
+
+
+def stream_ndjson(stmt):
+    for chunk in iter_chunks(stmt):
+        yield "".join(json.dumps(dict(zip(FIELDS, _plain(row)))) + "\n" for row in chunk)
+
+
+def stream_csv(stmt):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(FIELDS)
+    for chunk in iter_chunks(stmt):
+        writer.writerows(_plain(row) for row in chunk)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def arrow_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("uuid_capteur", pa.string()),
+        ("ts", pa.timestamp("us", tz="UTC")),
+        ("pollutant", pa.string()),
+        ("valeur", pa.decimal128(14, 6)),
+        ("unite", pa.string()),
+    ])
+
+
+def stream_arrow(stmt):
+    """Flux Arrow IPC : un record batch par paquet de lignes."""
+    schema = arrow_schema()
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    for chunk in iter_chunks(stmt):
+        columns = list(zip(*chunk))
+        columns[1] = [str(u) for u in columns[1]]
+        arrays = [pa.array(col, type=field.type) for col, field in zip(columns, schema)]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+STREAMERS = {"ndjson": stream_ndjson, "csv": stream_csv, "arrow": stream_arrow}
@@ -0,0 +1,117 @@
+"""
+Sérialisation rapide des réponses de lecture (FAST_JSON, activé par défaut).
+
+Les listes lisent des lignes Core limitées aux colonnes du schéma de sortie et les
+encodent directement avec orjson, sans instancier d'objets ORM ni revalider chaque
+ligne avec Pydantic. Le JSON produit est identique à celui du chemin Pydantic
+(Decimal en texte, champs float convertis, datetimes UTC en "Z") et le response_model
+des routes reste déclaré, donc le schéma OpenAPI ne change pas.
+
+FAST_JSON=0 rétablit le chemin response_model / jsonable_encoder.
+"""
+import os
+import typing
+from decimal import Decimal
+from uuid import UUID
+import orjson
+from fastapi import Response
+from fastapi.encoders import decimal_encoder
+from fastapi.responses import JSONResponse
+from app.services.query_stats import serializing
+
+FAST_JSON = os.getenv("FAST_JSON", "true").lower() in ("1", "true", "yes")
+
+
+def _model_default(obj):
+    # comme Pydantic en sortie de response_model : Decimal en texte
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, UUID):  # sous-classes (asyncpg) non reconnues par orjson
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _plain_default(obj):
+    # comme jsonable_encoder (routes sans response_model) : Decimal en nombre
+    if isinstance(obj, Decimal):
+        return decimal_encoder(obj)
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """Encodage orjson équivalent à jsonable_encoder + JSONResponse (datetimes en isoformat)."""
+
+    def render(self, content) -> bytes:
+        with serializing():
+            return orjson.dumps(content, default=_plain_default)
+
+
+class ModelJSONResponse(JSONResponse):
+    """Encodage orjson équivalent à la sortie d'un response_model Pydantic (datetimes UTC en "Z")."""
+
+    def render(self, content) -> bytes:
+        with serializing():
+            return orjson.dumps(content, default=_model_default, option=orjson.OPT_UTC_Z)
+
+
+def _is_float(annotation) -> bool:
+    if annotation is float:
+        return True
+    return typing.get_origin(annotation) is typing.Union and float in typing.get_args(annotation)
+
+
+def _field_converters(schema):
+    # Pydantic convertit les Numeric déclarés float (ex. latitude) : même conversion ici
+    return [
+        (name, _to_float if _is_float(field.annotation) else None)
+        for name, field in schema.model_fields.items()
+    ]
+
+
+def _to_float(value):
+    return None if value is None else float(value)
+
+
+def schema_columns(schema, model, extra_columns=()):
+    """
+    Colonnes de `model` portant les noms des champs de `schema`, suivies des `extra_columns`
+    absentes du schéma (clé de tri nécessaire au curseur, par exemple).
+    """
+    fields = list(schema.model_fields)
+    columns = [getattr(model, name) for name in fields]
+    return columns + [c for c in extra_columns if c.key not in fields]
+
+
+def schema_query(db, schema, model, extra_columns=()):
+    return db.query(*schema_columns(schema, model, extra_columns))
+
+
+def rows_payload(rows, schema):
+    with serializing():
+        return _rows_payload(rows, schema)
+
+
+def _rows_payload(rows, schema):
+    converters = _field_converters(schema)
+    if not any(conv for _, conv in converters):
+        names = [name for name, _ in converters]
+        return [dict(zip(names, row)) for row in rows]
+    return [
+        {name: conv(value) if conv else value for (name, conv), value in zip(converters, row)}
+        for row in rows
+    ]
+
+
+def rows_response(rows, schema, response: Response = None) -> ModelJSONResponse:
+    """Réponse JSON des lignes ; reprend les en-têtes posés sur `response` (ex. X-Next-Cursor)."""
+    out = ModelJSONResponse(rows_payload(rows, schema))
+    if response is not None:
+        out.headers.update(response.headers)
+    return out
+
+
+def json_response(content):
+    """Réponse orjson si FAST_JSON, sinon le contenu tel quel (encodage FastAPI standard)."""
+    return FastJSONResponse(content) if FAST_JSON else content
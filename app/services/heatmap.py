@@ -0,0 +1,250 @@
+"""
+Tuiles de carte de chaleur (z/x/y, projection Web Mercator) interpolées à partir des
+moyennes par capteur.
+
+Les valeurs par capteur sont les moyennes des rollups horaires (mesure_hourly) sur les
+`hours` dernières heures, pour les capteurs actifs et géolocalisés. Chaque pixel de la
+tuile est interpolé par pondération inverse à la distance (IDW, poids de Shepard modifiés
+((R - d) / (R d))^p qui s'annulent à HEATMAP_RADIUS_M) : seuls les capteurs à moins de
+HEATMAP_RADIUS_M d'un pixel y contribuent, un pixel sans capteur proche reste transparent.
+Le calcul est vectorisé avec NumPy par blocs de pixels, chacun limité aux capteurs à
+portée de son emprise.
+
+Les tuiles sont mises en cache (tile_cache) avec un tag par tuile. Après une ingestion,
+seules les tuiles situées à moins de HEATMAP_RADIUS_M des capteurs concernés sont
+invalidées : déplacer la carte ne recalcule que les tuiles réellement touchées. Les tuiles
+candidates sont celles servies récemment (suivies avant leur calcul, au plus
+HEATMAP_CACHE_MAX_TILES, avec leur emprise élargie de la portée) et non toutes les tuiles
+de tous les zooms autour de chaque capteur : un lot de milliers de capteurs se teste en
+une comparaison vectorisée tuiles x capteurs.
+"""
+import math
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy import func
+from app import models
+from app.services import rollup, spatial
+from app.services.cache import AnalyticsCache, MemoryCacheBackend
+from app.services.spatial import METERS_PER_DEG
+
+HEATMAP_RADIUS_M = float(os.getenv("HEATMAP_RADIUS_M", "2000"))
+HEATMAP_POWER = float(os.getenv("HEATMAP_POWER", "2"))
+HEATMAP_MIN_ZOOM = int(os.getenv("HEATMAP_MIN_ZOOM", "8"))
+HEATMAP_MAX_ZOOM = int(os.getenv("HEATMAP_MAX_ZOOM", "18"))
+HEATMAP_TILE_TTL = float(os.getenv("HEATMAP_TILE_TTL", "300"))
+HEATMAP_CACHE_MAX_TILES = int(os.getenv("HEATMAP_CACHE_MAX_TILES", "4096"))
+
+# pixels par côté d'un bloc de calcul, et éléments (pixels x capteurs) au plus par étape
+BLOCK = 16
+CHUNK_ELEMENTS = 2_000_000
+ALPHA = 180
+# rampe de couleurs : vert -> jaune -> orange -> rouge -> violet
+_RAMP_STOPS = [0.0, 0.25, 0.5, 0.75, 1.0]
+_RAMP_RGB = [(0, 176, 80), (255, 221, 0), (255, 128, 0), (220, 0, 0), (128, 0, 128)]
+
+tile_cache = AnalyticsCache(MemoryCacheBackend(HEATMAP_CACHE_MAX_TILES), ttl=HEATMAP_TILE_TTL)
+
+# tuiles servies récemment (LRU) : (pollutant, z, x, y) -> emprise élargie de HEATMAP_RADIUS_M
+_served = OrderedDict()
+_served_lock = threading.Lock()
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """(min_lat, min_lon, max_lat, max_lon) de la tuile."""
+    n = 2 ** z
+    return _tile_lat(n, y + 1), x / n * 360 - 180, _tile_lat(n, y), (x + 1) / n * 360 - 180
+
+
+def _tile_lat(n: int, ty: float) -> float:
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+
+def _tile_xy(z: int, lat: float, lon: float):
+    n = 2 ** z
+    lat = max(-85.0511, min(85.0511, lat))
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_tag(pollutant: str, z: int, x: int, y: int) -> str:
+    return f"heatmap:{pollutant}:{z}/{x}/{y}"
+
+
+def tile_tags(pollutant: str, z: int, x: int, y: int):
+    return (tile_tag(pollutant, z, x, y), f"heatmap:{pollutant}", "capteur", "capteur_status")
+
+
+def sensor_points(db, pollutant: str, hours: int = 24):
+    """Moyenne par capteur actif géolocalisé sur la fenêtre : (uuids, lats, lons, valeurs)."""
+    status = func.coalesce(models.CapteurCurrentStatus.status, models.Capteur.statut)
+    rows = (
+        db.query(
+            models.Capteur.uuid_capteur,
+            models.Capteur.latitude,
+            models.Capteur.longitude,
+            (func.sum(models.MesureHourly.sum_valeur) / func.sum(models.MesureHourly.nb_mesures)).label("moyenne"),
+        )
+        .join(models.MesureHourly, models.MesureHourly.uuid_capteur == models.Capteur.uuid_capteur)
+        .outerjoin(models.CapteurCurrentStatus, models.Capteur.uuid_capteur == models.CapteurCurrentStatus.uuid_capteur)
+        .filter(
+            models.MesureHourly.pollutant == pollutant,
+            models.MesureHourly.bucket >= rollup.window_start(hours),
+            models.Capteur.latitude.isnot(None),
+            models.Capteur.longitude.isnot(None),
+            status == "active",
+        )
+        .group_by(models.Capteur.uuid_capteur, models.Capteur.latitude, models.Capteur.longitude)
+        .all()
+    )
+    return (
+        [r[0] for r in rows],
+        np.array([float(r[1]) for r in rows], dtype=np.float64),
+        np.array([float(r[2]) for r in rows], dtype=np.float64),
+        np.array([float(r[3]) for r in rows], dtype=np.float64),
+    )
+
+
+def idw_grid(lats, lons, values, z: int, x: int, y: int, size: int = 256,
+             radius_m: float = HEATMAP_RADIUS_M, power: float = HEATMAP_POWER):
+    """Grille size x size (ligne 0 au nord) des valeurs interpolées aux centres des pixels ; NaN sans capteur proche."""
+    n = 2 ** z
+    cols = (x + (np.arange(size) + 0.5) / size) / n * 360 - 180
+    rows = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + (np.arange(size) + 0.5) / size) / n))))
+    out = np.full((size, size), np.nan)
+    dlat = radius_m / METERS_PER_DEG
+    dlon = radius_m / (METERS_PER_DEG * math.cos(math.radians(min(89.9, max(abs(rows[0]), abs(rows[-1])) + dlat))))
+
+    # blocs de BLOCK x BLOCK pixels : chacun ne considère que les capteurs à portée de son emprise
+    for r0 in range(0, size, BLOCK):
+        lat_rows = rows[r0:r0 + BLOCK]
+        in_rows = (lats >= lat_rows[-1] - dlat) & (lats <= lat_rows[0] + dlat)
+        if not in_rows.any():
+            continue
+        # distance équirectangulaire (suffisante à l'échelle d'une ville)
+        lon_scale = (METERS_PER_DEG * np.cos(np.radians(lat_rows)))[:, None, None]
+        for c0 in range(0, size, BLOCK):
+            lon_cols = cols[c0:c0 + BLOCK]
+            near = in_rows & (lons >= lon_cols[0] - dlon) & (lons <= lon_cols[-1] + dlon)
+            if not near.any():
+                continue
+            b_lats, b_lons, b_values = lats[near], lons[near], values[near]
+            num = np.zeros((len(lat_rows), len(lon_cols)))
+            den = np.zeros_like(num)
+            step = max(1, CHUNK_ELEMENTS // num.size)
+            for k in range(0, len(b_values), step):
+                dy = (lat_rows[:, None, None] - b_lats[None, None, k:k + step]) * METERS_PER_DEG
+                dx = (lon_cols[None, :, None] - b_lons[None, None, k:k + step]) * lon_scale
+                d = np.hypot(dx, dy)
+                w = np.where(d < radius_m, ((radius_m - d) / (radius_m * np.maximum(d, 1e-6))) ** power, 0.0)
+                num += (w * b_values[k:k + step]).sum(axis=2)
+                den += w.sum(axis=2)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[r0:r0 + BLOCK, c0:c0 + BLOCK] = np.where(den > 0, num / den, np.nan)
+    return out
+
+
+def colorize(grid, vmin: float, vmax: float):
+    """Grille de valeurs -> pixels RGBA (uint8), transparents là où la valeur est NaN."""
+    t = np.clip((np.nan_to_num(grid, nan=vmin) - vmin) / ((vmax - vmin) or 1.0), 0.0, 1.0)
+    rgba = np.empty(grid.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(t, _RAMP_STOPS, [c[channel] for c in _RAMP_RGB]).astype(np.uint8)
+    rgba[..., 3] = np.where(np.isnan(grid), 0, ALPHA)
+    return rgba
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_png(rgba) -> bytes:
+    """PNG RGBA 8 bits sans dépendance (filtre 0 sur chaque ligne)."""
+    height, width = rgba.shape[:2]
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def grid_payload(grid, z: int, x: int, y: int):
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    values = np.round(grid, 2).tolist()
+    return {
+        "z": z, "x": x, "y": y,
+        "bbox": [min_lat, min_lon, max_lat, max_lon],
+        "size": grid.shape[0],
+        # NaN -> null, ligne 0 au nord
+        "values": [[None if v != v else v for v in row] for row in values],
+    }
+
+
+def reach_bounds(z: int, x: int, y: int, radius_m: float = HEATMAP_RADIUS_M):
+    """Emprise de la tuile élargie de radius_m : un capteur hors de ce rectangle ne la modifie pas."""
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    dlat = radius_m / METERS_PER_DEG
+    dlon = min(180.0, radius_m / (METERS_PER_DEG * math.cos(math.radians(min(89.9, max(abs(min_lat), abs(max_lat)) + dlat)))))
+    return min_lat - dlat, min_lon - dlon, max_lat + dlat, max_lon + dlon
+
+
+def track_tile(pollutant: str, z: int, x: int, y: int, kept: int = HEATMAP_CACHE_MAX_TILES):
+    """
+    À appeler avant de servir une tuile (cache ou calcul) : seules les tuiles suivies sont
+    invalidées par une ingestion. Suivre la tuile avant son calcul couvre une ingestion
+    concurrente ; une tuile sortie du suivi a aussi quitté tile_cache (même capacité, même ordre).
+    """
+    key = (pollutant, z, x, y)
+    with _served_lock:
+        if key in _served:
+            _served.move_to_end(key)
+            return
+        _served[key] = reach_bounds(z, x, y)
+        while len(_served) > kept:
+            _served.popitem(last=False)
+
+
+def affected_tags(pollutant: str, lats, lons):
+    """Tags des tuiles suivies du polluant à portée d'au moins un des points (lats, lons)."""
+    with _served_lock:
+        tiles = [(key, bounds) for key, bounds in _served.items() if key[0] == pollutant]
+    if not tiles or not len(lats):
+        return []
+    b = np.array([bounds for _, bounds in tiles], dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    hit = np.zeros(len(tiles), dtype=bool)
+    step = max(1, CHUNK_ELEMENTS // len(tiles))
+    for k in range(0, len(lats), step):
+        la, lo = lats[None, k:k + step], lons[None, k:k + step]
+        hit |= ((la >= b[:, :1]) & (la <= b[:, 2:3]) & (lo >= b[:, 1:2]) & (lo <= b[:, 3:4])).any(axis=1)
+    return [tile_tag(*tiles[i][0]) for i in np.flatnonzero(hit)]
+
+
+def invalidate_mesures(rows):
+    """
+    Après ingestion : invalide les tuiles proches des capteurs concernés. Les positions
+    viennent de l'index spatial (tous les capteurs) ; un capteur sans coordonnées n'apparaît
+    sur aucune tuile. Index jamais chargé : toutes les tuiles du polluant.
+    """
+    by_pollutant = {}
+    for r in rows:
+        by_pollutant.setdefault(r["pollutant"], set()).add(r["uuid_capteur"])
+    tags = []
+    for pollutant, uuids in by_pollutant.items():
+        if spatial.index.loaded_at is None:
+            tags.append(f"heatmap:{pollutant}")
+            continue
+        positions = [p for p in map(spatial.index.position, uuids) if p is not None]
+        if not positions:
+            continue
+        tags.extend(affected_tags(pollutant, [p[0] for p in positions], [p[1] for p in positions]))
+    if tags:
+        tile_cache.invalidate(*tags)
@@ -0,0 +1,45 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app import models
+from app.services import rollup
+
+# Nombre de lignes par INSERT multi-lignes (reste sous la limite de paramètres de PostgreSQL)
+INSERT_CHUNK_SIZE = 1000
+
+MESURE_COLUMNS = ("uuid_capteur", "ts", "pollutant", "valeur", "unite")
+
+
+def existing_capteurs(db: Session, uuids):
+    """Retourne le sous-ensemble des uuids qui existent dans la table capteur (une seule requête)."""
+    uuids = set(uuids)
+    if not uuids:
+        return set()
+    rows = db.query(models.Capteur.uuid_capteur).filter(models.Capteur.uuid_capteur.in_(uuids)).all()
+    return {r[0] for r in rows}
+
+
+def capteur_arrondissements(db: Session, uuids):
+    """Comme existing_capteurs, mais retourne uuid -> id_arrondissement (diffusion temps réel par arrondissement)."""
+    uuids = set(uuids)
+    if not uuids:
+        return {}
+    rows = (
+        db.query(models.Capteur.uuid_capteur, models.Capteur.id_arrondissement)
+        .filter(models.Capteur.uuid_capteur.in_(uuids))
+        .all()
+    )
+    return {r[0]: r[1] for r in rows}
+
+
+def insert_mesures(db: Session, rows, chunk_size: int = INSERT_CHUNK_SIZE):
+    """
+    Insère des mesures (dicts) via des INSERT multi-lignes et met à jour les rollups
+    horaires, sans commit : le commit reste à la charge de l'appelant pour garder
+    mesures et buckets dans une seule transaction.
+    """
+    table = models.Mesure.__table__
+    for start in range(0, len(rows), chunk_size):
+        chunk = [{c: r.get(c) for c in MESURE_COLUMNS} for r in rows[start:start + chunk_size]]
+        db.execute(insert(table).values(chunk))
+    rollup.apply(db, rows)
+    return len(rows)
@@ -0,0 +1,243 @@
+"""
+Agrégation glissante en mémoire des mesures, pour des classements « live » sans SQL.
+
+Pour chaque fenêtre configurée (LIVE_STATS_WINDOWS, défaut "15m,1h,24h"), chaque couple
+(capteur, polluant) et (arrondissement, polluant) possède un anneau de LIVE_STATS_BUCKETS
+buckets temporels (la fenêtre 1h avec 60 buckets avance par pas d'une minute). Chaque bucket
+garde nombre, somme, max et un histogramme logarithmique creux des valeurs ; les totaux de la
+fenêtre sont tenus à jour à l'ajout et à l'expiration des buckets, ce qui rend moyenne,
+nombre et percentiles lisibles sans parcourir les mesures. Un classement coûte
+O(arrondissements).
+
+Les percentiles sont approchés (erreur relative de l'ordre de 1 / HIST_BINS_PER_E ~ 5 %) et
+la fenêtre avance par pas d'un bucket.
+
+L'agrégateur est alimenté par l'ingestion (app.routers.mesure) et reconstruit au démarrage
+depuis la table mesure. Il est local au processus : avec plusieurs workers, chacun ne voit
+que ses propres ingestions en plus de l'état reconstruit au démarrage.
+"""
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import select
+from app import models
+
+LIVE_STATS_ENABLED = os.getenv("LIVE_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+LIVE_STATS_WINDOWS = os.getenv("LIVE_STATS_WINDOWS", "15m,1h,24h")
+LIVE_STATS_BUCKETS = int(os.getenv("LIVE_STATS_BUCKETS", "60"))
+
+HIST_BINS_PER_E = 20
+PERCENTILES = (50, 95, 99)
+REBUILD_CHUNK_ROWS = 10000
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_windows(spec: str):
+    """'15m,1h,24h' -> {'15m': 900, '1h': 3600, '24h': 86400}"""
+    out = {}
+    for part in spec.split(","):
+        part = part.strip()
+        m = re.fullmatch(r"(\d+)([smhd])", part)
+        if not m:
+            raise ValueError(f"invalid window {part!r} (expected e.g. 15m, 1h, 24h)")
+        out[part] = int(m.group(1)) * _UNITS[m.group(2)]
+    return out
+
+
+def _bin(value: float) -> int:
+    return int(math.log1p(value) * HIST_BINS_PER_E) if value > 0 else 0
+
+
+def _bin_value(b: int) -> float:
+    return math.expm1((b + 0.5) / HIST_BINS_PER_E) if b else 0.0
+
+
+class _Ring:
+    """Anneau de buckets d'une fenêtre : [index absolu, nombre, somme, max, histogramme]."""
+
+    __slots__ = ("width", "size", "head", "slots", "count", "sum", "hist")
+
+    def __init__(self, width: float, size: int):
+        self.width = width
+        self.size = size
+        self.head = None
+        self.slots = [None] * size
+        self.count = 0
+        self.sum = 0.0
+        self.hist = {}
+
+    def _evict(self, pos: int):
+        slot = self.slots[pos]
+        if slot is None:
+            return
+        self.count -= slot[1]
+        self.sum -= slot[2]
+        for b, n in slot[4].items():
+            left = self.hist[b] - n
+            if left:
+                self.hist[b] = left
+            else:
+                del self.hist[b]
+        self.slots[pos] = None
+        if not self.count:
+            self.sum = 0.0  # pas de dérive flottante une fois la fenêtre vide
+
+    def advance(self, now_idx: int):
+        if self.head is None:
+            self.head = now_idx
+            return
+        if now_idx <= self.head:
+            return
+        if now_idx - self.head >= self.size:
+            for pos in range(self.size):
+                self._evict(pos)
+        else:
+            for idx in range(self.head + 1, now_idx + 1):
+                self._evict(idx % self.size)
+        self.head = now_idx
+
+    def add(self, ts: float, value: float, now: float):
+        now_idx = int(now // self.width)
+        self.advance(now_idx)
+        idx = min(int(ts // self.width), now_idx)  # mesures datées dans le futur : bucket courant
+        if idx <= now_idx - self.size:
+            return
+        pos = idx % self.size
+        slot = self.slots[pos]
+        if slot is None or slot[0] != idx:
+            self._evict(pos)
+            slot = self.slots[pos] = [idx, 0, 0.0, value, {}]
+        b = _bin(value)
+        slot[1] += 1
+        slot[2] += value
+        if value > slot[3]:
+            slot[3] = value
+        slot[4][b] = slot[4].get(b, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.hist[b] = self.hist.get(b, 0) + 1
+
+    def stats(self, now: float):
+        self.advance(int(now // self.width))
+        if not self.count:
+            return None
+        out = {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 2),
+            "max": max(s[3] for s in self.slots if s is not None),
+        }
+        ordered = sorted(self.hist.items())
+        for p in PERCENTILES:
+            rank = math.ceil(self.count * p / 100)
+            seen = 0
+            for b, n in ordered:
+                seen += n
+                if seen >= rank:
+                    out[f"p{p}"] = round(min(_bin_value(b), out["max"]), 2)
+                    break
+        return out
+
+
+def _epoch(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class LiveAggregator:
+    def __init__(self, windows=None, buckets: int = LIVE_STATS_BUCKETS):
+        self.windows = windows or parse_windows(LIVE_STATS_WINDOWS)
+        self.buckets = buckets
+        self._sensors = {}  # (uuid_capteur, pollutant) -> {window: _Ring}
+        self._arrs = {}  # pollutant -> {id_arrondissement: {window: _Ring}}
+        self._names = {}  # id_arrondissement -> nom
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def _rings(self):
+        return {name: _Ring(seconds / self.buckets, self.buckets) for name, seconds in self.windows.items()}
+
+    def _add_locked(self, uuid_capteur, id_arrondissement, pollutant, ts: float, value: float, now: float):
+        rings = self._sensors.get((uuid_capteur, pollutant))
+        if rings is None:
+            rings = self._sensors[(uuid_capteur, pollutant)] = self._rings()
+        for ring in rings.values():
+            ring.add(ts, value, now)
+        if id_arrondissement is None:
+            return
+        by_arr = self._arrs.setdefault(pollutant, {})
+        rings = by_arr.get(id_arrondissement)
+        if rings is None:
+            rings = by_arr[id_arrondissement] = self._rings()
+        for ring in rings.values():
+            ring.add(ts, value, now)
+
+    def add(self, rows, arrondissements):
+        """Ajoute des mesures (dicts) ; `arrondissements` : uuid_capteur -> id_arrondissement."""
+        now = time.time()
+        with self._lock:
+            for r in rows:
+                self._add_locked(r["uuid_capteur"], arrondissements.get(r["uuid_capteur"]), r["pollutant"], _epoch(r["ts"]), float(r["valeur"]), now)
+
+    def rebuild(self, db):
+        """Recharge l'état depuis les mesures de la plus grande fenêtre (table mesure + capteur)."""
+        now = time.time()
+        since = datetime.fromtimestamp(now - max(self.windows.values()), timezone.utc)
+        stmt = (
+            select(models.Mesure.uuid_capteur, models.Capteur.id_arrondissement, models.Mesure.pollutant, models.Mesure.ts, models.Mesure.valeur)
+            .join(models.Capteur, models.Capteur.uuid_capteur == models.Mesure.uuid_capteur)
+            .where(models.Mesure.ts >= since)
+        )
+        names = dict(db.query(models.Arrondissement.id_arrondissement, models.Arrondissement.nom).all())
+        sensors, arrs = self._sensors, self._arrs
+        self._sensors, self._arrs = {}, {}
+        try:
+            result = db.execute(stmt, execution_options={"yield_per": REBUILD_CHUNK_ROWS})
+            for chunk in result.partitions():
+                with self._lock:
+                    for u, a, p, ts, v in chunk:
+                        self._add_locked(u, a, p, ts.timestamp(), float(v), now)
+        except Exception:
+            self._sensors, self._arrs = sensors, arrs
+            raise
+        self._names = names
+        self.ready = True
+
+    def _check_window(self, window: str):
+        if window not in self.windows:
+            raise ValueError(f"window must be one of {', '.join(self.windows)}")
+
+    def ranking(self, pollutant: str, window: str, top_n: int = 10, order_by: str = "mean"):
+        """Classement des arrondissements pour un polluant sur une fenêtre : O(arrondissements)."""
+        self._check_window(window)
+        if order_by not in ("mean", "max") + tuple(f"p{p}" for p in PERCENTILES):
+            raise ValueError("order_by must be mean, max or p50/p95/p99")
+        now = time.time()
+        rows = []
+        with self._lock:
+            for id_arr, rings in self._arrs.get(pollutant, {}).items():
+                stats = rings[window].stats(now)
+                if stats:
+                    rows.append({"id_arrondissement": id_arr, "nom": self._names.get(id_arr), **stats})
+        rows.sort(key=lambda r: (-r[order_by], -r["count"], r["id_arrondissement"]))
+        return [{"rank": i, **r} for i, r in enumerate(rows[:top_n], start=1)]
+
+    def sensor_stats(self, uuid_capteur, pollutant: str):
+        """Statistiques d'un capteur pour chaque fenêtre (None si aucune mesure dans la fenêtre)."""
+        now = time.time()
+        with self._lock:
+            rings = self._sensors.get((uuid_capteur, pollutant))
+            return {name: rings[name].stats(now) if rings else None for name in self.windows}
+
+    def remember_names(self, names: dict):
+        self._names.update(names)
+
+    def unknown_arrondissements(self, pollutant: str):
+        return [a for a in self._arrs.get(pollutant, {}) if a not in self._names]
+
+
+aggregator = LiveAggregator()
@@ -0,0 +1,84 @@
+"""
+Pagination par curseur (keyset) pour les endpoints de liste.
+
+Le curseur est opaque pour le client : il encode les valeurs de la clé de tri de la
+dernière ligne renvoyée. La page suivante se lit avec WHERE (cle) > (curseur) (ou < en
+ordre décroissant), ce qui exploite l'index de la clé de tri au lieu de parcourir et
+jeter `skip` lignes comme OFFSET. La clé se termine toujours par une colonne unique,
+ce qui garantit un ordre total stable même si des lignes sont insérées entre deux pages.
+
+Le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor (absent sur la
+dernière page), le corps de la réponse reste la liste habituelle.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from uuid import UUID
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+_ENCODERS = {
+    datetime: ("dt", lambda v: v.isoformat()),
+    UUID: ("uuid", str),
+    Decimal: ("dec", str),
+}
+_DECODERS = {
+    "dt": datetime.fromisoformat,
+    "uuid": UUID,
+    "dec": Decimal,
+}
+
+
+def encode_cursor(values) -> str:
+    items = []
+    for v in values:
+        enc = _ENCODERS.get(type(v))
+        items.append([enc[0], enc[1](v)] if enc else ["raw", v])
+    raw = json.dumps(items, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        items = json.loads(raw)
+        values = [v if kind == "raw" else _DECODERS[kind](v) for kind, v in items]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def apply_keyset(stmt, key_columns, cursor: str = None, descending: bool = False):
+    """Ajoute le seek sur le curseur et le tri sur la clé à une Query ou un select()."""
+    if cursor:
+        values = decode_cursor(cursor, len(key_columns))
+        key, bound = tuple_(*key_columns), tuple_(*values)
+        stmt = stmt.where(key < bound if descending else key > bound)
+    return stmt.order_by(*(c.desc() if descending else c.asc() for c in key_columns))
+
+
+def set_next_cursor(response: Response, rows, key_columns, limit: int):
+    """Page pleine : le curseur de la dernière ligne permet de demander la suivante."""
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, c.key) for c in key_columns])
+
+
+def keyset_page(query, key_columns, limit: int, cursor: str = None, descending: bool = False, response: Response = None, skip: int = 0):
+    """
+    Page d'une Query ORM triée sur `key_columns` (la dernière colonne doit être unique,
+    ex. [Mesure.ts, Mesure.id]). `skip` (OFFSET) n'est conservé que pour compatibilité
+    et ignoré dès qu'un curseur est fourni.
+    """
+    query = apply_keyset(query, key_columns, cursor, descending)
+    if skip and not cursor:
+        query = query.offset(skip)
+    rows = query.limit(limit).all()
+    if response is not None:
+        set_next_cursor(response, rows, key_columns, limit)
+    return rows
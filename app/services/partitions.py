@@ -0,0 +1,204 @@
+"""
+Partitionnement mensuel (RANGE sur ts) de la table mesure et rétention.
+
+Le partitionnement est optionnel : `convert` transforme une table mesure classique en table
+partitionnée (opération lourde, à lancer en fenêtre de maintenance), `maintain` crée les
+partitions à venir et applique la rétention. Sur une table partitionnée, la rétention détache
+et supprime les partitions entières ; sinon elle retombe sur des DELETE par lots.
+
+    python -m app.services.partitions convert
+    python -m app.services.partitions maintain --months-ahead 3 --retention-months 24
+"""
+import argparse
+import logging
+import re
+from datetime import datetime, timezone
+from sqlalchemy import text
+from app import models
+
+logger = logging.getLogger(__name__)
+
+PARENT = "mesure"
+DEFAULT_PARTITION = "mesure_default"
+PARTITION_RE = re.compile(r"^mesure_y(\d{4})m(\d{2})$")
+DELETE_BATCH_SIZE = 10000
+
+
+def _month_start(d: datetime) -> datetime:
+    return datetime(d.year, d.month, 1, tzinfo=timezone.utc)
+
+
+def _add_months(d: datetime, n: int) -> datetime:
+    month = d.month - 1 + n
+    return d.replace(year=d.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"mesure_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(conn) -> bool:
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": PARENT}).first())
+
+
+def list_partitions(conn):
+    """Partitions mensuelles existantes : liste triée de (début du mois, nom)."""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name AND pg_table_is_visible(p.oid)"
+    ), {"name": PARENT}).all()
+    out = []
+    for (name,) in rows:
+        m = PARTITION_RE.match(name)
+        if m:
+            out.append((datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc), name))
+    return sorted(out)
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def create_partition(conn, month: datetime):
+    """
+    Crée la partition du mois. Si la partition par défaut contient déjà des mesures de ce mois
+    (PostgreSQL refuserait la création), elle est détachée le temps d'y déplacer ces mesures
+    vers la nouvelle partition, puis rattachée.
+    """
+    start = _month_start(month)
+    end = _add_months(start, 1)
+    name = partition_name(start)
+    if _exists(conn, name):
+        return
+    bounds = {"start": start, "end": end}
+    create = text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    stranded = _exists(conn, DEFAULT_PARTITION) and conn.execute(text(
+        f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end LIMIT 1"
+    ), bounds).first()
+    if not stranded:
+        conn.execute(create)
+        return
+    conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}"))
+    conn.execute(create)
+    moved = conn.execute(text(
+        f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end"
+    ), bounds).rowcount
+    conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end"), bounds)
+    conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    logger.info("moved %d row(s) from %s to %s", moved, DEFAULT_PARTITION, name)
+
+
+def ensure_partitions(conn, months_ahead: int = 3, start: datetime = None):
+    """Crée les partitions manquantes du mois de `start` (défaut : mois courant) jusqu'à months_ahead mois."""
+    month = _month_start(start or datetime.now(timezone.utc))
+    last = _add_months(_month_start(datetime.now(timezone.utc)), months_ahead)
+    while month <= last:
+        create_partition(conn, month)
+        month = _add_months(month, 1)
+
+
+def convert_to_partitioned(conn, months_ahead: int = 3):
+    """
+    Recrée mesure en table partitionnée par mois et y recopie les données existantes.
+    La clé primaire devient (id, ts), contrainte imposée par PostgreSQL sur une table partitionnée.
+    """
+    if is_partitioned(conn):
+        logger.info("mesure is already partitioned")
+        return
+
+    table = models.Mesure.__table__
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO mesure_legacy"))
+    conn.execute(text("ALTER TABLE mesure_legacy RENAME CONSTRAINT mesure_pkey TO mesure_legacy_pkey"))
+    for idx in table.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {idx.name}"))
+
+    conn.execute(text(f"CREATE TABLE {PARENT} (LIKE mesure_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (ts)"))
+    conn.execute(text(f"ALTER TABLE {PARENT} ADD PRIMARY KEY (id, ts)"))
+    conn.execute(text(
+        f"ALTER TABLE {PARENT} ADD FOREIGN KEY (uuid_capteur) "
+        f"REFERENCES capteur (uuid_capteur) ON DELETE CASCADE"
+    ))
+    conn.execute(text(f"ALTER SEQUENCE mesure_id_seq OWNED BY {PARENT}.id"))
+    for idx in table.indexes:
+        idx.create(conn)
+
+    oldest = conn.execute(text("SELECT min(ts) FROM mesure_legacy")).scalar()
+    ensure_partitions(conn, months_ahead=months_ahead, start=oldest)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+
+    conn.execute(text(f"INSERT INTO {PARENT} SELECT * FROM mesure_legacy"))
+    conn.execute(text("DROP TABLE mesure_legacy"))
+
+
+def apply_retention(conn, retention_months: int):
+    """
+    Supprime les mesures antérieures au début du mois courant - retention_months.
+    Table partitionnée : DETACH + DROP des partitions entièrement expirées, et DELETE par lots
+    dans la partition par défaut (mesures hors des partitions mensuelles).
+    Table classique : DELETE par lots de DELETE_BATCH_SIZE lignes (à chaque lot son commit).
+    """
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc)), -retention_months)
+
+    if is_partitioned(conn):
+        dropped = []
+        for month, name in list_partitions(conn):
+            if _add_months(month, 1) <= cutoff:
+                conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+        conn.commit()
+        deleted = 0
+        if _exists(conn, DEFAULT_PARTITION):
+            deleted = _delete_before(conn, DEFAULT_PARTITION, cutoff)
+        return {"mode": "partitions", "cutoff": cutoff, "dropped": dropped, "deleted": deleted}
+
+    return {"mode": "delete", "cutoff": cutoff, "deleted": _delete_before(conn, PARENT, cutoff)}
+
+
+def _delete_before(conn, table: str, cutoff: datetime) -> int:
+    deleted = 0
+    while True:
+        n = conn.execute(text(
+            f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE ts < :cutoff LIMIT :n)"
+        ), {"cutoff": cutoff, "n": DELETE_BATCH_SIZE}).rowcount
+        conn.commit()
+        deleted += n
+        if n < DELETE_BATCH_SIZE:
+            return deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partitionnement et rétention de la table mesure")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="convertir mesure en table partitionnée par mois")
+    convert.add_argument("--months-ahead", type=int, default=3)
+    maintain = sub.add_parser("maintain", help="créer les partitions à venir et appliquer la rétention")
+    maintain.add_argument("--months-ahead", type=int, default=3)
+    maintain.add_argument("--retention-months", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from app.database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.connect() as conn:
+        if args.command == "convert":
+            convert_to_partitioned(conn, months_ahead=args.months_ahead)
+            conn.commit()
+            return
+        if is_partitioned(conn):
+            ensure_partitions(conn, months_ahead=args.months_ahead)
+            conn.commit()
+        if args.retention_months is not None:
+            logger.info("retention: %s", apply_retention(conn, args.retention_months))
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main()
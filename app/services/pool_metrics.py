@@ -0,0 +1,75 @@
+"""
+Instrumentation des pools de connexions SQLAlchemy.
+
+Les classes de pool ci-dessous chronomètrent chaque checkout (_do_get) : le temps total
+alimente l'histogramme db_pool_checkout_seconds, et lorsque le pool était saturé au moment
+de la demande (aucune connexion libre, overflow épuisé), le temps passé est aussi compté
+comme attente (db_pool_wait_seconds). Le label `pool` vient de pool_logging_name.
+"""
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, NullPool, AsyncAdaptedQueuePool
+from app.services.metrics import registry
+
+CHECKOUT_SECONDS = registry.histogram("db_pool_checkout_seconds", "Time to obtain a connection from the pool")
+WAIT_SECONDS = registry.histogram("db_pool_wait_seconds", "Time spent waiting on a saturated pool")
+CHECKOUT_TIMEOUTS = registry.counter("db_pool_checkout_timeouts_total", "Checkouts that failed with a pool timeout")
+CONNECTIONS_OPENED = registry.counter("db_pool_connections_opened_total", "New DBAPI connections opened")
+CHECKED_OUT = registry.gauge("db_pool_checked_out", "Connections currently checked out")
+IDLE = registry.gauge("db_pool_idle", "Idle connections held in the pool")
+OVERFLOW = registry.gauge("db_pool_overflow", "Connections opened above pool_size")
+
+
+class _TimedCheckout:
+    def _saturated(self):
+        return False
+
+    def _do_get(self):
+        name = self.logging_name or "default"
+        saturated = self._saturated()
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            # seulement l'attente épuisée (pool_timeout) : un échec de connexion n'est pas un timeout
+            CHECKOUT_TIMEOUTS.inc(pool=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - t0
+            CHECKOUT_SECONDS.observe(elapsed, pool=name)
+            if saturated:
+                WAIT_SECONDS.observe(elapsed, pool=name)
+
+
+class _QueueSaturation:
+    def _saturated(self):
+        no_idle = self.checkedin() == 0
+        overflow_exhausted = self._max_overflow > -1 and self.overflow() >= self._max_overflow
+        return no_idle and overflow_exhausted
+
+
+class InstrumentedQueuePool(_QueueSaturation, _TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_QueueSaturation, _TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def instrument_engine(engine, name: str):
+    """Publie les gauges d'état du pool et compte les nouvelles connexions de `engine`."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        CONNECTIONS_OPENED.inc(pool=name)
+
+    pool = lambda: sync_engine.pool  # noqa: E731 (le pool est recréé par engine.dispose())
+    if isinstance(sync_engine.pool, QueuePool):
+        CHECKED_OUT.set_function(lambda: pool().checkedout(), pool=name)
+        IDLE.set_function(lambda: pool().checkedin(), pool=name)
+        OVERFLOW.set_function(lambda: max(pool().overflow(), 0), pool=name)
@@ -0,0 +1,179 @@
+"""
+Hub pub/sub en mémoire pour la diffusion temps réel des mesures (WebSocket / SSE).
+
+L'ingestion publie chaque lot une seule fois après commit : le message est sérialisé
+une fois puis remis aux abonnés dont les filtres correspondent (capteur, polluant,
+arrondissement). Les abonnés sont indexés par leur filtre le plus sélectif, ce qui évite
+de tester chaque message contre toutes les connexions.
+
+Chaque abonné a une file bornée (MESURE_STREAM_QUEUE_SIZE) : un client trop lent perd
+les messages les plus anciens, et le nombre de messages perdus lui est signalé.
+La publication peut venir d'un thread du threadpool : la remise est planifiée sur la
+boucle asyncio de l'abonné (call_soon_threadsafe).
+
+Le hub est local au processus : avec plusieurs workers uvicorn, un client ne reçoit que
+les mesures ingérées par le worker qui le sert.
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+from decimal import Decimal
+import orjson
+from app.services.metrics import registry
+
+MESURE_STREAM_QUEUE_SIZE = int(os.getenv("MESURE_STREAM_QUEUE_SIZE", "1000"))
+MESURE_STREAM_MAX_SUBSCRIBERS = int(os.getenv("MESURE_STREAM_MAX_SUBSCRIBERS", "10000"))
+
+_VALEUR_QUANTUM = Decimal("0.000001")
+
+_published = registry.counter("mesure_stream_published_total", "Mesures published to the live stream hub")
+_delivered = registry.counter("mesure_stream_delivered_total", "Mesure messages queued for live stream subscribers")
+_dropped = registry.counter("mesure_stream_dropped_total", "Mesure messages dropped for slow live stream subscribers")
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Message:
+    __slots__ = ("uuid_capteur", "pollutant", "id_arrondissement", "data")
+
+    def __init__(self, uuid_capteur: str, pollutant: str, id_arrondissement, data: str):
+        self.uuid_capteur = uuid_capteur
+        self.pollutant = pollutant
+        self.id_arrondissement = id_arrondissement
+        self.data = data
+
+
+class Subscription:
+    def __init__(self, loop, uuid_capteur=None, pollutant=None, id_arrondissement=None, maxsize: int = MESURE_STREAM_QUEUE_SIZE):
+        self.loop = loop
+        self.uuid_capteur = str(uuid_capteur) if uuid_capteur is not None else None
+        self.pollutant = pollutant
+        self.id_arrondissement = id_arrondissement
+        self.dropped = 0
+        self._queue = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+
+    def index_key(self):
+        """Filtre le plus sélectif, utilisé pour indexer l'abonné dans le hub."""
+        if self.uuid_capteur is not None:
+            return ("uuid", self.uuid_capteur)
+        if self.id_arrondissement is not None:
+            return ("arr", self.id_arrondissement)
+        if self.pollutant is not None:
+            return ("pollutant", self.pollutant)
+        return ("all", None)
+
+    def matches(self, msg: Message) -> bool:
+        return (
+            (self.uuid_capteur is None or self.uuid_capteur == msg.uuid_capteur)
+            and (self.pollutant is None or self.pollutant == msg.pollutant)
+            and (self.id_arrondissement is None or self.id_arrondissement == msg.id_arrondissement)
+        )
+
+    def _push(self, msg: Message):
+        # appelé dans la boucle de l'abonné ; deque(maxlen) évince le plus ancien
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+            _dropped.inc()
+        self._queue.append(msg.data)
+        self._ready.set()
+
+    async def next_batch(self):
+        """Attend au moins un message et retourne tous les messages en attente."""
+        while not self._queue:
+            self._ready.clear()
+            await self._ready.wait()
+        items = list(self._queue)
+        self._queue.clear()
+        return items
+
+    def take_dropped(self) -> int:
+        n, self.dropped = self.dropped, 0
+        return n
+
+
+class Hub:
+    def __init__(self, max_subscribers: int = MESURE_STREAM_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._index = {}  # index_key -> set(Subscription)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def subscribe(self, **filters) -> Subscription:
+        """À appeler depuis la boucle asyncio qui lira l'abonnement."""
+        sub = Subscription(asyncio.get_running_loop(), **filters)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers()
+            self._index.setdefault(sub.index_key(), set()).add(sub)
+            self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._index.get(sub.index_key())
+            if subs is not None and sub in subs:
+                subs.discard(sub)
+                self._count -= 1
+                if not subs:
+                    del self._index[sub.index_key()]
+
+    def _candidates(self, msg: Message):
+        for key in (("all", None), ("uuid", msg.uuid_capteur), ("arr", msg.id_arrondissement), ("pollutant", msg.pollutant)):
+            yield from self._index.get(key, ())
+
+    def publish(self, messages):
+        """Remet les messages aux abonnés concernés ; utilisable depuis n'importe quel thread."""
+        if not self._count or not messages:
+            return
+        _published.inc(len(messages))
+        by_loop = {}
+        with self._lock:
+            for msg in messages:
+                for sub in self._candidates(msg):
+                    if sub.matches(msg):
+                        by_loop.setdefault(sub.loop, []).append((sub, msg))
+        for loop, deliveries in by_loop.items():
+            _delivered.inc(len(deliveries))
+            try:
+                loop.call_soon_threadsafe(_deliver, deliveries)
+            except RuntimeError:  # boucle fermée
+                pass
+
+
+def _deliver(deliveries):
+    for sub, msg in deliveries:
+        sub._push(msg)
+
+
+def mesure_messages(rows, arrondissements):
+    """
+    Messages à publier pour des mesures insérées (dicts de MesureCreate).
+    `arrondissements` : uuid_capteur -> id_arrondissement.
+    """
+    out = []
+    for r in rows:
+        uuid_capteur = str(r["uuid_capteur"])
+        id_arrondissement = arrondissements.get(r["uuid_capteur"])
+        data = {
+            "uuid_capteur": uuid_capteur,
+            "ts": r["ts"],
+            "pollutant": r["pollutant"],
+            # même représentation que MesureOut (Numeric(14,6) en texte)
+            "valeur": str(Decimal(r["valeur"]).quantize(_VALEUR_QUANTUM)),
+            "unite": r.get("unite"),
+            "id_arrondissement": id_arrondissement,
+        }
+        out.append(Message(uuid_capteur, r["pollutant"], id_arrondissement, orjson.dumps(data, option=orjson.OPT_UTC_Z).decode()))
+    return out
+
+
+hub = Hub()
+
+registry.gauge("mesure_stream_subscribers", "Live mesure stream subscribers").set_function(lambda: len(hub))
@@ -0,0 +1,188 @@
+"""
+Suppression en masse de capteurs (par propriétaire, arrondissement ou liste), sans charger
+leurs mesures dans la session.
+
+Les tables filles (mesure, mesure_hourly, capteur_status_history, capteur_current_status)
+sont en ON DELETE CASCADE : supprimer le capteur suffit, et les relations ORM sont en
+passive_deletes. Pour un gros volume, un DELETE unique tiendrait une transaction et des
+verrous le temps de supprimer des millions de lignes ; la purge supprime donc d'abord les
+mesures et l'historique par lots de PURGE_CHUNK_ROWS lignes (un commit par lot), par
+groupes de PURGE_CAPTEURS_PER_GROUP capteurs, puis les capteurs eux-mêmes (les
+interventions sont conservées, détachées du capteur, comme avec l'ORM).
+
+Jusqu'à PURGE_SYNC_MAX_ROWS mesures, la purge s'exécute dans la requête ; au-delà elle part
+en tâche de fond (un worker, une purge à la fois) dont l'avancement se lit par son id. Les
+tâches sont gardées en mémoire du processus (les PURGE_JOBS_KEPT dernières). Chaque lot
+étant commité, une purge interrompue (arrêt, erreur) se termine en la relançant.
+
+Après chaque groupe : invalidation du cache analytics et des tuiles, retrait de l'index
+spatial et du registre des références.
+"""
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy import func, select, text
+from app import models
+from app.services.metrics import registry
+
+PURGE_CHUNK_ROWS = int(os.getenv("PURGE_CHUNK_ROWS", "10000"))
+PURGE_CAPTEURS_PER_GROUP = int(os.getenv("PURGE_CAPTEURS_PER_GROUP", "100"))
+PURGE_SYNC_MAX_ROWS = int(os.getenv("PURGE_SYNC_MAX_ROWS", "100000"))
+PURGE_JOBS_KEPT = 100
+
+DELETED = registry.counter("capteur_purge_deleted_total", "Rows deleted by capteur purges, by table")
+
+logger = logging.getLogger(__name__)
+
+CHILD_TABLES = ("mesure", "capteur_status_history")
+
+
+def select_capteurs(db, id_proprietaire: int = None, id_arrondissement: int = None, uuids=None):
+    """uuid des capteurs visés (filtres combinés) ; au moins un filtre est requis."""
+    if id_proprietaire is None and id_arrondissement is None and not uuids:
+        raise ValueError("id_proprietaire, id_arrondissement or uuids is required")
+    q = db.query(models.Capteur.uuid_capteur)
+    if id_proprietaire is not None:
+        q = q.filter(models.Capteur.id_proprietaire == id_proprietaire)
+    if id_arrondissement is not None:
+        q = q.filter(models.Capteur.id_arrondissement == id_arrondissement)
+    if uuids:
+        q = q.filter(models.Capteur.uuid_capteur.in_(list(uuids)))
+    return [r[0] for r in q.order_by(models.Capteur.uuid_capteur).all()]
+
+
+def count_mesures(db, uuids, limit: int):
+    """Nombre de mesures des capteurs, compté jusqu'à limit + 1 seulement."""
+    m = models.Mesure
+    sub = select(m.id).where(m.uuid_capteur.in_(uuids)).limit(limit + 1).subquery()
+    return db.execute(select(func.count()).select_from(sub)).scalar()
+
+
+class PurgeJob:
+    def __init__(self, uuids, filters: dict):
+        self.id = uuid.uuid4().hex
+        self.uuids = list(uuids)
+        self.filters = filters
+        self.status = "pending"
+        self.capteurs_deleted = 0
+        self.rows_deleted = {t: 0 for t in CHILD_TABLES}
+        self.error = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "filters": self.filters,
+            "capteurs_total": len(self.uuids),
+            "capteurs_deleted": self.capteurs_deleted,
+            "rows_deleted": dict(self.rows_deleted),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _delete_chunked(conn, table: str, uuids, chunk_rows: int, progress):
+    while True:
+        n = conn.execute(text(
+            f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE uuid_capteur = ANY(CAST(:uuids AS uuid[])) LIMIT :n)"
+        ), {"uuids": uuids, "n": chunk_rows}).rowcount
+        conn.commit()
+        DELETED.inc(n, table=table)
+        progress(table, n)
+        if n < chunk_rows:
+            return
+
+
+def _after_delete(uuids):
+    from app.services import heatmap, references, spatial
+    from app.services.cache import analytics_cache
+
+    analytics_cache.invalidate("capteur", "capteur_status")
+    heatmap.tile_cache.invalidate("capteur", "capteur_status")
+    for u in uuids:
+        spatial.index.remove(u)
+    references.capteurs.forget(*uuids)
+
+
+def run(engine, job: PurgeJob, chunk_rows: int = PURGE_CHUNK_ROWS, group_size: int = PURGE_CAPTEURS_PER_GROUP):
+    """Exécute la purge par groupes de capteurs ; met à jour l'avancement de la tâche."""
+    job.status, job.started_at = "running", datetime.now(timezone.utc)
+
+    def progress(table, n):
+        job.rows_deleted[table] += n
+
+    try:
+        with engine.connect() as conn:
+            for start in range(0, len(job.uuids), group_size):
+                group = job.uuids[start:start + group_size]
+                keys = [str(u) for u in group]
+                for table in CHILD_TABLES:
+                    _delete_chunked(conn, table, keys, chunk_rows, progress)
+                conn.execute(text("UPDATE intervention SET uuid_capteur = NULL WHERE uuid_capteur = ANY(CAST(:uuids AS uuid[]))"), {"uuids": keys})
+                # mesure_hourly et capteur_current_status suivent par ON DELETE CASCADE
+                deleted = conn.execute(text("DELETE FROM capteur WHERE uuid_capteur = ANY(CAST(:uuids AS uuid[]))"), {"uuids": keys}).rowcount
+                conn.commit()
+                DELETED.inc(deleted, table="capteur")
+                job.capteurs_deleted += deleted
+                _after_delete(group)
+    except Exception as e:
+        job.status, job.error = "failed", str(e)
+        logger.exception("capteur purge %s failed after %d capteur(s)", job.id, job.capteurs_deleted)
+    else:
+        job.status = "done"
+    finally:
+        job.finished_at = datetime.now(timezone.utc)
+    return job
+
+
+class PurgeRunner:
+    """Tâches de purge en arrière-plan : une file, un thread, les dernières tâches consultables."""
+
+    def __init__(self, kept: int = PURGE_JOBS_KEPT):
+        self.kept = kept
+        self._jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _remember(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.kept:
+                oldest = next(iter(self._jobs))
+                if self._jobs[oldest].status in ("pending", "running"):
+                    break
+                self._jobs.pop(oldest)
+
+    def submit(self, engine, job: PurgeJob):
+        self._remember(job)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="capteur-purge", daemon=True)
+                self._thread.start()
+        self._queue.put((engine, job))
+        return job
+
+    def run_now(self, engine, job: PurgeJob):
+        self._remember(job)
+        return run(engine, job)
+
+    def _run(self):
+        while True:
+            engine, job = self._queue.get()
+            run(engine, job)
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+
+runner = PurgeRunner()
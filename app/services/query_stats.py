@@ -0,0 +1,232 @@
+"""
+Instrumentation des requêtes SQL par requête HTTP (QUERY_STATS_ENABLED, activé par défaut).
+
+Les événements before/after_cursor_execute des moteurs comptent les instructions, leur
+durée cumulée et les lignes renvoyées (SELECT) dans les statistiques de la requête HTTP
+en cours (ContextVar posée par le middleware de main.py, visible depuis le threadpool des
+routes synchrones). Le temps d'encodage JSON (réponses orjson de fastjson et JSONResponse
+par défaut) est compté à part. Le middleware expose ces valeurs dans les en-têtes
+X-DB-Statements, X-DB-Time-Ms, X-DB-Rows, X-Serialization-Ms et Server-Timing, et dans
+les histogrammes http_request_* de /metrics (par méthode et route).
+
+Une instruction plus longue que SLOW_QUERY_MS est journalisée (logger app.slow_queries)
+et conservée dans un anneau des SLOW_QUERY_KEEP dernières, avec son plan (EXPLAIN, sans
+ANALYZE : la requête n'est pas réexécutée) pour les lectures si QUERY_EXPLAIN. Le plan
+d'une même instruction est réutilisé pendant EXPLAIN_REUSE_SECONDS. Les paramètres ne
+sont pas conservés. Consultation : GET /metrics/slow_queries.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from starlette.routing import Match
+from app.services.metrics import registry
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "100"))
+QUERY_EXPLAIN = os.getenv("QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+
+EXPLAIN_REUSE_SECONDS = 60
+STATEMENT_MAX_CHARS = 4000
+_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+_ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+STATEMENT_SECONDS = registry.histogram("db_statement_seconds", "Duration of a single SQL statement")
+SLOW_STATEMENTS = registry.counter("db_slow_statements_total", "SQL statements slower than SLOW_QUERY_MS")
+REQUEST_SECONDS = registry.histogram("http_request_seconds", "HTTP request duration")
+REQUEST_STATEMENTS = registry.histogram("http_request_db_statements", "SQL statements issued per HTTP request", buckets=_COUNT_BUCKETS)
+REQUEST_DB_SECONDS = registry.histogram("http_request_db_seconds", "Database time per HTTP request")
+REQUEST_ROWS = registry.histogram("http_request_db_rows", "Rows returned by SELECT statements per HTTP request", buckets=_ROWS_BUCKETS)
+REQUEST_SERIALIZATION_SECONDS = registry.histogram("http_request_serialization_seconds", "JSON encoding time per HTTP request")
+
+logger = logging.getLogger("app.slow_queries")
+
+_current = ContextVar("query_stats", default=None)
+
+slow_queries = deque(maxlen=SLOW_QUERY_KEEP)
+_slow_lock = threading.Lock()
+# instruction -> (instant, plan) : un seul EXPLAIN par instruction et par période
+_plans = {}
+
+
+class RequestStats:
+    """Compteurs d'une requête HTTP ; modifiés en place depuis les threads de la requête."""
+
+    __slots__ = ("path", "statements", "db_seconds", "rows", "serialization_seconds", "_lock")
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.serialization_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_statement(self, seconds: float, rows: int):
+        with self._lock:
+            self.statements += 1
+            self.db_seconds += seconds
+            self.rows += rows
+
+    def headers(self, total_seconds: float):
+        db_ms = self.db_seconds * 1000
+        ser_ms = self.serialization_seconds * 1000
+        return {
+            "X-DB-Statements": str(self.statements),
+            "X-DB-Time-Ms": f"{db_ms:.2f}",
+            "X-DB-Rows": str(self.rows),
+            "X-Serialization-Ms": f"{ser_ms:.2f}",
+            "Server-Timing": (
+                f'db;dur={db_ms:.2f};desc="{self.statements} statements", '
+                f"serialize;dur={ser_ms:.2f}, total;dur={total_seconds * 1000:.2f}"
+            ),
+        }
+
+
+def begin(path: str = ""):
+    """Ouvre les statistiques de la requête courante ; retourne (stats, jeton pour end)."""
+    stats = RequestStats(path)
+    return stats, _current.set(stats)
+
+
+def end(token):
+    _current.reset(token)
+
+
+@contextmanager
+def serializing():
+    """Compte le bloc comme temps d'encodage de la réponse courante."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        with stats._lock:
+            stats.serialization_seconds += elapsed
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse dont l'encodage est compté dans X-Serialization-Ms (réponse par défaut de l'app)."""
+
+    def render(self, content) -> bytes:
+        with serializing():
+            return super().render(content)
+
+
+def route_template(request) -> str:
+    """Chemin déclaré de la route (/mesures/{id}) pour borner la cardinalité des labels."""
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+
+def observe_request(stats: RequestStats, method: str, route: str, total_seconds: float):
+    labels = {"method": method, "route": route}
+    REQUEST_SECONDS.observe(total_seconds, **labels)
+    REQUEST_STATEMENTS.observe(stats.statements, **labels)
+    REQUEST_DB_SECONDS.observe(stats.db_seconds, **labels)
+    REQUEST_ROWS.observe(stats.rows, **labels)
+    REQUEST_SERIALIZATION_SECONDS.observe(stats.serialization_seconds, **labels)
+
+
+# --- requêtes lentes ---
+
+def _is_read(statement: str) -> bool:
+    head = statement.lstrip()[:6].lower()
+    return head.startswith("select") or head.startswith("with")
+
+
+def _explain(conn, statement: str, parameters):
+    """Plan JSON de l'instruction, sur la connexion de la requête (savepoint : une erreur n'affecte pas la transaction)."""
+    now = time.monotonic()
+    cached = _plans.get(statement)
+    if cached is not None and now - cached[0] < EXPLAIN_REUSE_SECONDS:
+        return cached[1]
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT query_stats_explain")
+            try:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute("ROLLBACK TO SAVEPOINT query_stats_explain")
+                cursor.execute("RELEASE SAVEPOINT query_stats_explain")
+        finally:
+            cursor.close()
+    except Exception as e:
+        logger.debug("EXPLAIN failed: %s", e)
+        return None
+    if isinstance(plan, str):  # asyncpg : json non décodé
+        plan = json.loads(plan)
+    if len(_plans) >= 4 * SLOW_QUERY_KEEP:
+        _plans.clear()
+    _plans[statement] = (now, plan)
+    return plan
+
+
+def record_slow(conn, statement: str, parameters, seconds: float, rows: int, executemany: bool, engine_name: str):
+    SLOW_STATEMENTS.inc(engine=engine_name)
+    stats = _current.get()
+    path = stats.path if stats is not None else None
+    logger.warning("slow query (%.1f ms, %s rows, %s): %s", seconds * 1000, rows, path or "-", statement[:STATEMENT_MAX_CHARS])
+    plan = None
+    if QUERY_EXPLAIN and not executemany and _is_read(statement):
+        plan = _explain(conn, statement, parameters)
+    entry = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(seconds * 1000, 2),
+        "rows": rows,
+        "engine": engine_name,
+        "path": path,
+        "statement": statement[:STATEMENT_MAX_CHARS],
+        "plan": plan,
+    }
+    with _slow_lock:
+        slow_queries.append(entry)
+
+
+def recent_slow_queries(limit: int = SLOW_QUERY_KEEP):
+    """Dernières instructions lentes, de la plus récente à la plus ancienne."""
+    with _slow_lock:
+        entries = list(slow_queries)
+    return entries[::-1][:limit]
+
+
+def instrument_queries(engine, name: str):
+    """Chronomètre les instructions de `engine` (moteur synchrone ou async)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_stats_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_stats_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        # lignes renvoyées : seulement pour les instructions qui produisent un résultat
+        rows = max(cursor.rowcount, 0) if cursor.description is not None else 0
+        STATEMENT_SECONDS.observe(elapsed, engine=name)
+        stats = _current.get()
+        if stats is not None:
+            stats.add_statement(elapsed, rows)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            record_slow(conn, statement, parameters, elapsed, rows, executemany, name)
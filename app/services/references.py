@@ -0,0 +1,151 @@
+"""
+Registre en mémoire des entités de référence (capteurs, véhicules, techniciens, citoyens,
+consultations) : vérifie l'existence d'une clé étrangère sans aller-retour base.
+
+Chaque type garde un LRU borné (REFERENCE_CACHE_MAX_ENTRIES clés) des clés existantes,
+avec une valeur associée pour les capteurs (id_arrondissement, utile à la diffusion temps
+réel), et un cache négatif des clés absentes qui expire après REFERENCE_NEGATIVE_TTL
+secondes (création par un autre worker ou hors API). Le registre est chargé au démarrage
+et tenu à jour par les routes de création, modification et suppression.
+
+Une clé absente du registre est cherchée en base (une requête pour toutes les clés
+manquantes d'un lot). Une clé connue mais supprimée ailleurs est rattrapée par la
+contrainte de clé étrangère : l'appelant l'oublie (forget) et répond comme sur un absent.
+
+REFERENCE_CACHE_ENABLED=false : chaque vérification interroge la base.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from app import models
+from app.services.metrics import registry
+
+REFERENCE_CACHE_ENABLED = os.getenv("REFERENCE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+REFERENCE_CACHE_MAX_ENTRIES = int(os.getenv("REFERENCE_CACHE_MAX_ENTRIES", "100000"))
+REFERENCE_NEGATIVE_TTL = float(os.getenv("REFERENCE_NEGATIVE_TTL", "5"))
+# clés absentes gardées au plus, par type
+NEGATIVE_MAX_ENTRIES = 10000
+
+LOOKUPS = registry.counter("reference_cache_lookups_total", "Reference key checks by outcome (hit, negative_hit, miss)")
+ENTRIES = registry.gauge("reference_cache_entries", "Known keys held by the reference registry")
+
+
+class EntityCache:
+    """Clés existantes d'une table (LRU) et clés absentes récentes (TTL)."""
+
+    def __init__(self, name: str, key_column, value_column=None,
+                 max_entries: int = REFERENCE_CACHE_MAX_ENTRIES, negative_ttl: float = REFERENCE_NEGATIVE_TTL,
+                 enabled: bool = REFERENCE_CACHE_ENABLED):
+        self.name = name
+        self.key_column = key_column
+        self.value_column = value_column
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.enabled = enabled
+        self._known = OrderedDict()  # clé -> valeur
+        self._missing = OrderedDict()  # clé -> instant d'expiration
+        self._lock = threading.Lock()
+        ENTRIES.set_function(lambda: len(self._known), entity=name)
+
+    def __len__(self):
+        return len(self._known)
+
+    def _columns(self):
+        return (self.key_column,) if self.value_column is None else (self.key_column, self.value_column)
+
+    def _store(self, key, value):
+        self._missing.pop(key, None)
+        self._known[key] = value
+        self._known.move_to_end(key)
+        while len(self._known) > self.max_entries:
+            self._known.popitem(last=False)
+
+    def put(self, key, value=None):
+        if self.enabled:
+            with self._lock:
+                self._store(key, value)
+
+    def forget(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._known.pop(key, None)
+                self._missing.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._known.clear()
+            self._missing.clear()
+
+    def warm(self, db):
+        """Charge jusqu'à max_entries clés existantes."""
+        if not self.enabled:
+            return
+        rows = db.query(*self._columns()).limit(self.max_entries).all()
+        with self._lock:
+            for r in rows:
+                self._store(r[0], r[1] if self.value_column is not None else None)
+
+    def lookup(self, db, keys):
+        """{clé: valeur} des clés existantes ; les clés inconnues du registre sont cherchées en base en une requête."""
+        keys = set(keys)
+        if not keys:
+            return {}
+        found = {}
+        pending = []
+        if self.enabled:
+            now = time.monotonic()
+            with self._lock:
+                for key in keys:
+                    if key in self._known:
+                        self._known.move_to_end(key)
+                        found[key] = self._known[key]
+                        LOOKUPS.inc(entity=self.name, result="hit")
+                    elif self._missing.get(key, 0) > now:
+                        LOOKUPS.inc(entity=self.name, result="negative_hit")
+                    else:
+                        pending.append(key)
+        else:
+            pending = list(keys)
+        if not pending:
+            return found
+        LOOKUPS.inc(len(pending), entity=self.name, result="miss")
+        rows = db.query(*self._columns()).filter(self.key_column.in_(pending)).all()
+        loaded = {r[0]: (r[1] if self.value_column is not None else None) for r in rows}
+        found.update(loaded)
+        if self.enabled:
+            expires = time.monotonic() + self.negative_ttl
+            with self._lock:
+                for key in pending:
+                    if key in loaded:
+                        self._store(key, loaded[key])
+                    else:
+                        self._missing[key] = expires
+                        self._missing.move_to_end(key)
+                while len(self._missing) > NEGATIVE_MAX_ENTRIES:
+                    self._missing.popitem(last=False)
+        return found
+
+    def exists(self, db, key) -> bool:
+        return key in self.lookup(db, [key])
+
+
+capteurs = EntityCache("capteur", models.Capteur.uuid_capteur, models.Capteur.id_arrondissement)
+vehicules = EntityCache("vehicule", models.Vehicule.plaque)
+techniciens = EntityCache("technicien", models.Technicien.id_technicien)
+citoyens = EntityCache("citoyen", models.Citoyen.id_citoyen)
+consultations = EntityCache("consultation", models.Consultation.id_consultation)
+
+ALL = (capteurs, vehicules, techniciens, citoyens, consultations)
+
+
+def warm(db):
+    for cache in ALL:
+        cache.warm(db)
+
+
+def is_fk_violation(error) -> bool:
+    """IntegrityError due à une clé étrangère (SQLSTATE 23503), quel que soit le pilote."""
+    orig = getattr(error, "orig", None)
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    return code == "23503" or "foreign key" in str(orig).lower()
@@ -0,0 +1,172 @@
+"""
+Routage des lectures vers des réplicas PostgreSQL (DATABASE_REPLICA_URLS).
+
+Les écritures et les lectures unitaires restent sur le primaire ; les routes analytics,
+les listes et l'export passent par get_read_db, qui choisit un réplica :
+REPLICA_SELECTION=round_robin (défaut) ou least_loaded (moins de sessions en cours,
+compté par ce routeur). Sans réplica configuré, tout va au primaire.
+
+Lecture après écriture : une requête d'écriture réussie pose le cookie db_primary_until ;
+tant qu'il n'a pas expiré (READ_AFTER_WRITE_SECONDS), les lectures du même client
+restent sur le primaire. L'en-tête X-Read-Primary: 1 a le même effet pour une requête.
+
+Un thread mesure le retard de chaque réplica toutes les REPLICA_LAG_CHECK_SECONDS (temps
+depuis la dernière transaction rejouée, nul si le réplica a rejoué tout ce qu'il a reçu) ;
+un réplica de plus de REPLICA_MAX_LAG_SECONDS (5) de retard, ou injoignable, est écarté
+jusqu'à la mesure suivante, et les lectures retombent sur le primaire si aucun ne convient.
+REPLICA_MAX_LAG_SECONDS=0 désactive la mesure.
+
+Cache : un résultat calculé juste après une invalidation peut venir d'un réplica qui n'a
+pas encore rejoué l'écriture ; le cache le garde alors au plus staleness_bound() secondes
+(retard maximal toléré + intervalle de mesure), au lieu de son TTL complet.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import text
+from app.services.metrics import registry
+
+REPLICA_SELECTION = os.getenv("REPLICA_SELECTION", "round_robin")
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
+
+STICKY_COOKIE = "db_primary_until"
+PRIMARY_HEADER = "x-read-primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+READS = registry.counter("db_read_routing_total", "Read sessions by target engine")
+LAG = registry.gauge("db_replica_lag_seconds", "Last measured replication lag (-1: unreachable)")
+
+logger = logging.getLogger(__name__)
+
+# lectures de la requête courante forcées sur le primaire (posé par le middleware)
+_primary_only = ContextVar("replicas_primary_only", default=False)
+
+
+class Replica:
+    def __init__(self, name: str, engine, async_engine=None):
+        self.name = name
+        self.engine = engine
+        self.async_engine = async_engine
+        self.in_flight = 0
+        self.lag = 0.0
+        self.healthy = True
+
+
+class ReplicaRouter:
+    def __init__(self, replicas, selection: str = REPLICA_SELECTION, max_lag: float = REPLICA_MAX_LAG_SECONDS):
+        if selection not in ("round_robin", "least_loaded"):
+            raise ValueError(f"unknown REPLICA_SELECTION: {selection}")
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.max_lag = max_lag
+        self._cycle = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self):
+        """Réplica pour une session de lecture (None : primaire) ; à rendre avec release()."""
+        if not self.replicas or _primary_only.get():
+            READS.inc(target="primary")
+            return None
+        with self._lock:
+            candidates = [r for r in self.replicas if r.healthy]
+            if not candidates:
+                READS.inc(target="primary")
+                return None
+            if self.selection == "least_loaded":
+                # à égalité, le tour de rôle départage
+                start = next(self._cycle)
+                order = self.replicas[start:] + self.replicas[:start]
+                chosen = min((r for r in order if r.healthy), key=lambda r: r.in_flight)
+            else:
+                chosen = None
+                while chosen is None:
+                    r = self.replicas[next(self._cycle)]
+                    chosen = r if r.healthy else None
+            chosen.in_flight += 1
+        READS.inc(target=chosen.name)
+        return chosen
+
+    def release(self, replica):
+        if replica is not None:
+            with self._lock:
+                replica.in_flight -= 1
+
+    def staleness_bound(self) -> float:
+        """Retard maximal d'une lecture sur réplica (0 sans réplica) ; READ_AFTER_WRITE_SECONDS si le retard n'est pas mesuré."""
+        if not self.replicas:
+            return 0.0
+        if self.max_lag <= 0:
+            return READ_AFTER_WRITE_SECONDS
+        return self.max_lag + REPLICA_LAG_CHECK_SECONDS
+
+    # --- retard de réplication ---
+
+    def check_lag(self):
+        for r in self.replicas:
+            try:
+                with r.engine.connect() as conn:
+                    lag = float(conn.execute(LAG_SQL).scalar())
+            except Exception as e:
+                logger.warning("replica %s unreachable: %s", r.name, e)
+                r.lag, r.healthy = -1.0, False
+            else:
+                if r.healthy and lag > self.max_lag:
+                    logger.warning("replica %s is %.1fs behind; reading from the primary", r.name, lag)
+                r.lag, r.healthy = lag, lag <= self.max_lag
+            LAG.set(r.lag, replica=r.name)
+
+    def _run(self):
+        while not self._stop.wait(REPLICA_LAG_CHECK_SECONDS):
+            self.check_lag()
+
+    def start(self):
+        """Démarre la surveillance du retard (si REPLICA_MAX_LAG_SECONDS > 0)."""
+        if not self.replicas or self.max_lag <= 0 or self._thread is not None:
+            return
+        self.check_lag()
+        self._thread = threading.Thread(target=self._run, name="replica-lag", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def read_from_primary(request) -> bool:
+    """Lecture après écriture : cookie non expiré, ou en-tête X-Read-Primary."""
+    if request.headers.get(PRIMARY_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+
+def set_primary_only(value: bool):
+    return _primary_only.set(value)
+
+
+def reset_primary_only(token):
+    _primary_only.reset(token)
+
+
+def mark_write(response):
+    """Après une écriture réussie : lectures du client sur le primaire pendant READ_AFTER_WRITE_SECONDS."""
+    response.set_cookie(
+        STICKY_COOKIE,
+        f"{time.time() + READ_AFTER_WRITE_SECONDS:.3f}",
+        max_age=max(1, int(READ_AFTER_WRITE_SECONDS + 0.999)),
+        httponly=True,
+        samesite="lax",
+    )
@@ -0,0 +1,147 @@
+"""
+Rollups horaires des mesures (table mesure_hourly).
+
+Chaque bucket conserve somme, nombre, min et max des valeurs d'un capteur pour un
+polluant sur une heure UTC. Les buckets sont mis à jour dans la même transaction que
+l'insertion des mesures brutes (voir app.services.ingestion), ce qui permet aux
+analytics de lire O(capteurs x heures) lignes au lieu de re-scanner la table mesure.
+"""
+import argparse
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app import models
+
+UPSERT_CHUNK_SIZE = 1000
+
+
+def to_utc(ts: datetime) -> datetime:
+    """Timestamp en UTC, avec fuseau (les timestamps naïfs sont considérés en UTC)."""
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def hour_floor(ts: datetime) -> datetime:
+    """Tronque un timestamp à l'heure UTC (les timestamps naïfs sont considérés en UTC)."""
+    return to_utc(ts).replace(minute=0, second=0, microsecond=0)
+
+
+def hour_bucket_expr(col):
+    """Équivalent SQL de hour_floor : date_trunc('hour') calculé en UTC, résultat timestamptz."""
+    utc = literal_column("'UTC'")
+    return func.timezone(utc, func.date_trunc("hour", func.timezone(utc, col)))
+
+
+def _aggregate(rows):
+    buckets = {}
+    for r in rows:
+        key = (r["uuid_capteur"], r["pollutant"], hour_floor(r["ts"]))
+        v = Decimal(str(r["valeur"]))
+        b = buckets.get(key)
+        if b is None:
+            buckets[key] = [v, 1, v, v]
+        else:
+            b[0] += v
+            b[1] += 1
+            if v < b[2]:
+                b[2] = v
+            if v > b[3]:
+                b[3] = v
+    return [
+        {
+            "uuid_capteur": k[0],
+            "pollutant": k[1],
+            "bucket": k[2],
+            "sum_valeur": b[0],
+            "nb_mesures": b[1],
+            "min_valeur": b[2],
+            "max_valeur": b[3],
+        }
+        # ordre stable des clés : deux ingestions concurrentes verrouillent les buckets dans le même ordre (pas de deadlock)
+        for k, b in sorted(buckets.items(), key=lambda kv: (str(kv[0][0]), kv[0][1], kv[0][2]))
+    ]
+
+
+def apply(db: Session, rows):
+    """
+    Ajoute des mesures (dicts uuid_capteur/ts/pollutant/valeur) aux buckets horaires.
+    Les mesures sont d'abord pré-agrégées en Python, puis fusionnées par INSERT ... ON CONFLICT.
+    Pas de commit : l'appelant reste maître de la transaction.
+    """
+    table = models.MesureHourly.__table__
+    buckets = _aggregate(rows)
+    for start in range(0, len(buckets), UPSERT_CHUNK_SIZE):
+        stmt = pg_insert(table).values(buckets[start:start + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.uuid_capteur, table.c.pollutant, table.c.bucket],
+            set_={
+                "sum_valeur": table.c.sum_valeur + stmt.excluded.sum_valeur,
+                "nb_mesures": table.c.nb_mesures + stmt.excluded.nb_mesures,
+                "min_valeur": func.least(table.c.min_valeur, stmt.excluded.min_valeur),
+                "max_valeur": func.greatest(table.c.max_valeur, stmt.excluded.max_valeur),
+            },
+        )
+        db.execute(stmt)
+    return len(buckets)
+
+
+def rebuild(db: Session, since: datetime = None):
+    """
+    Recalcule les buckets depuis la table mesure (backfill, import en masse, correction).
+    Si `since` est fourni, seuls les buckets à partir de l'heure de `since` sont recalculés.
+    """
+    table = models.MesureHourly.__table__
+    bucket = hour_bucket_expr(models.Mesure.ts)
+
+    delete_q = db.query(models.MesureHourly)
+    source_q = db.query(
+        models.Mesure.uuid_capteur,
+        models.Mesure.pollutant,
+        bucket.label("bucket"),
+        func.sum(models.Mesure.valeur),
+        func.count(models.Mesure.id),
+        func.min(models.Mesure.valeur),
+        func.max(models.Mesure.valeur),
+    )
+    if since is not None:
+        start = hour_floor(since)
+        delete_q = delete_q.filter(models.MesureHourly.bucket >= start)
+        source_q = source_q.filter(models.Mesure.ts >= start)
+    source_q = source_q.group_by(models.Mesure.uuid_capteur, models.Mesure.pollutant, bucket)
+
+    delete_q.delete(synchronize_session=False)
+    db.execute(
+        table.insert().from_select(
+            ["uuid_capteur", "pollutant", "bucket", "sum_valeur", "nb_mesures", "min_valeur", "max_valeur"],
+            source_q.statement,
+        )
+    )
+    db.commit()
+
+
+def window_start(hours: int, now: datetime = None) -> datetime:
+    """Premier bucket d'une fenêtre glissante de `hours` heures (alignée sur l'heure pleine)."""
+    now = now or datetime.now(timezone.utc)
+    return hour_floor(now - timedelta(hours=hours))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recalcule les rollups horaires mesure_hourly")
+    parser.add_argument("--hours", type=int, default=None, help="ne recalculer que les N dernières heures")
+    args = parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    since = window_start(args.hours) if args.hours else None
+    db = SessionLocal()
+    try:
+        rebuild(db, since=since)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
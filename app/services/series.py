@@ -0,0 +1,147 @@
+"""
+Séries temporelles d'un capteur pour les graphiques : agrégation par bucket et
+réduction LTTB (Largest-Triangle-Three-Buckets) à un nombre de points donné.
+
+bucket=raw lit les mesures brutes (index ix_mesure_capteur_ts_id) ; minute agrège la
+table mesure ; hour, day, week et month agrègent les rollups horaires (mesure_hourly),
+donc sur des heures entières aux bords de l'intervalle. Buckets en UTC.
+
+LTTB garde le premier et le dernier point et, dans chacun des `points - 2` buckets
+intermédiaires, le point qui forme le plus grand triangle avec le point retenu avant lui
+et la moyenne du bucket suivant : pics et creux restent visibles, contrairement à une
+moyenne. Les moyennes des buckets sont calculées d'un coup (np.add.reduceat) et
+chaque bucket ne fait que quelques opérations vectorisées : 10 millions de points se
+réduisent à 2 000 en quelques dizaines de millisecondes. La lecture des lignes brutes
+domine au-delà : préférer un bucket pour les longues périodes.
+"""
+import os
+import numpy as np
+from sqlalchemy import func, literal_column
+from app import models
+from app.services.rollup import hour_floor
+
+SERIES_MAX_SOURCE_POINTS = int(os.getenv("SERIES_MAX_SOURCE_POINTS", "1000000"))
+# lignes lues par lot sur le curseur serveur
+FETCH_CHUNK_ROWS = 50_000
+
+BUCKETS = ("raw", "minute", "hour", "day", "week", "month")
+AGGREGATES = ("avg", "min", "max")
+
+
+def lttb(x, y, n_out: int):
+    """Indices (croissants) des n_out points retenus parmi (x, y), x trié."""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        # pas de bucket intermédiaire : les extrémités seulement
+        return np.array([0, n - 1][:n_out], dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 buckets sur les points 1 .. n-2 (au moins un point chacun puisque n > n_out)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # point de référence "suivant" de chaque bucket : moyenne du bucket suivant, dernier point pour le dernier
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        # double aire du triangle (a, p, suivant) = |dy * x_p - dx * y_p + constante|
+        dx, dy = next_x[i] - ax, next_y[i] - ay
+        area = dy * x[lo:hi]
+        area -= dx * y[lo:hi]
+        area -= dy * ax - dx * ay
+        a = lo + int(np.abs(area, out=area).argmax())
+        out[i + 1] = a
+    return out
+
+
+def _utc_trunc(unit: str, col):
+    utc = literal_column("'UTC'")
+    return func.timezone(utc, func.date_trunc(unit, func.timezone(utc, col)))
+
+
+def _query(db, uuid_capteur, pollutant: str, ts_from, ts_to, bucket: str, agg: str):
+    if bucket in ("raw", "minute"):
+        m = models.Mesure
+        if bucket == "raw":
+            ts, value, group = m.ts, m.valeur, None
+        else:
+            ts = _utc_trunc("minute", m.ts)
+            value = {"avg": func.avg, "min": func.min, "max": func.max}[agg](m.valeur)
+            group = ts
+        q = db.query(func.extract("epoch", ts), value).filter(m.uuid_capteur == uuid_capteur, m.pollutant == pollutant)
+        col = m.ts
+    else:
+        h = models.MesureHourly
+        ts = _utc_trunc(bucket, h.bucket)
+        value = {
+            "avg": func.sum(h.sum_valeur) / func.sum(h.nb_mesures),
+            "min": func.min(h.min_valeur),
+            "max": func.max(h.max_valeur),
+        }[agg]
+        group = ts
+        q = db.query(func.extract("epoch", ts), value).filter(h.uuid_capteur == uuid_capteur, h.pollutant == pollutant)
+        col = h.bucket
+        if ts_from is not None:
+            # buckets horaires entamés par ts_from inclus
+            ts_from = hour_floor(ts_from)
+    if ts_from is not None:
+        q = q.filter(col >= ts_from)
+    if ts_to is not None:
+        q = q.filter(col < ts_to)
+    if group is not None:
+        q = q.group_by(group)
+    return q.order_by(ts if group is None else group)
+
+
+def fetch(db, uuid_capteur, pollutant: str, ts_from=None, ts_to=None, bucket: str = "raw", agg: str = "avg"):
+    """(x en secondes epoch, y) en tableaux NumPy ; ValueError au-delà de SERIES_MAX_SOURCE_POINTS."""
+    stmt = _query(db, uuid_capteur, pollutant, ts_from, ts_to, bucket, agg).limit(SERIES_MAX_SOURCE_POINTS + 1).statement
+    # lecture par lots dans des tableaux qui doublent au besoin : pas de liste de tuples en mémoire
+    x = np.empty(min(FETCH_CHUNK_ROWS, SERIES_MAX_SOURCE_POINTS + 1))
+    y = np.empty_like(x)
+    n = 0
+    result = db.execute(stmt, execution_options={"yield_per": FETCH_CHUNK_ROWS})
+    for chunk in result.partitions():
+        if n + len(chunk) > SERIES_MAX_SOURCE_POINTS:
+            result.close()
+            raise ValueError(f"more than {SERIES_MAX_SOURCE_POINTS} points in range: narrow it or use a coarser bucket")
+        if n + len(chunk) > len(x):
+            size = min(max(2 * len(x), n + len(chunk)), SERIES_MAX_SOURCE_POINTS)
+            x, y = np.resize(x, size), np.resize(y, size)
+        data = np.array(chunk, dtype=np.float64)
+        x[n:n + len(chunk)], y[n:n + len(chunk)] = data[:, 0], data[:, 1]
+        n += len(chunk)
+    return x[:n].copy(), y[:n].copy()
+
+
+def series(db, uuid_capteur, pollutant: str, ts_from=None, ts_to=None, bucket: str = "raw", agg: str = "avg", points: int = 2000):
+    """Série prête pour un graphique : timestamps ISO 8601 et valeurs, au plus `points` points (0 : pas de réduction)."""
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    if agg not in AGGREGATES:
+        raise ValueError(f"agg must be one of {', '.join(AGGREGATES)}")
+    x, y = fetch(db, uuid_capteur, pollutant, ts_from, ts_to, bucket, agg)
+    source_points = len(x)
+    if points and source_points > points:
+        keep = lttb(x, y, points)
+        x, y = x[keep], y[keep]
+    ts = np.datetime_as_string(np.round(x * 1e6).astype("datetime64[us]"), unit="us", timezone="UTC")
+    return {
+        "uuid_capteur": str(uuid_capteur),
+        "pollutant": pollutant,
+        "bucket": bucket,
+        "agg": agg if bucket != "raw" else None,
+        "source_points": source_points,
+        "points": len(x),
+        "ts": ts.tolist(),
+        "valeur": np.round(y, 6).tolist(),
+    }
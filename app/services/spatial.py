@@ -0,0 +1,232 @@
+"""
+Index spatial des capteurs : rectangle englobant, rayon et k plus proches voisins.
+
+Par défaut l'index est une grille en mémoire (cellules de SPATIAL_CELL_DEG degrés) :
+une requête ne parcourt que les cellules couvrant la zone demandée, et les k plus
+proches voisins s'obtiennent en élargissant des anneaux de cellules autour du point.
+Les routes d'écriture de /capteurs mettent l'index à jour ; il est aussi relu depuis la
+base toutes les SPATIAL_REFRESH_SECONDS secondes au plus (écritures d'autres workers ou
+hors API).
+
+Avec SPATIAL_INDEX_ENABLED=false, les mêmes requêtes passent par PostgreSQL sur l'index
+GiST ix_capteur_position (point(longitude, latitude), migration 0005).
+
+Distances en mètres (haversine, sphère de rayon moyen terrestre).
+"""
+import math
+import os
+import threading
+import time
+from sqlalchemy import and_, func, select, true
+from app import models
+
+SPATIAL_INDEX_ENABLED = os.getenv("SPATIAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+SPATIAL_CELL_DEG = float(os.getenv("SPATIAL_CELL_DEG", "0.01"))
+SPATIAL_REFRESH_SECONDS = float(os.getenv("SPATIAL_REFRESH_SECONDS", "300"))
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEG = math.pi * EARTH_RADIUS_M / 180
+# candidats relus par la base avant reclassement haversine (kNN en mode base)
+DB_KNN_OVERSAMPLE = 4
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat: float, lon: float, radius_m: float):
+    """Rectangle (min_lat, min_lon, max_lat, max_lon) contenant le cercle."""
+    dlat = radius_m / METERS_PER_DEG
+    cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+    dlon = min(180.0, radius_m / (METERS_PER_DEG * cos_lat))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+class GridIndex:
+    def __init__(self, cell_deg: float = SPATIAL_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._cells = {}  # (cx, cy) -> {uuid: (lat, lon)}
+        self._points = {}  # uuid -> (lat, lon)
+        self._lock = threading.Lock()
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def _remove_locked(self, uuid):
+        old = self._points.pop(uuid, None)
+        if old is not None:
+            cell = self._cell(*old)
+            members = self._cells.get(cell)
+            if members is not None:
+                members.pop(uuid, None)
+                if not members:
+                    del self._cells[cell]
+
+    def upsert(self, uuid, lat, lon):
+        """Ajoute ou déplace un capteur ; sans coordonnées il sort de l'index."""
+        with self._lock:
+            self._remove_locked(uuid)
+            if lat is None or lon is None:
+                return
+            lat, lon = float(lat), float(lon)
+            self._points[uuid] = (lat, lon)
+            self._cells.setdefault(self._cell(lat, lon), {})[uuid] = (lat, lon)
+
+    def remove(self, uuid):
+        with self._lock:
+            self._remove_locked(uuid)
+
+    def position(self, uuid):
+        """(lat, lon) du capteur, None s'il n'a pas de coordonnées."""
+        with self._lock:
+            return self._points.get(uuid)
+
+    def load(self, rows):
+        """Remplace le contenu de l'index par `rows` : (uuid, lat, lon)."""
+        cells, points = {}, {}
+        for uuid, lat, lon in rows:
+            if lat is None or lon is None:
+                continue
+            lat, lon = float(lat), float(lon)
+            points[uuid] = (lat, lon)
+            cells.setdefault(self._cell(lat, lon), {})[uuid] = (lat, lon)
+        with self._lock:
+            self._cells, self._points = cells, points
+            self.loaded_at = time.monotonic()
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon, limit: int = None):
+        cx0, cy0 = self._cell(min_lat, min_lon)
+        cx1, cy1 = self._cell(max_lat, max_lon)
+        out = []
+        with self._lock:
+            # zone plus large que la grille occupée : parcourir les cellules existantes
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+                cells = [m for (cx, cy), m in self._cells.items() if cx0 <= cx <= cx1 and cy0 <= cy <= cy1]
+            else:
+                cells = [self._cells[(cx, cy)] for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) if (cx, cy) in self._cells]
+            for members in cells:
+                for uuid, (lat, lon) in members.items():
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        out.append((uuid, lat, lon))
+                        if limit is not None and len(out) >= limit:
+                            return out
+        return out
+
+    def radius(self, lat, lon, radius_m, limit: int = None):
+        """Capteurs à moins de radius_m mètres, du plus proche au plus lointain : [(uuid, lat, lon, distance)]."""
+        hits = []
+        for uuid, plat, plon in self.bbox(*radius_bbox(lat, lon, radius_m)):
+            d = haversine_m(lat, lon, plat, plon)
+            if d <= radius_m:
+                hits.append((uuid, plat, plon, d))
+        hits.sort(key=lambda h: h[3])
+        return hits[:limit] if limit is not None else hits
+
+    def nearest(self, lat, lon, k: int):
+        """k plus proches voisins par anneaux de cellules croissants autour du point."""
+        cx, cy = self._cell(lat, lon)
+        best = []
+        visited = 0
+        with self._lock:
+            ring = 0
+            while visited < len(self._points):
+                if 8 * ring > len(self._cells):
+                    # point loin des capteurs : les anneaux coûteraient plus qu'un parcours complet
+                    best = [(u, plat, plon, haversine_m(lat, lon, plat, plon)) for u, (plat, plon) in self._points.items()]
+                    break
+                for dx in range(-ring, ring + 1):
+                    step = 1 if abs(dx) == ring else 2 * ring
+                    for dy in range(-ring, ring + 1, step or 1):
+                        members = self._cells.get((cx + dx, cy + dy))
+                        if members:
+                            visited += len(members)
+                            best.extend((u, plat, plon, haversine_m(lat, lon, plat, plon)) for u, (plat, plon) in members.items())
+                best.sort(key=lambda h: h[3])
+                del best[k:]
+                # tout capteur hors des anneaux parcourus est à plus de `ring` cellules du point
+                reach_deg = ring * self.cell_deg
+                cos_lat = math.cos(math.radians(min(89.9, abs(lat) + reach_deg)))
+                if len(best) >= k and best[-1][3] <= reach_deg * METERS_PER_DEG * cos_lat:
+                    break
+                ring += 1
+        best.sort(key=lambda h: h[3])
+        return best[:k]
+
+
+index = GridIndex()
+
+
+def refresh(db, force: bool = False):
+    """Recharge l'index depuis la table capteur s'il n'a jamais été chargé ou est trop ancien."""
+    stale = index.loaded_at is None or time.monotonic() - index.loaded_at > SPATIAL_REFRESH_SECONDS
+    if force or stale:
+        index.load(db.query(models.Capteur.uuid_capteur, models.Capteur.latitude, models.Capteur.longitude).all())
+
+
+# --- requêtes côté base (SPATIAL_INDEX_ENABLED=false), sur l'index GiST ix_capteur_position ---
+
+def _position():
+    return func.point(models.Capteur.longitude, models.Capteur.latitude)
+
+
+def _db_rows(db, condition, order_by=None, limit=None):
+    q = db.query(models.Capteur.uuid_capteur, models.Capteur.latitude, models.Capteur.longitude).filter(
+        models.Capteur.latitude.isnot(None), models.Capteur.longitude.isnot(None), condition
+    )
+    if order_by is not None:
+        q = q.order_by(order_by)
+    if limit is not None:
+        q = q.limit(limit)
+    return [(u, float(la), float(lo)) for u, la, lo in q.all()]
+
+
+def _db_box(min_lat, min_lon, max_lat, max_lon):
+    return _position().op("<@")(func.box(func.point(min_lon, min_lat), func.point(max_lon, max_lat)))
+
+
+def db_bbox(db, min_lat, min_lon, max_lat, max_lon, limit: int = None):
+    return _db_rows(db, _db_box(min_lat, min_lon, max_lat, max_lon), limit=limit)
+
+
+def db_radius(db, lat, lon, radius_m, limit: int = None):
+    hits = []
+    for uuid, plat, plon in _db_rows(db, _db_box(*radius_bbox(lat, lon, radius_m))):
+        d = haversine_m(lat, lon, plat, plon)
+        if d <= radius_m:
+            hits.append((uuid, plat, plon, d))
+    hits.sort(key=lambda h: h[3])
+    return hits[:limit] if limit is not None else hits
+
+
+def db_nearest(db, lat, lon, k: int):
+    # <-> (distance euclidienne en degrés) sert l'ordre via GiST ; reclassement haversine ensuite
+    rows = _db_rows(db, true(), order_by=_position().op("<->")(func.point(lon, lat)), limit=k * DB_KNN_OVERSAMPLE)
+    hits = sorted(((u, la, lo, haversine_m(lat, lon, la, lo)) for u, la, lo in rows), key=lambda h: h[3])
+    return hits[:k]
+
+
+def latest_readings(db, uuids, pollutant: str):
+    """Dernière mesure de `pollutant` pour chaque capteur : uuid -> (ts, valeur, unite). Une requête LATERAL."""
+    if not uuids:
+        return {}
+    caps = (
+        select(models.Capteur.uuid_capteur)
+        .where(models.Capteur.uuid_capteur.in_(list(uuids)))
+        .subquery()
+    )
+    latest = (
+        select(models.Mesure.ts, models.Mesure.valeur, models.Mesure.unite)
+        .where(and_(models.Mesure.uuid_capteur == caps.c.uuid_capteur, models.Mesure.pollutant == pollutant))
+        .order_by(models.Mesure.ts.desc(), models.Mesure.id.desc())
+        .limit(1)
+        .lateral()
+    )
+    stmt = select(caps.c.uuid_capteur, latest.c.ts, latest.c.valeur, latest.c.unite).select_from(caps.join(latest, true()))
+    return {r[0]: (r[1], r[2], r[3]) for r in db.execute(stmt)}
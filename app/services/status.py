@@ -0,0 +1,79 @@
+"""
+Enregistrement des transitions de statut des capteurs.
+
+Chaque écriture dans capteur_status_history met à jour la projection capteur_current_status
+dans la même transaction (voir app.models.capteur_current_status), que les analytics lisent
+directement au lieu de recalculer max(ts) sur tout l'historique.
+"""
+from datetime import datetime, timezone
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app import models
+from app.models.capteur_current_status import upsert_current_status
+
+
+def record_status(db: Session, capteur: models.Capteur, status, ts: datetime = None):
+    """
+    Ajoute une transition à l'historique (la projection suit via l'événement after_insert)
+    et aligne capteur.statut si cette transition devient le statut courant. Commit inclus.
+    """
+    entry = models.CapteurStatusHistory(
+        uuid_capteur=capteur.uuid_capteur,
+        status=status,
+        ts=ts or datetime.now(timezone.utc),
+    )
+    db.add(entry)
+    db.flush()
+    db.refresh(entry)
+
+    current = db.get(models.CapteurCurrentStatus, capteur.uuid_capteur, populate_existing=True)
+    if current is not None and current.ts == entry.ts and current.status == entry.status:
+        capteur.statut = entry.status
+    db.commit()
+    db.refresh(entry)
+    return entry
+
+
+def record_statuses(db: Session, rows):
+    """
+    Écriture en masse (Core) de transitions (dicts uuid_capteur/status/ts), sans passer par l'ORM :
+    la projection est mise à jour explicitement, dans la même transaction. Pas de commit.
+    """
+    if not rows:
+        return 0
+    db.execute(models.CapteurStatusHistory.__table__.insert(), rows)
+    latest = {}
+    for r in rows:
+        cur = latest.get(r["uuid_capteur"])
+        if cur is None or r["ts"] >= cur["ts"]:
+            latest[r["uuid_capteur"]] = r
+    upsert_current_status(db, list(latest.values()))
+    return len(rows)
+
+
+def rebuild_current_status(db: Session):
+    """Reconstruit la projection depuis l'historique complet (backfill, import hors API)."""
+    h = models.CapteurStatusHistory
+    table = models.CapteurCurrentStatus.__table__
+    latest_q = (
+        db.query(h.uuid_capteur, h.status, h.ts)
+        .distinct(h.uuid_capteur)
+        .order_by(h.uuid_capteur, h.ts.desc(), h.id.desc())
+    )
+    stmt = pg_insert(table).from_select(["uuid_capteur", "status", "ts"], latest_q.statement)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.uuid_capteur],
+        set_={"status": stmt.excluded.status, "ts": stmt.excluded.ts},
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        rebuild_current_status(session)
+    finally:
+        session.close()
@@ -0,0 +1,415 @@
+"""
+Ingestion différée des mesures (WRITE_BEHIND_ENABLED, désactivée par défaut).
+
+POST /mesures/ vérifie le capteur, place la mesure dans une file bornée en mémoire et
+répond 202 sans attendre le commit. Un thread écrit la file par lots (INSERT multi-lignes
+et rollups, un commit par lot) dès que WRITE_BEHIND_BATCH_ROWS mesures attendent ou que
+la plus ancienne attend depuis WRITE_BEHIND_FLUSH_MS. Le cache, les tuiles, le flux temps
+réel et les agrégats glissants sont mis à jour après chaque commit, comme en écriture
+directe. Quand la file contient WRITE_BEHIND_MAX_ROWS mesures (y compris le lot en cours
+d'écriture), les nouvelles sont refusées (503 + Retry-After). En cas d'erreur base, le lot
+est réessayé avec un délai croissant ; la file se remplit et le refus protège le processus.
+
+Une mesure que la base refuse (valeur hors bornes, contrainte violée : DataError ou
+IntegrityError hors clé étrangère) ferait échouer son lot à chaque essai : le lot est alors
+réécrit par moitiés (savepoints) jusqu'à isoler les mesures fautives, qui partent dans le
+fichier WRITE_BEHIND_DEAD_LETTER (une ligne JSON par mesure, avec l'erreur) au lieu d'être
+réessayées ; le checkpoint avance au-delà. Une mesure du spool devenue invalide au
+rejeu y part aussi.
+
+Spool : chaque mesure acceptée est d'abord ajoutée (et synchronisée sur disque si
+WRITE_BEHIND_FSYNC) à un journal local par segments dans WRITE_BEHIND_SPOOL_DIR, avec un
+numéro croissant. Chaque lot enregistre son dernier numéro dans write_behind_checkpoint
+dans sa transaction ; au démarrage, les mesures du spool au-delà de ce numéro sont
+rejouées, sans doublon. Chaque processus verrouille son propre sous-répertoire (slot-N),
+repris au redémarrage ; le checkpoint est identifié par WRITE_BEHIND_INSTANCE_ID (défaut :
+nom d'hôte) et le chemin du slot. WRITE_BEHIND_SPOOL_DIR vide désactive le spool (perte possible des
+mesures en file en cas d'arrêt brutal).
+
+À l'arrêt, la file est vidée pendant au plus WRITE_BEHIND_SHUTDOWN_SECONDS ; ce qui reste
+est rejoué au démarrage suivant depuis le spool.
+"""
+import fcntl
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+import orjson
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from app import models
+from app.schemas import mesure as sch
+from app.services import ingestion
+from app.services.metrics import registry
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "10000"))
+WRITE_BEHIND_BATCH_ROWS = int(os.getenv("WRITE_BEHIND_BATCH_ROWS", "500"))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "100"))
+WRITE_BEHIND_SPOOL_DIR = os.getenv("WRITE_BEHIND_SPOOL_DIR", "spool/write_behind")
+WRITE_BEHIND_FSYNC = os.getenv("WRITE_BEHIND_FSYNC", "true").lower() in ("1", "true", "yes")
+WRITE_BEHIND_SHUTDOWN_SECONDS = float(os.getenv("WRITE_BEHIND_SHUTDOWN_SECONDS", "30"))
+# identité de l'instance dans write_behind_checkpoint (défaut : nom d'hôte), unique par machine/conteneur
+WRITE_BEHIND_INSTANCE_ID = os.getenv("WRITE_BEHIND_INSTANCE_ID") or socket.gethostname()
+WRITE_BEHIND_DEAD_LETTER = os.getenv("WRITE_BEHIND_DEAD_LETTER", "spool/write_behind_dead_letter.jsonl")
+
+SEGMENT_ROWS = 10000
+MAX_RETRY_SECONDS = 30
+FOREIGN_KEY_VIOLATION = "23503"
+
+DEPTH = registry.gauge("write_behind_queue_depth", "Mesures accepted and not yet committed")
+OLDEST_AGE = registry.gauge("write_behind_oldest_seconds", "Age of the oldest queued mesure")
+ACCEPTED = registry.counter("write_behind_accepted_total", "Mesures accepted into the write-behind queue")
+REJECTED = registry.counter("write_behind_rejected_total", "Mesures rejected because the write-behind queue was full")
+FLUSHED = registry.counter("write_behind_flushed_total", "Mesures committed by the write-behind worker")
+DROPPED = registry.counter("write_behind_dropped_total", "Queued mesures dropped at flush time")
+FLUSH_ERRORS = registry.counter("write_behind_flush_errors_total", "Failed write-behind batch commits (retried)")
+FLUSH_SECONDS = registry.histogram("write_behind_flush_seconds", "Write-behind batch insert + commit time")
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _spool_default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _rejected(exc) -> bool:
+    """Erreur due aux données du lot, qu'un nouvel essai reproduirait à l'identique."""
+    if isinstance(exc, DataError):
+        return True
+    # clé étrangère : capteur supprimé entre la vérification et l'insert, écarté au prochain essai
+    return isinstance(exc, IntegrityError) and getattr(exc.orig, "pgcode", None) != FOREIGN_KEY_VIOLATION
+
+
+def dead_letter(records, path: str = WRITE_BEHIND_DEAD_LETTER):
+    """Écarte des mesures (numéro de spool, mesure, erreur) : fichier de rebut, compteur et log."""
+    if not records:
+        return
+    DROPPED.inc(len(records), reason="invalid")
+    logger.error("dropped %d invalid mesure(s) to %s: %s", len(records), path or "the log", records[0][2])
+    if not path:
+        for seq, row, error in records:
+            logger.error("invalid mesure (seq %s, %s): %r", seq, error, row)
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    now = time.time()
+    with open(path, "ab") as f:
+        f.write(b"".join(
+            orjson.dumps({"at": now, "seq": seq, "error": error, "row": row}, default=_spool_default) + b"\n"
+            for seq, row, error in records
+        ))
+        f.flush()
+        if WRITE_BEHIND_FSYNC:
+            os.fsync(f.fileno())
+
+
+class Spool:
+    """Journal local des mesures acceptées, en segments numérotés, dans un slot verrouillé par ce processus."""
+
+    def __init__(self, root: str, fsync: bool = WRITE_BEHIND_FSYNC, segment_rows: int = SEGMENT_ROWS,
+                 instance_id: str = WRITE_BEHIND_INSTANCE_ID):
+        self.fsync = fsync
+        self.segment_rows = segment_rows
+        os.makedirs(root, exist_ok=True)
+        slot = 0
+        while True:
+            path = os.path.join(root, f"slot-{slot}")
+            os.makedirs(path, exist_ok=True)
+            lock = open(os.path.join(path, "lock"), "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                lock.close()
+                slot += 1
+        self._lock_file = lock  # verrou tenu pendant toute la vie du processus
+        self.path = path
+        # un même chemin existe sur chaque hôte : la clé du checkpoint inclut l'instance
+        self.key = f"{instance_id}:{os.path.abspath(path)}"
+        self._closed = []  # [(chemin, dernier numéro)] des segments terminés
+        self._file = None
+        self._count = 0
+        self._next = 1
+
+    def _segments(self):
+        names = sorted(n for n in os.listdir(self.path) if n.startswith("segment-") and n.endswith(".jsonl"))
+        return [os.path.join(self.path, n) for n in names]
+
+    def load(self, committed: int):
+        """Mesures (numéro, dict) au-delà de `committed` ; les segments entièrement commités sont supprimés."""
+        records = []
+        invalid = []
+        last = committed
+        for path in self._segments():
+            seg_last = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        rec = orjson.loads(line)
+                    except orjson.JSONDecodeError:  # dernière ligne tronquée par un arrêt brutal
+                        continue
+                    seg_last = max(seg_last, rec["seq"])
+                    if rec["seq"] > committed:
+                        try:
+                            records.append((rec["seq"], sch.MesureCreate.model_validate(rec["row"]).dict()))
+                        except ValidationError as e:
+                            invalid.append((rec["seq"], rec["row"], str(e)))
+            last = max(last, seg_last)
+            if seg_last <= committed:
+                os.remove(path)
+            else:
+                self._closed.append((path, seg_last))
+        dead_letter(invalid)
+        self._next = last + 1
+        self._open_segment()
+        return records
+
+    def _open_segment(self):
+        self._file = open(os.path.join(self.path, f"segment-{self._next:020d}.jsonl"), "ab")
+        self._count = 0
+
+    def append(self, rows) -> int:
+        """Ajoute les mesures au journal ; retourne le numéro de la première."""
+        first = self._next
+        self._file.write(b"".join(
+            orjson.dumps({"seq": first + i, "row": r}, default=_spool_default) + b"\n" for i, r in enumerate(rows)
+        ))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._next += len(rows)
+        self._count += len(rows)
+        if self._count >= self.segment_rows:
+            self._closed.append((self._file.name, self._next - 1))
+            self._file.close()
+            self._open_segment()
+        return first
+
+    def release(self, committed: int):
+        """Supprime les segments terminés dont toutes les mesures sont commitées."""
+        keep = []
+        for path, last in self._closed:
+            if last <= committed:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            else:
+                keep.append((path, last))
+        self._closed = keep
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._lock_file.close()
+
+
+class WriteBehindQueue:
+    def __init__(self, max_rows: int = WRITE_BEHIND_MAX_ROWS, batch_rows: int = WRITE_BEHIND_BATCH_ROWS,
+                 flush_seconds: float = WRITE_BEHIND_FLUSH_MS / 1000, spool_dir: str = WRITE_BEHIND_SPOOL_DIR):
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.spool_dir = spool_dir
+        self.spool = None
+        self.on_commit = None
+        self._items = deque()  # (numéro de spool, mesure, instant d'acceptation)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._stopping = False
+        self._deadline = None
+        self._thread = None
+
+    def depth(self) -> int:
+        return len(self._items) + self._in_flight
+
+    def oldest_age(self) -> float:
+        try:
+            return time.monotonic() - self._items[0][2]
+        except IndexError:
+            return 0.0
+
+    def start(self, on_commit=None):
+        """Ouvre le spool, rejoue les mesures non commitées et démarre le thread d'écriture."""
+        if self._running:
+            return
+        self.on_commit = on_commit
+        if self.spool_dir:
+            from app.database import SessionLocal
+
+            self.spool = Spool(self.spool_dir)
+            db = SessionLocal()
+            try:
+                committed = db.query(models.WriteBehindCheckpoint.last_seq).filter(
+                    models.WriteBehindCheckpoint.spool == self.spool.key
+                ).scalar() or 0
+            finally:
+                db.close()
+            now = time.monotonic()
+            pending = self.spool.load(committed)
+            self._items.extend((seq, row, now) for seq, row in pending)
+            if pending:
+                logger.info("replaying %d spooled mesure(s) from %s", len(pending), self.spool.path)
+        self._running = True
+        self._stopping = False
+        self._deadline = None
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows) -> int:
+        """Accepte des mesures (dicts validés) ; QueueFull si la file est pleine. Retourne la profondeur."""
+        with self._cond:
+            if not self._running or self._stopping:
+                raise RuntimeError("write-behind queue is not running")
+            if self.depth() + len(rows) > self.max_rows:
+                REJECTED.inc(len(rows))
+                raise QueueFull(f"write-behind queue is full ({self.max_rows} mesures)")
+            first = self.spool.append(rows) if self.spool is not None else None
+            now = time.monotonic()
+            self._items.extend((first + i if first is not None else None, r, now) for i, r in enumerate(rows))
+            ACCEPTED.inc(len(rows))
+            if len(self._items) >= self.batch_rows or len(self._items) == len(rows):
+                self._cond.notify()
+            return self.depth()
+
+    def _take(self):
+        with self._cond:
+            while True:
+                if self._items:
+                    wait = self.flush_seconds - (time.monotonic() - self._items[0][2])
+                    if len(self._items) >= self.batch_rows or self._stopping or wait <= 0:
+                        break
+                elif self._stopping:
+                    return None
+                else:
+                    wait = None
+                self._cond.wait(wait)
+            batch = [self._items.popleft() for _ in range(min(self.batch_rows, len(self._items)))]
+            self._in_flight = len(batch)
+            return batch
+
+    def _insert_isolating(self, db, rows):
+        """Insère par moitiés sous savepoint ; renvoie (mesures écrites, [(mesure, erreur)] refusées)."""
+        try:
+            with db.begin_nested():
+                ingestion.insert_mesures(db, rows)
+            return rows, []
+        except (DataError, IntegrityError) as e:
+            if not _rejected(e):
+                raise
+            if len(rows) == 1:
+                return [], [(rows[0], str(e.orig).strip())]
+            mid = len(rows) // 2
+            kept_a, bad_a = self._insert_isolating(db, rows[:mid])
+            kept_b, bad_b = self._insert_isolating(db, rows[mid:])
+            return kept_a + kept_b, bad_a + bad_b
+
+    def _write(self, batch, isolate: bool):
+        """Écrit un lot et son checkpoint en une transaction ; renvoie (écrites, arrondissements, refusées)."""
+        from app.database import SessionLocal
+
+        rows = [row for _, row, _ in batch]
+        last_seq = batch[-1][0]
+        db = SessionLocal()
+        try:
+            # un capteur supprimé depuis l'acceptation : ses mesures sont écartées
+            known = ingestion.capteur_arrondissements(db, {r["uuid_capteur"] for r in rows})
+            kept = [r for r in rows if r["uuid_capteur"] in known]
+            rejected = []
+            if isolate:
+                kept, rejected = self._insert_isolating(db, kept)
+                seqs = {id(row): seq for seq, row, _ in batch}
+                dead_letter([(seqs[id(row)], row, error) for row, error in rejected])
+            else:
+                ingestion.insert_mesures(db, kept)
+            if last_seq is not None:
+                stmt = insert(models.WriteBehindCheckpoint).values(spool=self.spool.key, last_seq=last_seq)
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=["spool"], set_={"last_seq": stmt.excluded.last_seq, "updated_at": stmt.excluded.updated_at}
+                ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return kept, known, rejected
+
+    def _flush(self, batch) -> bool:
+        rows = [row for _, row, _ in batch]
+        last_seq = batch[-1][0]
+        started = time.perf_counter()
+        try:
+            try:
+                kept, known, rejected = self._write(batch, isolate=False)
+            except (DataError, IntegrityError) as e:
+                if not _rejected(e):
+                    raise
+                logger.warning("write-behind batch of %d mesure(s) refused by the database (%s); isolating invalid mesures",
+                               len(rows), str(e.orig).strip())
+                kept, known, rejected = self._write(batch, isolate=True)
+        except Exception:
+            FLUSH_ERRORS.inc()
+            logger.exception("write-behind flush of %d mesure(s) failed; retrying", len(rows))
+            return False
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        FLUSHED.inc(len(kept))
+        unknown = len(rows) - len(kept) - len(rejected)
+        if unknown:
+            DROPPED.inc(unknown, reason="unknown_capteur")
+            logger.warning("dropped %d queued mesure(s) for deleted capteurs", unknown)
+        if self.on_commit is not None and kept:
+            try:
+                self.on_commit(kept, known)
+            except Exception:
+                logger.exception("write-behind post-commit hook failed")
+        if last_seq is not None:
+            self.spool.release(last_seq)
+        return True
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            delay = 0.5
+            while not self._flush(batch):
+                if self._deadline is not None and time.monotonic() >= self._deadline:
+                    logger.error("write-behind stopped with %d mesure(s) unwritten (kept in the spool)", self.depth())
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_SECONDS)
+            with self._cond:
+                self._in_flight = 0
+
+    def stop(self, timeout: float = WRITE_BEHIND_SHUTDOWN_SECONDS):
+        """Refuse les nouvelles mesures et vide la file (au plus `timeout` secondes)."""
+        if not self._running:
+            return
+        with self._cond:
+            self._stopping = True
+            self._deadline = time.monotonic() + timeout
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._running = False
+        if self._thread.is_alive():
+            logger.error("write-behind shutdown timed out with %d mesure(s) pending (kept in the spool)", self.depth())
+        elif self.spool is not None:
+            self.spool.close()
+            self.spool = None
+
+
+writer = WriteBehindQueue()
+DEPTH.set_function(writer.depth)
+OLDEST_AGE.set_function(writer.oldest_age)
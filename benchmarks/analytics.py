@@ -0,0 +1,140 @@
+"""
+Micro-benchmarks des helpers analytics et des chemins chauds, en processus, sur la base
+DATABASE_URL (jeu de données : python -m benchmarks.datagen).
+
+Chaque helper est appelé directement (sans cache analytics ni HTTP) après un appel
+d'échauffement ; le résultat donne min, médiane et p95 en millisecondes. Les écritures
+(insert_mesures) s'exécutent dans une transaction annulée.
+
+--save enregistre les résultats en JSON ; --compare relit un fichier précédent et signale
+les helpers dont la médiane dépasse la référence de plus de --threshold (code de sortie 1),
+pour détecter une régression entre deux versions sur le même jeu de données.
+
+    python -m benchmarks.analytics --repeat 20 --save bench.json
+    python -m benchmarks.analytics --compare bench.json --threshold 0.2
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from benchmarks.loadgen import percentile
+
+
+def _insert_mesures(db, rows):
+    from app.services import ingestion
+
+    try:
+        ingestion.insert_mesures(db, rows)
+    finally:
+        db.rollback()
+
+
+def cases(db, pollutant: str):
+    """(nom, fonction sans argument) pour chaque chemin mesuré."""
+    from app import models
+    from app.routers import analytics
+    from app.services import heatmap, spatial
+
+    caps = [r[0] for r in db.query(models.Capteur.uuid_capteur).limit(1000).all()]
+    center = db.query(models.Capteur.latitude, models.Capteur.longitude).first()
+    lat, lon = (float(center[0]), float(center[1])) if center else (48.86, 2.35)
+    tile_x, tile_y = heatmap._tile_xy(13, lat, lon)
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"uuid_capteur": random.choice(caps), "ts": now, "pollutant": pollutant, "valeur": random.uniform(5, 80), "unite": "ug/m3"}
+        for _ in range(1000)
+    ] if caps else []
+
+    def heatmap_tile():
+        _, lats, lons, values = heatmap.sensor_points(db, pollutant, 24)
+        return heatmap.encode_png(heatmap.colorize(heatmap.idw_grid(lats, lons, values, 13, tile_x, tile_y), 0, 100))
+
+    return [
+        ("pollution_24h", lambda: analytics._pollution_24h(db, pollutant=pollutant)),
+        ("pollution_window[168h]", lambda: analytics._pollution_window(db, pollutant=pollutant, hours=168)),
+        ("pollution_hourly[24h]", lambda: analytics._pollution_hourly(db, pollutant=pollutant, hours=24)),
+        ("availability_by_arrondissement", lambda: analytics._availability_by_arrondissement(db)),
+        ("citizens_most_engaged", lambda: analytics._citizens_most_engaged(db)),
+        ("predictive_this_month", lambda: analytics._predictive_this_month(db)),
+        ("top_trajets", lambda: analytics._top_trajets(db)),
+        ("heatmap_tile[z13]", heatmap_tile),
+        ("spatial.db_nearest[k=10]", lambda: spatial.db_nearest(db, lat, lon, 10)),
+        ("insert_mesures[1000]", lambda: _insert_mesures(db, rows)),
+    ]
+
+
+def run(fn, repeat: int):
+    fn()  # échauffement (plans, caches PostgreSQL)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return {
+        "min_ms": round(times[0], 3),
+        "median_ms": round(statistics.median(times), 3),
+        "p95_ms": round(percentile(times, 95), 3),
+        "repeat": repeat,
+    }
+
+
+def compare(results, baseline, threshold: float):
+    """Helpers dont la médiane dépasse celle de la référence de plus de `threshold` (ratio)."""
+    regressions = []
+    for name, r in results.items():
+        ref = baseline.get(name)
+        if ref and ref["median_ms"] > 0:
+            ratio = r["median_ms"] / ref["median_ms"]
+            r["vs_baseline"] = round(ratio, 2)
+            if ratio > 1 + threshold:
+                regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks des helpers analytics")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--pollutant", default="PM2.5")
+    parser.add_argument("--only", action="append", help="ne lancer que les cas dont le nom commence ainsi (répétable)")
+    parser.add_argument("--save", help="fichier JSON de résultats")
+    parser.add_argument("--compare", help="fichier JSON de référence")
+    parser.add_argument("--threshold", type=float, default=0.2, help="régression tolérée sur la médiane (0.2 = +20 %%)")
+    args = parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    random.seed(0)
+    results = {}
+    db = SessionLocal()
+    try:
+        for name, fn in cases(db, args.pollutant):
+            if args.only and not any(name.startswith(o) for o in args.only):
+                continue
+            results[name] = run(fn, args.repeat)
+            db.rollback()  # pas de transaction ouverte entre deux cas
+            print(json.dumps({"case": name, **results[name]}), flush=True)
+    finally:
+        db.close()
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    print()
+    print(f"{'case':34} {'min ms':>9} {'median ms':>10} {'p95 ms':>9} {'vs ref':>7}")
+    for name, r in results.items():
+        print(f"{name:34} {r['min_ms']:>9} {r['median_ms']:>10} {r['p95_ms']:>9} {r.get('vs_baseline', ''):>7}")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(f"\nregressions (> +{args.threshold:.0%} median): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Charge HTTP concurrente sur les endpoints chauds : débit (req/s) et latences p50/p95/p99
+par scénario et par niveau de concurrence.
+
+Vise un serveur existant (--url) ou lance un serveur uvicorn (--spawn, 1 worker, sur la
+base DATABASE_URL), avec le cache analytics désactivé par défaut pour que chaque
+requête atteigne PostgreSQL (--cache pour le laisser actif). Les scénarios d'ingestion
+tirent des capteurs existants (GET /capteurs/within) et envoient des corps tous différents.
+
+    python -m benchmarks.api --spawn -c 10 50 200 -d 10
+    python -m benchmarks.api --url http://127.0.0.1:8000 --scenario analytics -c 50 --save api.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from benchmarks.async_mode import _wait_ready
+from benchmarks.loadgen import Request, run_load
+
+# variantes distinctes envoyées en boucle par scénario d'ingestion
+POST_BODIES = 500
+
+
+def _capteurs(url: str, limit: int = 1000):
+    # CapteurOut n'expose pas l'uuid : passer par la recherche spatiale (capteurs géolocalisés)
+    with urllib.request.urlopen(f"{url}/capteurs/within?min_lat=-90&min_lon=-180&max_lat=90&max_lon=180&limit={limit}", timeout=30) as r:
+        return [c["uuid_capteur"] for c in json.loads(r.read())]
+
+
+def _mesure(uuid: str, ts: datetime):
+    return {"uuid_capteur": uuid, "ts": ts.isoformat(), "pollutant": "PM2.5", "valeur": round(random.uniform(5, 80), 3), "unite": "ug/m3"}
+
+
+def scenarios(capteurs):
+    """Scénarios nommés "groupe:nom" ; les groupes servent au filtre --scenario."""
+    out = {
+        "analytics:pollution_24h": [Request("GET", "/analytics/pollution_24h")],
+        "analytics:pollution_window_168h": [Request("GET", "/analytics/pollution_window?hours=168")],
+        "analytics:availability_by_arrondissement": [Request("GET", "/analytics/availability_by_arrondissement")],
+        "analytics:top_trajets": [Request("GET", "/analytics/top_trajets")],
+        "read:mesures_page": [Request("GET", "/mesures/?limit=100")],
+    }
+    if capteurs:
+        now = datetime.now(timezone.utc)
+        out["read:mesures_capteur"] = [Request("GET", f"/mesures/?uuid_capteur={u}&limit=100") for u in capteurs[:POST_BODIES]]
+        out["ingest:post_mesure"] = [
+            Request("POST", "/mesures/", json.dumps(_mesure(random.choice(capteurs), now - timedelta(seconds=i))).encode())
+            for i in range(POST_BODIES)
+        ]
+        out["ingest:post_batch_100"] = [
+            Request("POST", "/mesures/batch", json.dumps([_mesure(random.choice(capteurs), now - timedelta(seconds=i)) for _ in range(100)]).encode())
+            for i in range(POST_BODIES // 10)
+        ]
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Charge HTTP concurrente (p50/p95/p99, req/s)")
+    parser.add_argument("--url", default=None, help="serveur existant (sinon --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="lancer uvicorn main:app localement")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--cache", action="store_true", help="garder le cache analytics actif (avec --spawn)")
+    parser.add_argument("--scenario", action="append", help="groupe ou nom de scénario (répétable), ex. analytics, ingest:post_mesure")
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("-d", "--duration", type=float, default=10.0)
+    parser.add_argument("--save", help="fichier JSON de résultats")
+    args = parser.parse_args(argv)
+    if not args.url and not args.spawn:
+        parser.error("--url or --spawn is required")
+
+    random.seed(0)
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    server = None
+    if args.spawn:
+        env = dict(os.environ, ANALYTICS_CACHE_ENABLED="true" if args.cache else "false")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env,
+        )
+    results = []
+    try:
+        _wait_ready(url)
+        for name, reqs in scenarios(_capteurs(url)).items():
+            if args.scenario and not any(name == s or name.split(":")[0] == s for s in args.scenario):
+                continue
+            for c in args.concurrency:
+                stats = asyncio.run(run_load(url, reqs, concurrency=c, duration=args.duration))
+                results.append({"scenario": name, **stats})
+                print(json.dumps(results[-1]), flush=True)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print()
+    print(f"{'scenario':42} {'conc':>5} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for r in results:
+        errors = sum(n for s, n in r["statuses"].items() if int(s) >= 400) + r["connection_errors"]
+        print(f"{r['scenario']:42} {r['concurrency']:>5} {r['rps']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {errors:>7}")
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
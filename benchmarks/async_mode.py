@@ -0,0 +1,88 @@
+"""
+Compare le débit du mode synchrone et du mode async (DB_ASYNC=1) à forte concurrence.
+
+Lance successivement un serveur uvicorn (1 worker) dans chaque mode sur la base
+DATABASE_URL, puis mesure req/s et latences sur les mêmes requêtes.
+Le cache analytics est désactivé pour que chaque requête atteigne PostgreSQL.
+
+    python -m benchmarks.async_mode --capteur <uuid> -c 50 200 -d 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+from benchmarks.loadgen import Request, run_load
+
+
+def _wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url + "/", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+def _scenarios(capteur: str):
+    out = {
+        "GET /mesures/?limit=100": [Request("GET", "/mesures/?limit=100")],
+        "GET /analytics/pollution_24h": [Request("GET", "/analytics/pollution_24h")],
+    }
+    if capteur:
+        body = json.dumps({
+            "uuid_capteur": capteur,
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "pollutant": "PM2.5",
+            "valeur": 12.5,
+            "unite": "ug/m3",
+        }).encode()
+        out["POST /mesures/"] = [Request("POST", "/mesures/", body)]
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async")
+    parser.add_argument("--capteur", help="uuid d'un capteur existant, pour le scénario d'ingestion")
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("-d", "--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    url = f"http://127.0.0.1:{args.port}"
+    results = []
+    for mode in ("sync", "async"):
+        env = dict(os.environ, DB_ASYNC="1" if mode == "async" else "0", ANALYTICS_CACHE_ENABLED="false")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            _wait_ready(url)
+            for name, reqs in _scenarios(args.capteur).items():
+                for c in args.concurrency:
+                    stats = asyncio.run(run_load(url, reqs, concurrency=c, duration=args.duration))
+                    results.append({"mode": mode, "scenario": name, **stats})
+                    print(json.dumps(results[-1]), flush=True)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print()
+    print(f"{'scenario':32} {'conc':>5} {'sync rps':>10} {'async rps':>10} {'sync p99':>9} {'async p99':>9}")
+    by_key = {(r["mode"], r["scenario"], r["concurrency"]): r for r in results}
+    for (mode, name, c), r in by_key.items():
+        if mode != "sync":
+            continue
+        a = by_key.get(("async", name, c), {})
+        print(f"{name:32} {c:>5} {r['rps']:>10} {a.get('rps', '-'):>10} {r['p99_ms']:>9} {a.get('p99_ms', '-'):>9}")
+
+
+if __name__ == "__main__":
+    main()
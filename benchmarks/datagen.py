@@ -0,0 +1,195 @@
+"""
+Générateur de données synthétiques pour les benchmarks (PostgreSQL, DATABASE_URL).
+
+Les lignes sont produites côté serveur (INSERT ... SELECT generate_series), sans transfert
+client (de l'ordre de 30 000 mesures/s, plus du double avec --defer-indexes). Les mesures sont
+insérées par tranches de --chunk lignes (un commit par tranche) et réparties sur les
+--days derniers jours, pour que les fenêtres analytics (24h, 7 jours) trouvent des données.
+Le jeu est reproductible pour une même --seed (setseed, uuid dérivés de la graine).
+
+À la fin, les rollups horaires et la projection de statut courant sont reconstruits, puis
+les tables sont analysées.
+
+    python -m benchmarks.datagen --reset --mesures 1e6 --capteurs 1000
+    python -m benchmarks.datagen --reset --mesures 1e8 --capteurs 20000 --defer-indexes
+"""
+import argparse
+import logging
+import time
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+POLLUTANTS = ("PM2.5", "PM10", "NO2", "O3")
+# emprise des capteurs (lat, lon) : une ville d'environ 12 x 12 km
+BBOX = (48.81, 2.25, 48.91, 2.42)
+TABLES = (
+    "participer_a", "consultation", "realiser", "intervention", "technicien", "trajet", "vehicule",
+    "citoyen", "capteur_current_status", "capteur_status_history", "mesure_hourly", "mesure",
+    "capteur", "proprietaire", "arrondissement",
+)
+
+
+def _count(value: str) -> int:
+    """Accepte 1000000 ou 1e6."""
+    return int(float(value))
+
+
+def _timed(conn, label: str, sql: str, **params):
+    started = time.monotonic()
+    n = conn.execute(text(sql), params).rowcount
+    logger.info("%s: %d rows in %.1fs", label, n, time.monotonic() - started)
+    return n
+
+
+def generate_reference(conn, args):
+    """Arrondissements, propriétaires, capteurs, historique de statut, interventions, citoyens, trajets."""
+    min_lat, min_lon, max_lat, max_lon = BBOX
+    _timed(conn, "arrondissement", """
+        INSERT INTO arrondissement (id_arrondissement, nom)
+        SELECT g, 'Arrondissement ' || g FROM generate_series(1, :n) g
+    """, n=args.arrondissements)
+    _timed(conn, "proprietaire", """
+        INSERT INTO proprietaire (nom, email, type_proprietaire)
+        SELECT 'Propriétaire ' || g, 'proprietaire' || g || '@example.org', (ARRAY['municipal', 'prive'])[1 + g % 2]
+        FROM generate_series(1, 50) g
+    """)
+    # capteurs proches de leur arrondissement : bandes de longitude par arrondissement
+    _timed(conn, "capteur", """
+        INSERT INTO capteur (uuid_capteur, type_capteur, latitude, longitude, statut, date_installation, id_proprietaire, id_arrondissement)
+        SELECT md5(:seed || '-capteur-' || g)::uuid, 'air',
+               round((:min_lat + random() * (:max_lat - :min_lat))::numeric, 6),
+               round((:min_lon + (((g - 1) % :n_arr) + random()) / :n_arr * (:max_lon - :min_lon))::numeric, 6),
+               (CASE WHEN random() < 0.85 THEN 'active' WHEN random() < 0.5 THEN 'maintenance' ELSE 'failed' END)::capteurstatusenum,
+               now() - random() * interval '1000 days',
+               (SELECT min(id_proprietaire) FROM proprietaire) + g % 50,
+               1 + (g - 1) % :n_arr
+        FROM generate_series(1, :n) g
+    """, seed=str(args.seed), n=args.capteurs, n_arr=args.arrondissements,
+        min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon)
+    _timed(conn, "capteur_status_history", """
+        INSERT INTO capteur_status_history (uuid_capteur, status, ts)
+        SELECT c.uuid_capteur,
+               (CASE WHEN random() < 0.7 THEN 'active' WHEN random() < 0.5 THEN 'maintenance' ELSE 'out_of_service' END)::capteurstatusenum,
+               now() - random() * interval '365 days'
+        FROM capteur c CROSS JOIN generate_series(1, :k)
+    """, k=args.status_per_capteur)
+    _timed(conn, "technicien", """
+        INSERT INTO technicien (nom, certification) SELECT 'Technicien ' || g, 'niveau ' || (1 + g % 3) FROM generate_series(1, 100) g
+    """)
+    _timed(conn, "intervention", """
+        INSERT INTO intervention (date_heure, nature, duree_minutes, cout, impact_co2, ia_valide, uuid_capteur)
+        SELECT now() - random() * interval '180 days',
+               (ARRAY['predictive', 'corrective', 'curative'])[1 + floor(random() * 3)::int]::interventionnatureenum,
+               15 + floor(random() * 240)::int, round((50 + random() * 950)::numeric, 2), round((random() * 20)::numeric, 4),
+               random() < 0.5, c.uuid_capteur
+        FROM generate_series(1, :n) g
+        JOIN (SELECT uuid_capteur, row_number() OVER (ORDER BY uuid_capteur) AS rn FROM capteur) c ON c.rn = 1 + g % :n_cap
+    """, n=args.interventions, n_cap=args.capteurs)
+    _timed(conn, "realiser", """
+        INSERT INTO realiser (id_intervention, id_technicien, role)
+        SELECT i.id_intervention, t.min_id + i.id_intervention % 100, 'responsable'
+        FROM intervention i CROSS JOIN (SELECT min(id_technicien) AS min_id FROM technicien) t
+    """)
+    _timed(conn, "citoyen", """
+        INSERT INTO citoyen (nom, email, score_engagement)
+        SELECT 'Citoyen ' || g, 'citoyen' || g || '@example.org', round((random() * 1000)::numeric, 2)
+        FROM generate_series(1, :n) g
+    """, n=args.citoyens)
+    _timed(conn, "vehicule", """
+        INSERT INTO vehicule (plaque, type_vehicule, energie)
+        SELECT 'BX-' || lpad(g::text, 6, '0'), (ARRAY['bus', 'tram', 'velo', 'voiture'])[1 + g % 4], (ARRAY['electrique', 'hybride', 'diesel'])[1 + g % 3]
+        FROM generate_series(1, 1000) g
+    """)
+    _timed(conn, "trajet", """
+        INSERT INTO trajet (origine, destination, distance_km, duree_minutes, co2_economie, date_heure, plaque)
+        SELECT 'Arrondissement ' || (1 + g % :n_arr), 'Arrondissement ' || (1 + (g * 7) % :n_arr),
+               round((1 + random() * 30)::numeric, 3), 5 + floor(random() * 90)::int, round((random() * 15)::numeric, 4),
+               now() - random() * interval '365 days', 'BX-' || lpad((1 + g % 1000)::text, 6, '0')
+        FROM generate_series(1, :n) g
+    """, n=args.trajets, n_arr=args.arrondissements)
+
+
+def generate_mesures(engine, args):
+    """Mesures par tranches : capteur tiré en rotation, niveau de base propre à chaque arrondissement."""
+    total = args.mesures
+    started = time.monotonic()
+    done = 0
+    with engine.connect() as conn:
+        conn.execute(text("SELECT setseed(:s)"), {"s": (args.seed % 1000) / 1000.0 + 0.0001})
+        conn.execute(text(
+            "CREATE TEMP TABLE bench_caps AS "
+            "SELECT row_number() OVER (ORDER BY uuid_capteur) - 1 AS rn, uuid_capteur, id_arrondissement FROM capteur"
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX ON bench_caps (rn)"))
+        conn.commit()
+        for start in range(0, total, args.chunk):
+            end = min(total, start + args.chunk)
+            conn.execute(text("""
+                INSERT INTO mesure (uuid_capteur, ts, pollutant, valeur, unite)
+                SELECT c.uuid_capteur, now() - random() * (:days * interval '1 day'),
+                       p.pollutants[1 + g % array_length(p.pollutants, 1)],
+                       round((5 + (c.id_arrondissement % 7) * 4 + random() * 40)::numeric, 3), 'ug/m3'
+                FROM generate_series(:start, :end - 1) g
+                CROSS JOIN (SELECT CAST(:pollutants AS text[]) AS pollutants) p
+                JOIN bench_caps c ON c.rn = g % :n_cap
+            """), {"start": start, "end": end, "days": args.days, "pollutants": list(POLLUTANTS), "n_cap": args.capteurs})
+            conn.commit()
+            done = end
+            elapsed = time.monotonic() - started
+            logger.info("mesure: %d / %d rows, %.0f rows/s", done, total, done / elapsed if elapsed else 0)
+
+
+def reset(conn):
+    conn.execute(text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jeu de données synthétique pour les benchmarks")
+    parser.add_argument("--mesures", type=_count, default=100_000, help="nombre de mesures (ex. 1e5 à 1e8)")
+    parser.add_argument("--capteurs", type=_count, default=1000)
+    parser.add_argument("--arrondissements", type=int, default=20)
+    parser.add_argument("--status-per-capteur", type=int, default=5)
+    parser.add_argument("--interventions", type=_count, default=10_000)
+    parser.add_argument("--citoyens", type=_count, default=10_000)
+    parser.add_argument("--trajets", type=_count, default=100_000)
+    parser.add_argument("--days", type=float, default=30, help="étendue des mesures (jours avant maintenant)")
+    parser.add_argument("--chunk", type=_count, default=1_000_000, help="mesures par transaction")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="vider les tables avant génération (TRUNCATE)")
+    parser.add_argument("--defer-indexes", action="store_true", help="supprimer les index de mesure pendant la génération")
+    args = parser.parse_args(argv)
+
+    from app import models
+    from app.database import SessionLocal, engine
+    from app.services import bulk_load, rollup, status
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as conn:
+        if args.reset:
+            reset(conn)
+        elif conn.execute(text("SELECT EXISTS (SELECT 1 FROM capteur)")).scalar():
+            raise SystemExit("capteur is not empty: use --reset to replace the existing data")
+        conn.execute(text("SELECT setseed(:s)"), {"s": (args.seed % 1000) / 1000.0})
+        generate_reference(conn, args)
+
+    table = models.Mesure.__table__
+    if args.defer_indexes:
+        bulk_load.drop_indexes(engine, bulk_load.deferrable_indexes(engine, table))
+    generate_mesures(engine, args)
+    bulk_load.create_missing_indexes(engine, table)
+
+    db = SessionLocal()
+    try:
+        started = time.monotonic()
+        rollup.rebuild(db)
+        status.rebuild_current_status(db)
+        logger.info("rebuilt rollups and current status in %.1fs", time.monotonic() - started)
+    finally:
+        db.close()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Générateur de charge HTTP minimal (asyncio, HTTP/1.1 keep-alive, sans dépendance).
+
+Chaque connexion rejoue en boucle la liste de requêtes jusqu'à la fin de la durée ;
+le résultat donne le débit (req/s) et les latences p50/p95/p99.
+
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --path /analytics/pollution_24h -c 200 -d 15
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+
+class Request:
+    def __init__(self, method: str, path: str, body: bytes = b"", content_type: str = "application/json"):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.content_type = content_type
+
+    def encode(self, host: str) -> bytes:
+        head = f"{self.method} {self.path} HTTP/1.1\r\nHost: {host}\r\n"
+        if self.body:
+            head += f"Content-Type: {self.content_type}\r\nContent-Length: {len(self.body)}\r\n"
+        return (head + "\r\n").encode() + self.body
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    length = None
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+def percentile(sorted_values, p: float):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+async def _worker(host, port, payloads, deadline, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            payload = payloads[i % len(payloads)]
+            i += 1
+            t0 = time.perf_counter()
+            writer.write(payload)
+            await writer.drain()
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - t0)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(base_url: str, requests, concurrency: int = 50, duration: float = 10.0):
+    """Lance `concurrency` connexions pendant `duration` secondes ; retourne un dict de statistiques."""
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    payloads = [r.encode(f"{host}:{port}") for r in requests]
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+    t0 = time.perf_counter()
+    results = await asyncio.gather(
+        *[_worker(host, port, payloads, deadline, latencies, statuses) for _ in range(concurrency)],
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "statuses": statuses,
+        "connection_errors": sum(1 for r in results if isinstance(r, Exception)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Générateur de charge HTTP")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", action="append", required=True, help="chemin GET (répétable)")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-d", "--duration", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    reqs = [Request("GET", p) for p in args.path]
+    print(json.dumps(asyncio.run(run_load(args.url, reqs, args.concurrency, args.duration))))
+
+
+if __name__ == "__main__":
+    main()
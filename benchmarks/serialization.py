@@ -0,0 +1,124 @@
+"""
+Compare le chemin de lecture standard (objets ORM + response_model Pydantic) et le
+chemin rapide FAST_JSON (lignes Core + orjson) sur les listes de mesures.
+
+Mesure en processus, pour plusieurs tailles de page, le temps de requête et le temps de
+sérialisation de chaque chemin sur la base DATABASE_URL (qui doit contenir des mesures).
+Avec --http, lance aussi un serveur uvicorn dans chaque mode et mesure req/s et latences.
+
+    python -m benchmarks.serialization --sizes 100 1000 10000 --repeat 20
+    python -m benchmarks.serialization --http -c 20 -d 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from benchmarks.async_mode import _wait_ready
+from benchmarks.loadgen import Request, run_load
+
+
+def _timed(fn, repeat: int):
+    """Meilleur temps (ms) sur `repeat` exécutions, et le dernier résultat."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 3), out
+
+
+def bench_in_process(sizes, repeat: int):
+    from app.database import SessionLocal
+    from app.routers.mesure import MESURE_KEY
+    from app.schemas import mesure as sch
+    from app.services import fastjson
+    from app import models
+
+    field = create_model_field(name="response", type_=list[sch.MesureOut], mode="serialization")
+    order = [c.desc() for c in MESURE_KEY]
+    results = []
+    db = SessionLocal()
+    try:
+        for size in sizes:
+            query_orm, rows = _timed(lambda: db.query(models.Mesure).order_by(*order).limit(size).all(), repeat)
+            ser_orm, body = _timed(lambda: JSONResponse(asyncio.run(serialize_response(field=field, response_content=rows))).body, repeat)
+
+            q = fastjson.schema_query(db, sch.MesureOut, models.Mesure)
+            query_core, core_rows = _timed(lambda: q.order_by(*order).limit(size).all(), repeat)
+            ser_fast, fast_body = _timed(lambda: fastjson.ModelJSONResponse(fastjson.rows_payload(core_rows, sch.MesureOut)).body, repeat)
+
+            results.append({
+                "rows": len(rows),
+                "orm_query_ms": query_orm,
+                "pydantic_serialize_ms": ser_orm,
+                "core_query_ms": query_core,
+                "fast_serialize_ms": ser_fast,
+                "identical": body == fast_body,
+            })
+            print(json.dumps(results[-1]), flush=True)
+    finally:
+        db.close()
+    return results
+
+
+def bench_http(sizes, concurrency, duration: float, port: int):
+    url = f"http://127.0.0.1:{port}"
+    results = []
+    for mode in ("standard", "fast"):
+        env = dict(os.environ, FAST_JSON="1" if mode == "fast" else "0")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            _wait_ready(url)
+            for size in sizes:
+                for c in concurrency:
+                    stats = asyncio.run(run_load(url, [Request("GET", f"/mesures/?limit={size}")], concurrency=c, duration=duration))
+                    results.append({"mode": mode, "rows": size, **stats})
+                    print(json.dumps(results[-1]), flush=True)
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sérialisation Pydantic vs FAST_JSON")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--http", action="store_true", help="mesurer aussi via HTTP (uvicorn, 1 worker)")
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[20])
+    parser.add_argument("-d", "--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    results = bench_in_process(args.sizes, args.repeat)
+    print()
+    print(f"{'rows':>7} {'orm query':>10} {'pydantic':>10} {'core query':>11} {'fast':>8} {'speedup':>8}")
+    for r in results:
+        total_std = r["orm_query_ms"] + r["pydantic_serialize_ms"]
+        total_fast = r["core_query_ms"] + r["fast_serialize_ms"]
+        speedup = round(total_std / total_fast, 1) if total_fast else "-"
+        print(f"{r['rows']:>7} {r['orm_query_ms']:>10} {r['pydantic_serialize_ms']:>10} {r['core_query_ms']:>11} {r['fast_serialize_ms']:>8} {speedup:>8}")
+
+    if args.http:
+        http = bench_http(args.sizes, args.concurrency, args.duration, args.port)
+        print()
+        print(f"{'rows':>7} {'conc':>5} {'std rps':>9} {'fast rps':>9} {'std p99':>8} {'fast p99':>9}")
+        by_key = {(r["mode"], r["rows"], r["concurrency"]): r for r in http}
+        for (mode, size, c), r in by_key.items():
+            if mode != "standard":
+                continue
+            f = by_key.get(("fast", size, c), {})
+            print(f"{size:>7} {c:>5} {r['rps']:>9} {f.get('rps', '-'):>9} {r['p99_ms']:>8} {f.get('p99_ms', '-'):>9}")
+
+
+if __name__ == "__main__":
+    main()
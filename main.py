@@ -1,5 +1,9 @@
+import logging
+import os
+import time
 from fastapi import FastAPI, Request
-from app.database import engine, Base
+from app.database import engine, async_engine, Base, DB_ASYNC, SessionLocal, replica_router
+from app.services import export, live_stats, query_stats, references, replicas, write_behind
 # Assurer l'import des modèles pour que SQLAlchemy crée les tables
 import app.models  # noqa: F401
 
@@ -17,23 +21,68 @@ from app.routers import (
     vehicule,
     trajet,
     analytics,
+    metrics,
 )
 
-app = FastAPI(title="Smart City Analytics API - Complete Backend")
+if DB_ASYNC:
+    # Mode async : routes async def (AsyncSession) pour l'ingestion et les analytics
+    from app.routers import mesure_async as mesure, analytics_async as analytics
 
-# Création des tables dans la base (à utiliser uniquement en développement)
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+app = FastAPI(title="Smart City Analytics API - Complete Backend", default_response_class=query_stats.TimedJSONResponse)
+
+# Création des tables dans la base (à utiliser uniquement en développement).
+# En dehors du développement, le schéma est géré par les migrations Alembic : `alembic upgrade head`.
+if os.getenv("DB_AUTO_CREATE", "false").lower() in ("1", "true", "yes"):
+    Base.metadata.create_all(bind=engine)
 
 # Middleware pour supprimer l'en-tête Content-Type des réponses
+KEPT_CONTENT_TYPES = ("text/event-stream", "text/plain", "image/png") + tuple(export.MEDIA_TYPES.values())
+
 @app.middleware("http")
 async def remove_content_type_header(request: Request, call_next):
     response = await call_next(request)
-    # supprimer l'en-tête content-type si présent
-    if "content-type" in response.headers:
+    # supprimer l'en-tête content-type si présent, sauf pour les formats que le client doit
+    # reconnaître : flux SSE (EventSource l'exige), texte brut (/metrics, que Prometheus refuse
+    # sans Content-Type), tuiles PNG et formats d'export (/mesures/export)
+    if "content-type" in response.headers and not response.headers["content-type"].startswith(KEPT_CONTENT_TYPES):
         del response.headers["content-type"]
     return response
 
 
+# Middleware de mesure : instructions SQL, temps base / encodage (en-têtes X-DB-*, /metrics)
+@app.middleware("http")
+async def query_stats_middleware(request: Request, call_next):
+    if not query_stats.QUERY_STATS_ENABLED:
+        return await call_next(request)
+    stats, token = query_stats.begin(request.url.path)
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        query_stats.end(token)
+    elapsed = time.perf_counter() - t0
+    response.headers.update(stats.headers(elapsed))
+    query_stats.observe_request(stats, request.method, query_stats.route_template(request), elapsed)
+    return response
+
+
+# Middleware de lecture après écriture : un client qui vient d'écrire relit sur le primaire
+@app.middleware("http")
+async def read_after_write(request: Request, call_next):
+    if not replica_router.replicas:
+        return await call_next(request)
+    token = replicas.set_primary_only(replicas.read_from_primary(request))
+    try:
+        response = await call_next(request)
+    finally:
+        replicas.reset_primary_only(token)
+    if request.method not in replicas.SAFE_METHODS and response.status_code < 400:
+        replicas.mark_write(response)
+    return response
+
+
 app.include_router(proprietaire.router, prefix="/proprietaires", tags=["proprietaires"])
 app.include_router(capteur.router, prefix="/capteurs", tags=["capteurs"])
 app.include_router(mesure.router, prefix="/mesures", tags=["mesures"])
@@ -46,6 +95,62 @@ app.include_router(participer_a.router, prefix="/participations", tags=["partici
 app.include_router(vehicule.router, prefix="/vehicules", tags=["vehicules"])
 app.include_router(trajet.router, prefix="/trajets", tags=["trajets"])
 app.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+
+
+@app.on_event("startup")
+def rebuild_live_stats():
+    # agrégats glissants en mémoire : état initial relu depuis la table mesure
+    if live_stats.LIVE_STATS_ENABLED:
+        db = SessionLocal()
+        try:
+            live_stats.aggregator.rebuild(db)
+        except Exception:
+            logger.exception("live stats rebuild failed; /analytics/live_* stay unavailable")
+        finally:
+            db.close()
+
+
+@app.on_event("startup")
+def warm_references():
+    # registre des entités de référence : validation des clés étrangères sans requête
+    if references.REFERENCE_CACHE_ENABLED:
+        db = SessionLocal()
+        try:
+            references.warm(db)
+        except Exception:
+            logger.exception("reference registry warm-up failed; lookups fall back to the database")
+        finally:
+            db.close()
+
+
+@app.on_event("startup")
+def start_replica_lag_checks():
+    replica_router.start()
+
+
+@app.on_event("startup")
+def start_write_behind():
+    # file d'ingestion différée : rejoue le spool puis écrit par lots
+    if write_behind.WRITE_BEHIND_ENABLED:
+        from app.routers.mesure import _after_commit
+
+        write_behind.writer.start(on_commit=_after_commit)
+
+
+@app.on_event("shutdown")
+def flush_write_behind():
+    write_behind.writer.stop()
+
+
+@app.on_event("shutdown")
+async def dispose_engines():
+    replica_router.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+    for replica in replica_router.replicas:
+        if replica.async_engine is not None:
+            await replica.async_engine.dispose()
 
 
 @app.get("/")
@@ -0,0 +1,173 @@
+"""initial schema
+
+Schéma d'origine, tel que créé par Base.metadata.create_all avant l'introduction des migrations.
+Une base existante créée par create_all se marque avec : alembic stamp 0001
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 14:47:25.649516
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('arrondissement',
+    sa.Column('id_arrondissement', sa.Integer(), nullable=False),
+    sa.Column('nom', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id_arrondissement'),
+    sa.UniqueConstraint('nom')
+    )
+    op.create_table('citoyen',
+    sa.Column('id_citoyen', sa.BigInteger(), nullable=False),
+    sa.Column('nom', sa.Text(), nullable=True),
+    sa.Column('adresse', sa.Text(), nullable=True),
+    sa.Column('email', sa.String(length=255), nullable=True),
+    sa.Column('score_engagement', sa.Numeric(precision=8, scale=2), nullable=True),
+    sa.Column('preferences_mobilite', sa.JSON(), nullable=True),
+    sa.PrimaryKeyConstraint('id_citoyen'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_index(op.f('ix_citoyen_id_citoyen'), 'citoyen', ['id_citoyen'], unique=False)
+    op.create_table('consultation',
+    sa.Column('id_consultation', sa.BigInteger(), nullable=False),
+    sa.Column('titre', sa.Text(), nullable=True),
+    sa.Column('date_consultation', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('theme', sa.String(length=200), nullable=True),
+    sa.PrimaryKeyConstraint('id_consultation')
+    )
+    op.create_index(op.f('ix_consultation_id_consultation'), 'consultation', ['id_consultation'], unique=False)
+    op.create_table('proprietaire',
+    sa.Column('id_proprietaire', sa.BigInteger(), nullable=False),
+    sa.Column('nom', sa.Text(), nullable=False),
+    sa.Column('adresse', sa.Text(), nullable=True),
+    sa.Column('telephone', sa.String(length=50), nullable=True),
+    sa.Column('email', sa.String(length=255), nullable=True),
+    sa.Column('type_proprietaire', sa.String(length=100), nullable=True),
+    sa.PrimaryKeyConstraint('id_proprietaire'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_index(op.f('ix_proprietaire_id_proprietaire'), 'proprietaire', ['id_proprietaire'], unique=False)
+    op.create_table('technicien',
+    sa.Column('id_technicien', sa.BigInteger(), nullable=False),
+    sa.Column('nom', sa.Text(), nullable=False),
+    sa.Column('telephone', sa.String(length=50), nullable=True),
+    sa.Column('certification', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id_technicien')
+    )
+    op.create_index(op.f('ix_technicien_id_technicien'), 'technicien', ['id_technicien'], unique=False)
+    op.create_table('vehicule',
+    sa.Column('plaque', sa.String(length=20), nullable=False),
+    sa.Column('type_vehicule', sa.String(length=100), nullable=True),
+    sa.Column('energie', sa.String(length=50), nullable=True),
+    sa.PrimaryKeyConstraint('plaque')
+    )
+    op.create_table('capteur',
+    sa.Column('uuid_capteur', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('type_capteur', sa.String(length=100), nullable=False),
+    sa.Column('latitude', sa.Numeric(precision=9, scale=6), nullable=True),
+    sa.Column('longitude', sa.Numeric(precision=9, scale=6), nullable=True),
+    sa.Column('statut', sa.Enum('active', 'maintenance', 'out_of_service', 'failed', name='capteurstatusenum'), nullable=True),
+    sa.Column('date_installation', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('id_proprietaire', sa.BigInteger(), nullable=True),
+    sa.Column('id_arrondissement', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['id_arrondissement'], ['arrondissement.id_arrondissement'], ),
+    sa.ForeignKeyConstraint(['id_proprietaire'], ['proprietaire.id_proprietaire'], ),
+    sa.PrimaryKeyConstraint('uuid_capteur')
+    )
+    op.create_table('participer_a',
+    sa.Column('id_citoyen', sa.BigInteger(), nullable=False),
+    sa.Column('id_consultation', sa.BigInteger(), nullable=False),
+    sa.Column('avis', sa.Text(), nullable=True),
+    sa.Column('vote', sa.SmallInteger(), nullable=True),
+    sa.Column('date_participation', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['id_citoyen'], ['citoyen.id_citoyen'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_consultation'], ['consultation.id_consultation'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_citoyen', 'id_consultation')
+    )
+    op.create_table('trajet',
+    sa.Column('id_trajet', sa.BigInteger(), nullable=False),
+    sa.Column('origine', sa.Text(), nullable=True),
+    sa.Column('destination', sa.Text(), nullable=True),
+    sa.Column('distance_km', sa.Numeric(precision=9, scale=3), nullable=True),
+    sa.Column('duree_minutes', sa.Integer(), nullable=True),
+    sa.Column('co2_economie', sa.Numeric(precision=12, scale=4), nullable=True),
+    sa.Column('date_heure', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('plaque', sa.String(length=20), nullable=True),
+    sa.ForeignKeyConstraint(['plaque'], ['vehicule.plaque'], ),
+    sa.PrimaryKeyConstraint('id_trajet')
+    )
+    op.create_index(op.f('ix_trajet_id_trajet'), 'trajet', ['id_trajet'], unique=False)
+    op.create_table('capteur_status_history',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('uuid_capteur', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('status', sa.Enum('active', 'maintenance', 'out_of_service', 'failed', name='capteurstatusenum'), nullable=False),
+    sa.Column('ts', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['uuid_capteur'], ['capteur.uuid_capteur'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_capteur_status_history_id'), 'capteur_status_history', ['id'], unique=False)
+    op.create_table('intervention',
+    sa.Column('id_intervention', sa.BigInteger(), nullable=False),
+    sa.Column('date_heure', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('nature', sa.Enum('predictive', 'corrective', 'curative', name='interventionnatureenum'), nullable=True),
+    sa.Column('duree_minutes', sa.Integer(), nullable=True),
+    sa.Column('cout', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('impact_co2', sa.Numeric(precision=12, scale=4), nullable=True),
+    sa.Column('ia_valide', sa.Boolean(), nullable=True),
+    sa.Column('uuid_capteur', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.ForeignKeyConstraint(['uuid_capteur'], ['capteur.uuid_capteur'], ),
+    sa.PrimaryKeyConstraint('id_intervention')
+    )
+    op.create_index(op.f('ix_intervention_id_intervention'), 'intervention', ['id_intervention'], unique=False)
+    op.create_table('mesure',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('uuid_capteur', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('ts', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('pollutant', sa.String(length=100), nullable=False),
+    sa.Column('valeur', sa.Numeric(precision=14, scale=6), nullable=False),
+    sa.Column('unite', sa.String(length=30), nullable=True),
+    sa.ForeignKeyConstraint(['uuid_capteur'], ['capteur.uuid_capteur'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mesure_id'), 'mesure', ['id'], unique=False)
+    op.create_table('realiser',
+    sa.Column('id_intervention', sa.BigInteger(), nullable=False),
+    sa.Column('id_technicien', sa.BigInteger(), nullable=False),
+    sa.Column('role', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['id_intervention'], ['intervention.id_intervention'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['id_technicien'], ['technicien.id_technicien'], ondelete='RESTRICT'),
+    sa.PrimaryKeyConstraint('id_intervention', 'id_technicien')
+    )
+
+
+def downgrade():
+    op.drop_table('realiser')
+    op.drop_index(op.f('ix_mesure_id'), table_name='mesure')
+    op.drop_table('mesure')
+    op.drop_index(op.f('ix_intervention_id_intervention'), table_name='intervention')
+    op.drop_table('intervention')
+    op.drop_index(op.f('ix_capteur_status_history_id'), table_name='capteur_status_history')
+    op.drop_table('capteur_status_history')
+    op.drop_index(op.f('ix_trajet_id_trajet'), table_name='trajet')
+    op.drop_table('trajet')
+    op.drop_table('participer_a')
+    op.drop_table('capteur')
+    op.drop_table('vehicule')
+    op.drop_index(op.f('ix_technicien_id_technicien'), table_name='technicien')
+    op.drop_table('technicien')
+    op.drop_index(op.f('ix_proprietaire_id_proprietaire'), table_name='proprietaire')
+    op.drop_table('proprietaire')
+    op.drop_index(op.f('ix_consultation_id_consultation'), table_name='consultation')
+    op.drop_table('consultation')
+    op.drop_index(op.f('ix_citoyen_id_citoyen'), table_name='citoyen')
+    op.drop_table('citoyen')
+    op.drop_table('arrondissement')
+    sa.Enum(name='interventionnatureenum').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='capteurstatusenum').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,63 @@
+"""rollups and current status
+
+Tables mesure_hourly (rollups horaires) et capteur_current_status (dernier statut
+par capteur), initialisées depuis les données existantes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 14:47:32.812920
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('capteur_current_status',
+    sa.Column('uuid_capteur', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('status', postgresql.ENUM('active', 'maintenance', 'out_of_service', 'failed', name='capteurstatusenum', create_type=False), nullable=False),
+    sa.Column('ts', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['uuid_capteur'], ['capteur.uuid_capteur'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('uuid_capteur')
+    )
+    op.create_table('mesure_hourly',
+    sa.Column('uuid_capteur', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('pollutant', sa.String(length=100), nullable=False),
+    sa.Column('bucket', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('sum_valeur', sa.Numeric(precision=24, scale=6), nullable=False),
+    sa.Column('nb_mesures', sa.BigInteger(), nullable=False),
+    sa.Column('min_valeur', sa.Numeric(precision=14, scale=6), nullable=False),
+    sa.Column('max_valeur', sa.Numeric(precision=14, scale=6), nullable=False),
+    sa.ForeignKeyConstraint(['uuid_capteur'], ['capteur.uuid_capteur'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('uuid_capteur', 'pollutant', 'bucket')
+    )
+    op.create_index('ix_mesure_hourly_pollutant_bucket', 'mesure_hourly', ['pollutant', 'bucket'], unique=False)
+
+    op.execute(
+        """
+        INSERT INTO capteur_current_status (uuid_capteur, status, ts)
+        SELECT DISTINCT ON (uuid_capteur) uuid_capteur, status, ts
+        FROM capteur_status_history
+        ORDER BY uuid_capteur, ts DESC, id DESC
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO mesure_hourly (uuid_capteur, pollutant, bucket, sum_valeur, nb_mesures, min_valeur, max_valeur)
+        SELECT uuid_capteur, pollutant, timezone('UTC', date_trunc('hour', timezone('UTC', ts))) AS bucket,
+               sum(valeur), count(id), min(valeur), max(valeur)
+        FROM mesure
+        GROUP BY uuid_capteur, pollutant, bucket
+        """
+    )
+
+
+def downgrade():
+    op.drop_index('ix_mesure_hourly_pollutant_bucket', table_name='mesure_hourly')
+    op.drop_table('mesure_hourly')
+    op.drop_table('capteur_current_status')
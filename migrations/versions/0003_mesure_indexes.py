@@ -0,0 +1,34 @@
+"""mesure indexes
+
+Index composites alignés sur les requêtes : (pollutant, ts) pour les analytics,
+(uuid_capteur, ts) pour les séries par capteur et (ts) pour list_mesures.
+Créés en CONCURRENTLY pour ne pas bloquer l'ingestion sur une table déjà volumineuse.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 15:02:10.114302
+"""
+from alembic import op
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_mesure_pollutant_ts', ['pollutant', 'ts']),
+    ('ix_mesure_capteur_ts', ['uuid_capteur', 'ts']),
+    ('ix_mesure_ts', ['ts']),
+)
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'mesure', columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.drop_index(name, table_name='mesure', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,62 @@
+"""keyset pagination indexes
+
+Les listes paginées par curseur trient sur (ts, id) pour mesure et (date_heure, id_intervention)
+pour intervention : la colonne unique en fin d'index permet à PostgreSQL de résoudre
+WHERE (ts, id) < (:ts, :id) ORDER BY ts DESC, id DESC par un simple parcours d'index.
+Remplace ix_mesure_ts et ix_mesure_capteur_ts. CONCURRENTLY sauf sur une table
+partitionnée, où PostgreSQL ne le permet pas, et en mode hors ligne (--sql), où le script
+généré ne peut pas savoir si la table est partitionnée.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 17:40:22.501873
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+NEW_INDEXES = (
+    ('ix_mesure_ts_id', 'mesure', ['ts', 'id']),
+    ('ix_mesure_capteur_ts_id', 'mesure', ['uuid_capteur', 'ts', 'id']),
+    ('ix_intervention_date_heure_id', 'intervention', ['date_heure', 'id_intervention']),
+)
+OLD_INDEXES = (
+    ('ix_mesure_ts', 'mesure', ['ts']),
+    ('ix_mesure_capteur_ts', 'mesure', ['uuid_capteur', 'ts']),
+)
+
+
+def _concurrently(table):
+    # hors ligne (--sql), le catalogue n'est pas lisible : index simple, valable partitionné ou non
+    if context.is_offline_mode():
+        return False
+    return not op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": table}).first()
+
+
+def _create(indexes):
+    for name, table, columns in indexes:
+        op.create_index(name, table, columns, unique=False, postgresql_concurrently=_concurrently(table), if_not_exists=True)
+
+
+def _drop(indexes):
+    for name, table, _ in indexes:
+        op.drop_index(name, table_name=table, postgresql_concurrently=_concurrently(table), if_exists=True)
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        _create(NEW_INDEXES)
+        _drop(OLD_INDEXES)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        _create(OLD_INDEXES)
+        _drop(NEW_INDEXES)
@@ -0,0 +1,30 @@
+"""capteur position index
+
+Index GiST sur point(longitude, latitude) pour les requêtes spatiales côté base
+(rectangle avec <@ box, plus proches voisins avec <->), utilisées quand l'index
+spatial en mémoire est désactivé.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 19:12:40.377120
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_capteur_position', 'capteur', [sa.text('point(longitude, latitude)')],
+            unique=False, postgresql_using='gist', postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_capteur_position', table_name='capteur', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,32 @@
+"""bulk load batch
+
+Table bulk_load_batch : lots commités par l'import en masse (reprise sans doublons).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 21:03:15.480211
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bulk_load_batch',
+    sa.Column('source', sa.String(length=1024), nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('batch_no', sa.Integer(), nullable=False),
+    sa.Column('batch_rows', sa.Integer(), nullable=False),
+    sa.Column('nb_rows', sa.Integer(), nullable=False),
+    sa.Column('min_ts', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('loaded_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('source', 'table_name', 'batch_no')
+    )
+
+
+def downgrade():
+    op.drop_table('bulk_load_batch')
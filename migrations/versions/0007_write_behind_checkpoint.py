@@ -0,0 +1,29 @@
+"""write behind checkpoint
+
+Table write_behind_checkpoint : dernier enregistrement du spool commité par la file
+d'ingestion différée (rejeu sans doublons après un arrêt brutal).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 23:12:40.118305
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('write_behind_checkpoint',
+    sa.Column('spool', sa.String(length=1024), nullable=False),
+    sa.Column('last_seq', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('spool')
+    )
+
+
+def downgrade():
+    op.drop_table('write_behind_checkpoint')
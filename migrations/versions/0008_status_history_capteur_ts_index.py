@@ -0,0 +1,31 @@
+"""status history capteur/ts index
+
+Index (uuid_capteur, ts, id) sur capteur_status_history pour les calculs de disponibilité :
+statut en vigueur à une date (dernière transition antérieure, par capteur) et transitions
+d'une période dans l'ordre. id départage les transitions de même ts. Index créé
+CONCURRENTLY, sauf en mode hors ligne (--sql).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 23:41:07.552190
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_capteur_status_history_capteur_ts_id'
+TABLE = 'capteur_status_history'
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(INDEX, TABLE, ['uuid_capteur', 'ts', 'id'], unique=False, postgresql_concurrently=not context.is_offline_mode(), if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name=TABLE, postgresql_concurrently=not context.is_offline_mode(), if_exists=True)